@@ -8,7 +8,6 @@ serialized TOKIO TimeSeries (TTS) HDF5 files.
 import sys
 import gzip
 import json
-import time
 import datetime
 import argparse
 import warnings
@@ -22,6 +21,7 @@ import numpy
 import h5py
 
 import tokio
+import tokio.instrument
 import tokio.connectors.collectd_es
 
 SCHEMA_VERSION = "1"
@@ -91,7 +91,7 @@ def process_page(page):
     connector class.
     """
 
-    _time0 = time.time()
+    timer = tokio.instrument.Timer('archive_collectdes.process_page')
     inserts = []
     for doc in page:
         # basic validity checking
@@ -166,9 +166,9 @@ def process_page(page):
             elif source['type_instance'] == 'slab_unrecl':
                 inserts.append(('dataservers/memslab_unrecl', timestamp, source['hostname'], val1))
 
-    _timef = time.time()
+    timer.stop()
     if tokio.DEBUG:
-        print "Extracted %d inserts in %.4f seconds" % (len(inserts), _timef - _time0)
+        print "Extracted %d inserts in %.4f seconds" % (len(inserts), timer.elapsed)
         per_dataset = {}
         for insert in inserts:
             if insert[0] not in per_dataset:
@@ -349,46 +349,43 @@ def pages_to_hdf5(pages, output_file, init_start, init_end, query_start, query_e
         datasets[dataset_name] = timeseries
 
     # Process all pages retrieved (this is computationally expensive)
-    _time0 = time.time()
-    updates = []
-    if threads > 1:
-        # updates = multiprocessing.Pool(16).map(process_page, pages)
-        for update in multiprocessing.Pool(threads).imap_unordered(process_page, pages):
-            updates.append(update)
-    else:
-        for page in pages:
-            updates.append(process_page(page))
-    _timef = time.time()
-    _extract_time = _timef - _time0
+    with tokio.instrument.span('archive_collectdes.extract') as extract_timer:
+        updates = []
+        if threads > 1:
+            # updates = multiprocessing.Pool(16).map(process_page, pages)
+            for update in multiprocessing.Pool(threads).imap_unordered(process_page, pages):
+                updates.append(update)
+        else:
+            for page in pages:
+                updates.append(process_page(page))
     tokio.debug_print("Extracted %d elements from %d pages in %.4f seconds" \
                       % (sum([len(x) for x in updates]),
                       len(pages),
-                      _extract_time))
+                      extract_timer.elapsed))
 
     # Take the processed list of data to insert and actually insert them
-    _time0 = time.time()
-    for update in updates:
-        update_datasets(update, datasets)
-    _timef = time.time()
-    _update_time = _timef - _time0
+    with tokio.instrument.span('archive_collectdes.update') as update_timer:
+        for update in updates:
+            update_datasets(update, datasets)
     if tokio.DEBUG:
         print "Inserted %d elements from %d pages in %.4f seconds" \
-            % (len(updates), len(pages), _update_time)
+            % (len(updates), len(pages), update_timer.elapsed)
         print "Processed %d pages in %.4f seconds" \
-            % (len(pages), _extract_time + _update_time)
+            % (len(pages), extract_timer.elapsed + update_timer.elapsed)
 
     for update in updates:
         normalize_cpu_datasets(update, datasets)
 
     # Write datasets out to HDF5 file
-    _time0 = time.time()
-    for dataset_name, dataset in datasets.iteritems():
-        if '/_' not in dataset_name:
-            dataset.commit_dataset(hdf5_file)
+    with tokio.instrument.span('archive_collectdes.commit') as timer:
+        for dataset_name, dataset in datasets.iteritems():
+            if '/_' not in dataset_name:
+                dataset.commit_dataset(hdf5_file)
 
     if tokio.DEBUG:
-        print "Committed data to disk in %.4f seconds" % (time.time() - _time0)
+        print "Committed data to disk in %.4f seconds" % timer.elapsed
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI interface for cache_collectdes
@@ -429,6 +426,7 @@ def main(argv=None):
                         help="port of ElasticSearch endpoint (default: 9200)")
     parser.add_argument('-i', '--index', type=str, default='cori-collectd-*',
                         help='ElasticSearch index to query (default:cori-collectd-*)')
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     if args.debug:
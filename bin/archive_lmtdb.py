@@ -6,10 +6,12 @@ Retrieve the contents of an LMT database and cache it locally.
 import sys
 import datetime
 import argparse
+import itertools
 import warnings
 import h5py
 import tokio.timeseries
 import tokio.connectors.lmtdb
+import tokio.instrument
 
 DATE_FMT = "%Y-%m-%dT%H:%M:%S"
 DATE_FMT_PRINT = "YYYY-MM-DDTHH:MM:SS"
@@ -222,7 +224,8 @@ class DatasetDict(dict):
         self.init_datasets(dataset_names, lmtdb.mds_names)
 
         # Now query the MDS_DATA table to get byte counts over the query time range
-        results, columns = lmtdb.get_mds_data(self.query_start, self.query_end_plusplus)
+        results = iterate_rows(lmtdb, 'MDS_DATA', self.query_start, self.query_end_plusplus)
+        columns = tokio.connectors.lmtdb.get_timeseries_columns('MDS_DATA')
 
 
         # Index the columns to speed up insertion of data
@@ -287,7 +290,8 @@ class DatasetDict(dict):
 
         self.init_datasets(dataset_names, lmtdb.mds_names)
 
-        results, columns = lmtdb.get_mds_ops_data(self.query_start, self.query_end_plusplus)
+        results = iterate_rows(lmtdb, 'MDS_OPS_DATA', self.query_start, self.query_end_plusplus)
+        columns = tokio.connectors.lmtdb.get_timeseries_columns('MDS_OPS_DATA')
 
         # Index the columns to speed up insertion of data
         col_map = {}
@@ -345,7 +349,8 @@ class DatasetDict(dict):
         self.init_datasets(dataset_names, lmtdb.oss_names)
 
         # Now query the OSS_DATA table to get byte counts over the query time range
-        results, columns = lmtdb.get_oss_data(self.query_start, self.query_end_plusplus)
+        results = iterate_rows(lmtdb, 'OSS_DATA', self.query_start, self.query_end_plusplus)
+        columns = tokio.connectors.lmtdb.get_timeseries_columns('OSS_DATA')
 
         # Index the columns to speed up insertion of data
         col_map = {}
@@ -399,7 +404,8 @@ class DatasetDict(dict):
         self.init_datasets(dataset_names, lmtdb.ost_names)
 
         # Now query the OST_DATA table to get byte counts over the query time range
-        results, columns = lmtdb.get_ost_data(self.query_start, self.query_end_plusplus)
+        results = iterate_rows(lmtdb, 'OST_DATA', self.query_start, self.query_end_plusplus)
+        columns = tokio.connectors.lmtdb.get_timeseries_columns('OST_DATA')
 
         # Index the columns to speed up insertion of data
         col_map = {}
@@ -442,6 +448,21 @@ class DatasetDict(dict):
                     errmsg = "%s in self.config but missing 'column' setting" % dataset_name
                     raise KeyError(errmsg)
 
+def iterate_rows(lmtdb, table, query_start, query_end):
+    """Iterate over the rows of a timeseries table without retaining them
+
+    Args:
+        lmtdb (LmtDb): database object
+        table (str): name of the LMT table to query
+        query_start (datetime.datetime): lower bound of query, inclusive
+        query_end (datetime.datetime): upper bound of query, exclusive
+
+    Returns:
+        iterator over each row returned by LmtDb.iterate_timeseries_data()
+    """
+    return itertools.chain.from_iterable(
+        lmtdb.iterate_timeseries_data(table, query_start, query_end))
+
 def init_hdf5_file(datasets, init_start, init_end, hdf5_file):
     """
     Initialize the datasets at full dimensions in the HDF5 file if necessary
@@ -492,6 +513,7 @@ def archive_lmtdb(lmtdb, init_start, init_end, timestep, output_file, query_star
     if tokio.DEBUG:
         print "Wrote output to %s" % output_file
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     Verify functionality when connecting to a remote database
@@ -516,6 +538,7 @@ def main(argv=None):
     parser.add_argument("--database", type=str, default=None, help="database name")
     parser.add_argument("query_start", type=str, help="start time in %s format" % DATE_FMT_PRINT)
     parser.add_argument("query_end", type=str, help="end time in %s format" % DATE_FMT_PRINT)
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     if args.debug:
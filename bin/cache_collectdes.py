@@ -16,9 +16,11 @@ import mimetypes
 
 import tokio
 import tokio.connectors.collectd_es
+import tokio.instrument
 
 DATE_FMT = "%Y-%m-%dT%H:%M:%S"
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI interface for cache_collectdes
@@ -45,6 +47,7 @@ def main(argv=None):
                         help="port of ElasticSearch endpoint (default: 9200)")
     parser.add_argument('-i', '--index', type=str, default='cori-collectd-*',
                         help='ElasticSearch index to query (default:cori-collectd-*)')
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     if args.debug:
@@ -6,7 +6,9 @@ Parse and cache a Darshan log to simplify reanalysis and sharing its data.
 import json
 import argparse
 import tokio.connectors.darshan
+import tokio.instrument
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI wrapper around the Darshan connector's I/O methods
@@ -17,17 +19,18 @@ def main(argv=None):
     parser.add_argument('--total', action='store_true', help='aggregated darshan field data')
     parser.add_argument('--perf', action='store_true', help='derived perf data')
     parser.add_argument("-o", "--output", type=str, default=None, help="output file")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     darshan = tokio.connectors.darshan.Darshan(args.logfile)
-    if args.total:
-        darshan.darshan_parser_total()
-
-    if args.perf:
-        darshan.darshan_parser_perf()
-
     if args.base or (not args.perf and not args.total):
-        darshan.darshan_parser_base()
+        # derive total and perf from the base counters
+        darshan.darshan_parser_base(total=args.total, perf=args.perf)
+    else:
+        if args.total:
+            darshan.darshan_parser_total()
+        if args.perf:
+            darshan.darshan_parser_perf()
 
     # Serialize the object
     cache_file = args.output
@@ -5,7 +5,9 @@ Parse and cache an ISDCT dump to simply reanalysis and sharing its data.
 
 import argparse
 import tokio.connectors.nersc_isdct
+import tokio.instrument
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI wrapper around the NerscIsdct object's I/O methods
@@ -16,6 +18,7 @@ def main(argv=None):
                         help="return output in JSON format")
     parser.add_argument("-c", "--csv", action="store_true", help="return output in CSV format")
     parser.add_argument("-o", "--output", type=str, default=None, help="output file")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     # Read from a cache file
@@ -7,7 +7,9 @@ import argparse
 import datetime
 import json
 import tokio.tools.lfsstatus as lfsstatus
+import tokio.instrument
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI wrapper around the tools.lfsstatus I/O methods
@@ -21,6 +23,7 @@ def main(argv=None):
     parser.add_argument("-o", "--output", type=str, default=None, help="output file")
     parser.add_argument("filesystem", help="file system identifier (e.g., snx11168)")
     parser.add_argument("datetime", help="date and time of interest in YYYY-MM-DDTHH:MM:SS format")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     target_datetime = datetime.datetime.strptime(args.datetime, "%Y-%m-%dT%H:%M:%S")
@@ -6,7 +6,9 @@ Retrieve the contents of an LMT database and cache it locally.
 import os
 import datetime
 import argparse
+import tokio.connectors.cachingdb
 import tokio.connectors.lmtdb
+import tokio.instrument
 
 def retrieve_tables(lmtdb, datetime_start, datetime_end, limit=None):
     """
@@ -28,11 +30,15 @@ def retrieve_tables(lmtdb, datetime_start, datetime_end, limit=None):
         if limit is not None:
             query_str += " LIMIT %d" % limit
 
-        result = lmtdb.query(
-            query_str=query_str,
-            table=lmtdb_table,
-            table_schema=table_schema)
+        ### stream rows rather than fetching each table at once so that rows
+        ### can be written through to the cache db as they arrive
+        for _ in lmtdb.iterate_query(
+                query_str=query_str,
+                table=lmtdb_table,
+                table_schema=table_schema):
+            pass
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     Verify functionality when connecting to a remote database
@@ -44,10 +50,14 @@ def main(argv=None):
     parser.add_argument("-o", "--output", type=str, default=None, help="output file")
     parser.add_argument("-l", "--limit", type=int, default=None,
                         help="restrict number of records returned per table")
+    parser.add_argument("--flush-rows", type=int,
+                        default=tokio.connectors.cachingdb.WRITE_FLUSH_ROWS,
+                        help="number of rows to write to the output file between commits")
     parser.add_argument("--host", type=str, default=None, help="database hostname")
     parser.add_argument("--user", type=str, default=None, help="database user")
     parser.add_argument("--password", type=str, default=None, help="database password")
     parser.add_argument("--database", type=str, default=None, help="database name")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     start = datetime.datetime.strptime(args.start, "%Y-%m-%dT%H:%M:%S")
@@ -66,8 +76,6 @@ def main(argv=None):
             dbpassword=args.password,
             dbname=args.database)
 
-    retrieve_tables(lmtdb, start, end, args.limit)
-
     if cache_file is None:
         i = 0
         while True:
@@ -77,6 +85,15 @@ def main(argv=None):
             else:
                 break
     print "Caching to %s" % cache_file
+
+    ### write rows out as they are retrieved rather than holding the whole
+    ### time range in memory, unless the input and output cache are the same
+    ### file and writes would have to wait for reads to finish anyway
+    if args.input is None or os.path.abspath(args.input) != os.path.abspath(cache_file):
+        lmtdb.connect_write_cache(cache_file, flush_rows=args.flush_rows)
+
+    retrieve_tables(lmtdb, start, end, args.limit)
+
     lmtdb.save_cache(cache_file)
 
 if __name__ == "__main__":
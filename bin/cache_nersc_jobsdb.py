@@ -8,7 +8,9 @@ import time
 import datetime
 import argparse
 import tokio.connectors.nersc_jobsdb
+import tokio.instrument
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI wrapper around NerscJobsDb object's I/O methods
@@ -19,6 +21,7 @@ def main(argv=None):
     parser.add_argument("host", type=str, help="return jobs running on this NERSC host")
     parser.add_argument("-i", "--input", type=str, default=None, help="input cache db file")
     parser.add_argument("-o", "--output", type=str, default=None, help="output file")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     start = datetime.datetime.strptime(args.start, "%Y-%m-%dT%H:%M:%S")
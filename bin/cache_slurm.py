@@ -6,7 +6,9 @@ Parse and cache a Slurm job record to simply reanalysis and sharing its data.
 import os
 import argparse
 import tokio.connectors.slurm
+import tokio.instrument
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI wrapper around the tokio.connectors.slurm.Slurm's serialization functions
@@ -18,6 +20,7 @@ def main(argv=None):
     parser.add_argument("-j", "--json", action="store_true", help="return output in JSON format")
     parser.add_argument("-c", "--csv", action="store_true", help="return output in CSV format")
     parser.add_argument("-o", "--output", type=str, default=None, help="output file")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     jobid = args.slurm_jobid
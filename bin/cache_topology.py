@@ -6,7 +6,9 @@ Simple CLI wrapper around the tools.topology interface
 import json
 import argparse
 import tokio.tools.topology
+import tokio.instrument
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     Take either a jobid or a Slurm cache file and return the summary provided by
@@ -20,6 +22,7 @@ def main(argv=None):
                         help="path to xtdb2proc cache file")
     parser.add_argument("-o", "--output", type=str, default=None, help="output file")
     group.add_argument("jobid", nargs='?', default=None, help="Slurm job id of interest")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     topology_result = tokio.tools.topology.get_job_diameter(jobid=args.jobid,
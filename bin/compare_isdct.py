@@ -11,6 +11,7 @@ import argparse
 import warnings
 import datetime
 import tokio.connectors.nersc_isdct
+import tokio.instrument
 
 # If the following keys report changes, the drive should be flagged
 ERROR_KEYS = [
@@ -186,6 +187,7 @@ def print_summary(old_isdctfile, new_isdctfile, diff_dict):
         print "\n=== Workload Statistics ==="
         print diff_buf
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """Parse command line arguments and dispatch analysis
     """
@@ -200,6 +202,7 @@ def main(argv=None):
                         help='include counters that do not change')
     parser.add_argument("old_isdctfile", help="older ISDCT dump file")
     parser.add_argument("new_isdctfile", help="newer ISDCT dump file")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     old_isdctfile = tokio.connectors.nersc_isdct.NerscIsdct(args.old_isdctfile)
@@ -5,75 +5,33 @@ generate a scoreboard of top sources of I/O based on user, file system, and
 application
 """
 
-import os
-import re
 import json
-import gzip
-import mimetypes
-import collections
 import argparse
+import tokio.tools.darshan_scoreboard
+import tokio.instrument
 
 def process_darshan_perfs(summary_jsons,
                           limit_fs=[], limit_user=[], limit_exe=[],
-                          exclude_fs=[], exclude_user=[], exclude_exe=[]):
+                          exclude_fs=[], exclude_user=[], exclude_exe=[],
+                          min_nprocs=None, max_nprocs=None, threads=1):
     """
     Ingest the per-log file system summary contained in the summary_json file(s)
-    and produce a dictionary with bytes read/written reduced on application
-    binary name, user name, and file system.
+    or summary store(s) and produce a dictionary with bytes read/written
+    reduced on application binary name, user name, and file system.  If
+    min_nprocs or max_nprocs are given, only logs that can still be found and
+    whose headers satisfy them are included.  Up to threads summary files are
+    processed concurrently.
     """
-
-    summary = {}
-    for summary_json in summary_jsons:
-        _, encoding = mimetypes.guess_type(summary_json)
-        if encoding == 'gzip':
-            summary.update(json.load(gzip.open(summary_json, 'r')))
-        else:
-            summary.update(json.load(open(summary_json, 'r')))
-
-    regex_filename = re.compile(r'^([^_]+)_(.*?)_id(\d+)_.*.darshan')
-
-    results = {
-        'per_user': collections.defaultdict(lambda: collections.defaultdict(int)),
-        'per_fs': collections.defaultdict(lambda: collections.defaultdict(int)),
-        'per_exe': collections.defaultdict(lambda: collections.defaultdict(int)),
-    }
-    for darshan_log, counters in summary.iteritems():
-        darshan_log_bn = os.path.basename(darshan_log)
-        regex_match = regex_filename.search(darshan_log_bn)
-        if regex_match:
-            username = regex_match.group(1)
-            exename = regex_match.group(2)
-        elif '_' in darshan_log_bn:
-            username = darshan_log_bn.split('_', 1)[0]
-            exename = "<unknown>"
-        else:
-            username = "<unknown>"
-            exename = "<unknown>"
-
-        # apply limits, if applicable
-        if (limit_user and username not in limit_user) \
-        or (limit_exe and exename not in limit_exe) \
-        or (exclude_user and username in exclude_user) \
-        or (exclude_exe and exename in exclude_exe):
-            continue
-
-        for mount in counters.keys():
-            if mount != '/':
-                # if limit_fs in play, filter at the per-record basis
-                if (limit_fs and mount not in limit_fs) \
-                or (exclude_fs and mount in exclude_fs):
-                    continue
-                results['per_user'][username]['read_bytes'] += counters[mount].get('read_bytes', 0)
-                results['per_user'][username]['write_bytes'] += counters[mount].get('write_bytes', 0)
-                results['per_user'][username]['num_jobs'] += 1
-                results['per_fs'][mount]['read_bytes'] += counters[mount].get('read_bytes', 0)
-                results['per_fs'][mount]['write_bytes'] += counters[mount].get('write_bytes', 0)
-                results['per_fs'][mount]['num_jobs'] += 1
-                results['per_exe'][exename]['read_bytes'] += counters[mount].get('read_bytes', 0)
-                results['per_exe'][exename]['write_bytes'] += counters[mount].get('write_bytes', 0)
-                results['per_exe'][exename]['num_jobs'] += 1
-
-    return results
+    return tokio.tools.darshan_scoreboard.build_scoreboard(summary_jsons,
+                                                           processes=threads,
+                                                           limit_fs=limit_fs,
+                                                           limit_user=limit_user,
+                                                           limit_exe=limit_exe,
+                                                           exclude_fs=exclude_fs,
+                                                           exclude_user=exclude_user,
+                                                           exclude_exe=exclude_exe,
+                                                           min_nprocs=min_nprocs,
+                                                           max_nprocs=max_nprocs)
 
 def print_top(categorized_data, max_show=10):
     """
@@ -109,17 +67,20 @@ def print_top(categorized_data, max_show=10):
                                                       rankings[winner]['num_jobs'])
         categories += 1
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI wrapper around process_darshan_perfs()
     """
     parser = argparse.ArgumentParser()
     parser.add_argument("summaryjson", type=str, nargs='+',
-                        help="json output of darshan_per_fs_bytes.py")
+                        help="json output or summary store of summarize_darshanlogs.py")
     parser.add_argument("--json", action='store_true',
                         help="output in json format")
     parser.add_argument("--max-show", type=int, default=10,
                         help="show top N users, apps, file systems")
+    parser.add_argument("-t", "--threads", type=int, default=1,
+                        help="number of summary files to process concurrently")
     group_fs = parser.add_mutually_exclusive_group()
     group_fs.add_argument("--limit-fs", type=str, default=None,
                           help="only process data targeting this file system")
@@ -135,7 +96,12 @@ def main(argv=None):
                            help="only process logs generated by this binary")
     group_exe.add_argument("--exclude-exe", type=str, default=None,
                            help="exclude logs generated by this binary")
+    parser.add_argument("--min-nprocs", type=int, default=None,
+                        help="only process logs from jobs with at least this many processes")
+    parser.add_argument("--max-nprocs", type=int, default=None,
+                        help="only process logs from jobs with at most this many processes")
 
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     kwargs = {
@@ -145,6 +111,9 @@ def main(argv=None):
         'exclude_user': args.exclude_user.split(',') if args.exclude_user else [],
         'exclude_fs': args.exclude_fs.split(',') if args.exclude_fs else [],
         'exclude_exe': args.exclude_exe.split(',') if args.exclude_exe else [],
+        'min_nprocs': args.min_nprocs,
+        'max_nprocs': args.max_nprocs,
+        'threads': args.threads,
     }
 
     results = process_darshan_perfs(args.summaryjson, **kwargs)
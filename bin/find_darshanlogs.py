@@ -7,10 +7,12 @@ import json
 import argparse
 import datetime
 import tokio.tools.darshan
+import tokio.instrument
 
 DATE_FMT = "%Y-%m-%d"
 DATE_FMT_PRINT = "YYYY-MM-DD"
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """Find darshan logs in the system-wide repository
     """
@@ -25,10 +27,17 @@ def main(argv=None):
                         help="username of Darshan log owner")
     parser.add_argument("-j", "--jobid", type=str, default=None,
                         help="jobid of Darshan log")
+    parser.add_argument("--min-nprocs", type=int, default=None,
+                        help="only find logs from jobs with at least this many processes")
+    parser.add_argument("--max-nprocs", type=int, default=None,
+                        help="only find logs from jobs with at most this many processes")
+    parser.add_argument("-i", "--index", type=str, default=None,
+                        help="SQLite index of logdir to update and query instead of searching logdir")
     parser.add_argument("-l", "--load", type=str, default=None,
                          help='load each Darshan log; must be {base[,total][,perf]}')
     parser.add_argument('logdir', type=str,
                         help='path to DARSHAN_LOG_DIR (exclusive of dated subdirectories)')
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     try:
@@ -54,7 +63,10 @@ def main(argv=None):
                                                        username=args.username,
                                                        jobid=args.jobid,
                                                        which=args.load,
-                                                       darshan_log_dir=args.logdir)
+                                                       darshan_log_dir=args.logdir,
+                                                       min_nprocs=args.min_nprocs,
+                                                       max_nprocs=args.max_nprocs,
+                                                       index_file=args.index)
         print json.dumps(results, indent=4, sort_keys=True)
 
     else:
@@ -62,7 +74,10 @@ def main(argv=None):
                                                             datetime_end=end,
                                                             username=args.username,
                                                             jobid=args.jobid,
-                                                            darshan_log_dir=args.logdir):
+                                                            darshan_log_dir=args.logdir,
+                                                            min_nprocs=args.min_nprocs,
+                                                            max_nprocs=args.max_nprocs,
+                                                            index_file=args.index):
             print logfile
 
 if __name__ == "__main__":
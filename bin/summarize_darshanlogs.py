@@ -12,6 +12,9 @@ import argparse
 import warnings
 import multiprocessing
 import tokio.connectors.darshan
+import tokio.tools.mounts
+import tokio.tools.darshan
+import tokio.instrument
 
 def process_log(darshan_log, max_mb=0):
     """
@@ -25,7 +28,10 @@ def process_log(darshan_log, max_mb=0):
         return result
 
     try:
-        darshan_data = tokio.connectors.darshan.Darshan(darshan_log, silent_errors=True)
+        darshan_data = tokio.connectors.darshan.Darshan(darshan_log,
+                                                        modules=['posix'],
+                                                        counters=['BYTES_READ', 'BYTES_WRITTEN'],
+                                                        silent_errors=True)
         darshan_data.darshan_parser_base()
     except:
         errmsg = "Unable to open or parse %s" % darshan_log
@@ -38,8 +44,7 @@ def process_log(darshan_log, max_mb=0):
         warnings.warn(errmsg)
         return result
 
-    # reverse the mount to match the deepest path first and root path last
-    mount_list = list(reversed(sorted(darshan_data.get('mounts', {}).keys())))
+    mount_list = darshan_data.get('mounts', {}).keys()
     if not mount_list:
         errmsg = "No mount table found in %s" % darshan_log
         warnings.warn(errmsg)
@@ -51,13 +56,14 @@ def process_log(darshan_log, max_mb=0):
 
     # For each file instrumented, find its mount point and increment that
     # mount's counters
+    mount_matcher = tokio.tools.mounts.MountMatcher(mount_list)
     for posix_file in posix_counters:
-        for mount in mount_list:
-            if posix_file.startswith(mount):
-                for counters in posix_counters[posix_file].itervalues():
-                    result[mount]['read_bytes'] += counters.get('BYTES_READ', 0)
-                    result[mount]['write_bytes'] += counters.get('BYTES_WRITTEN', 0)
-                break # don't apply these bytes to more than one mount
+        mount = mount_matcher.match(posix_file)
+        if mount is None:
+            continue
+        for counters in posix_counters[posix_file].itervalues():
+            result[mount]['read_bytes'] += counters.get('BYTES_READ', 0)
+            result[mount]['write_bytes'] += counters.get('BYTES_WRITTEN', 0)
 
     # Remove all mount points that saw zero I/O
     for key in list(result.keys()):
@@ -73,7 +79,7 @@ def _process_log_parallel(darshan_log, max_mb):
     """
     return (darshan_log, process_log(darshan_log, max_mb))
 
-def sum_bytes_per_fs(log_list, threads=1, max_mb=0, update=None):
+def sum_bytes_per_fs(log_list, threads=1, max_mb=0, update=None, store=None):
     """Calculate the sum bytes read/written
 
     Given a list of input files, process each as a Darshan log and return a
@@ -87,9 +93,13 @@ def sum_bytes_per_fs(log_list, threads=1, max_mb=0, update=None):
         update (dict): if provided, exclude Darshan logs that are already
             present in this dictionary and return the merger of the new data
             and this dictionary
+        store (tokio.tools.darshan.DarshanSummaryStore): if provided, exclude
+            Darshan logs that are already present in this store and add the
+            new data to it as each log is processed
 
     Returns:
-        dict: The reduced data along different reduction dimensions
+        dict: The reduced data along different reduction dimensions.  If store
+        is provided, only the newly processed logs are returned.
     """
 
     # If only one argument is passed in but it's a directory, enumerate all the
@@ -112,20 +122,23 @@ def sum_bytes_per_fs(log_list, threads=1, max_mb=0, update=None):
         global_results = {}
 
     # Filter out logs that were already processed
-    remove_list = []
-    for log_name in new_log_list:
-        if log_name in global_results:
-            remove_list.append(log_name)
-    for log_name in remove_list:
-        new_log_list.remove(log_name)
+    new_log_list = [log_name for log_name in new_log_list if log_name not in global_results]
+    if store is not None:
+        new_log_list = store.filter_new(new_log_list)
 
     # Analyze the remaining logs in parallel
     for log_name, result in multiprocessing.Pool(threads).imap_unordered(functools.partial(_process_log_parallel, max_mb=max_mb), new_log_list):
         if result:
             global_results[log_name] = result
+            if store is not None:
+                store.add(log_name, result)
+
+    if store is not None:
+        store.flush()
 
     return global_results
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI wrapper around sum_bytes_per_fs
@@ -136,7 +149,10 @@ def main(argv=None):
                         help="Number of concurrent processes")
     parser.add_argument('-i', '--input', type=str, default=None, help='Name of input file to update')
     parser.add_argument('-o', '--output', type=str, default=None, help="Name of output file")
+    parser.add_argument('-s', '--store', type=str, default=None,
+                        help="Name of SQLite summary store to update")
     parser.add_argument('-m', '--max-mb', type=int, default=0, help="Maximum log file size to consider")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     if args.input:
@@ -147,6 +163,20 @@ def main(argv=None):
         existing_data = None
         starting_ct = 0
 
+    if args.store:
+        # an existing json summary is imported into the store
+        store = tokio.tools.darshan.DarshanSummaryStore(args.store)
+        starting_ct = len(store)
+        if existing_data:
+            store.update(existing_data)
+        sum_bytes_per_fs(log_list=args.darshanlogs,
+                         threads=args.threads,
+                         max_mb=args.max_mb,
+                         store=store)
+        print "Added %d log summaries to %s" % (len(store) - starting_ct, args.store)
+        store.close()
+        return
+
     global_results = sum_bytes_per_fs(log_list=args.darshanlogs,
                                       threads=args.threads,
                                       max_mb=args.max_mb,
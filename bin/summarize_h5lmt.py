@@ -12,6 +12,8 @@ import argparse
 import warnings
 import tokio
 import tokio.tools
+import tokio.tools.hdf5
+import tokio.instrument
 
 DATASETS_TO_BIN_KEYS = {
     'datatargets/readbytes': 'ost_read',
@@ -137,10 +139,28 @@ def bin_datasets(hdf5_file, dataset_names, orient='columns', num_bins=24):
                 "sum_someother_metric": [9.9, 2.3, 5.1, 0.2],
             }
     """
+    binned_datasets = []
+    for dataset_key in dataset_names:
+        binned_datasets.append((dataset_key, bin_dataset(hdf5_file, dataset_key, num_bins)))
+    return merge_binned_datasets(binned_datasets, orient=orient)
+
+def merge_binned_datasets(binned_datasets, orient='columns'):
+    """Combine the bins of multiple datasets
+
+    Args:
+        binned_datasets (list of tuples): (dataset name, output of bin_dataset)
+            tuples to be merged
+        orient (str): either 'columns' or 'index'; same semantic meaning as
+            pandas.DataFrame.from_dict
+
+    Returns:
+        Dictionary of lists or dictionary of dictionaries as described in
+        bin_datasets
+    """
     bins_by_columns = {}
     bins_by_index = {}
     found_metrics = {}
-    for dataset_key in dataset_names:
+    for dataset_key, binned_dataset in binned_datasets:
         # binned_dataset is a list of dictionaries.  Each list element
         # corresponds to a single time bin, and its key-value pairs are
         # individual metrics aggregated over that bin.
@@ -159,8 +179,6 @@ def bin_datasets(hdf5_file, dataset_names, orient='columns', num_bins=24):
         #     ...
         # }
 
-        binned_dataset = bin_dataset(hdf5_file, dataset_key, num_bins)
-
         # loop over time bins
         for index, counters in enumerate(binned_dataset):
             # loop over aggregate metrics in a single bin
@@ -207,58 +225,44 @@ def bin_dataset(hdf5_file, dataset_name, num_bins):
         list of dictionaries corresponding to bins.  Each dictionary contains
         data summarized over that bin's time interval.
     """
+    return expand_bins(dataset_name,
+                       tokio.tools.hdf5.bin_dataset(hdf5_file, dataset_name, num_bins))
+
+def expand_bins(dataset_name, bins):
+    """Convert the output of tokio.tools.hdf5.bin_dataset into per-bin dicts
 
+    Args:
+        dataset_name (str): name of dataset that was binned
+        bins (dict): output of tokio.tools.hdf5.bin_dataset
+
+    Returns:
+        list of dictionaries corresponding to bins.  Each dictionary contains
+        data summarized over that bin's time interval.
+    """
     base_key = DATASETS_TO_BIN_KEYS.get(dataset_name.lstrip('/'))
     if not base_key:
         raise KeyError("Cannot bin unknown dataset %s" % dataset_name)
     missing_key = "missing_" + base_key
     total_key = "num_" + base_key
 
-    dataset = hdf5_file.get(dataset_name)
-    if dataset is None:
+    if bins is None:
         return []
 
-    timestamps = hdf5_file.get_timestamps(dataset_name)
-    columns = hdf5_file.get_columns(dataset_name)
-
-    if hdf5_file.schema:
-        if not (timestamps.shape[0] % num_bins) == 0:
-            warnings.warn("Bin count %d does not evenly divide into FSStepsDataSet size %d" %
-                          (num_bins, (timestamps.shape[0])))
-        dt_per_bin = int(timestamps.shape[0] / num_bins)
-    else:
-        # no schema means h5lmt file, which has + 1 extra timestep
-        if not ((timestamps.shape[0] - 1) % num_bins) == 0:
-            warnings.warn("Bin count %d does not evenly divide into FSStepsDataSet size %d" %
-                          (num_bins, (timestamps.shape[0] - 1)))
-        dt_per_bin = int((timestamps.shape[0] - 1) / num_bins)
-
-    # we generate the missing data matrix for each dataset only once--it's very
-    # expensive to do this multiple times
-    missing_dataset = hdf5_file.get_missing(dataset_name)
-
     # create a list of dictionaries, where each list element is a bin
     binned_data = []
-    for bin_num in range(num_bins):
-        index0 = bin_num * dt_per_bin
-        indexf = (bin_num+1) * dt_per_bin
-
+    for bin_num in range(len(bins['index0'])):
         bin_datum = {
-            "index0": index0,
-            "indexf": indexf,
-            "tstart": datetime.datetime.fromtimestamp(timestamps[index0]),
-            'tend': datetime.datetime.fromtimestamp(timestamps[indexf - 1]),
+            "index0": int(bins['index0'][bin_num]),
+            "indexf": int(bins['indexf'][bin_num]),
+            "tstart": datetime.datetime.fromtimestamp(bins['tstart'][bin_num]),
+            'tend': datetime.datetime.fromtimestamp(bins['tend'][bin_num]),
         }
 
-        bin_datum["max_" + base_key] = dataset[index0:indexf, :].max()
-        bin_datum["min_" + base_key] = dataset[index0:indexf, :].min()
-        bin_datum["sum_" + base_key] = dataset[index0:indexf, :].sum()
-        bin_datum["ave_" + base_key] = bin_datum["sum_" + base_key] / float(indexf - index0)
-        bin_datum["ave_" + base_key] /= columns.shape[0]
-
-        bin_datum[missing_key] = missing_dataset[index0:indexf, :].sum()
+        for agg_key in 'max', 'min', 'sum', 'ave':
+            bin_datum["%s_%s" % (agg_key, base_key)] = float(bins[agg_key][bin_num])
 
-        bin_datum[total_key] = (indexf - index0) * columns.shape[0]
+        bin_datum[missing_key] = int(bins['missing'][bin_num])
+        bin_datum[total_key] = int(bins['num'][bin_num])
         if bin_datum[total_key]:
             bin_datum["frac_" + missing_key] = float(bin_datum[missing_key]) / bin_datum[total_key]
         else:
@@ -366,6 +370,7 @@ def print_data_summary(data, units='TiB'):
 
     return print_str
 
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     CLI tool to summarize the contents of an H5LMT file
@@ -390,6 +395,9 @@ def main(argv=None):
                         help="date/time to end in %s format" % DATE_FMT_STR)
     parser.add_argument('--json', action='store_true',
                         help='return json output')
+    parser.add_argument('-t', '--threads', type=int, default=1,
+                        help="number of HDF5 files to process in parallel (default: 1)")
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     if args.bytes:
@@ -421,12 +429,13 @@ def main(argv=None):
     all_binned_data = {}
     if not args.json:
         sys.stdout.write(print_datum(None, units=units))
-    for hdf5_filename in hdf5_filenames:
-        hdf5_file = tokio.connectors.hdf5.Hdf5(hdf5_filename, 'r')
-        binned_data = bin_datasets(hdf5_file=hdf5_file,
-                                   dataset_names=DATASETS_TO_BIN_KEYS.keys(),
-                                   orient='index',
-                                   num_bins=args.bins)
+    for _, binned_file in tokio.tools.hdf5.bin_hdf5_files(hdf5_filenames,
+                                                          DATASETS_TO_BIN_KEYS.keys(),
+                                                          args.bins,
+                                                          num_procs=args.threads):
+        binned_data = merge_binned_datasets(
+            [(key, expand_bins(key, binned_file.get(key))) for key in DATASETS_TO_BIN_KEYS.keys()],
+            orient='index')
 
         if not args.json:
             for timestamp in sorted(binned_data.keys()):
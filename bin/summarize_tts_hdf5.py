@@ -6,11 +6,16 @@ functionality provided by summarize_hdf5.py once the TTS HDF5 and pylmt formats
 converge.
 """
 
+import sys
+import csv
 import json
 import datetime
 import argparse
+import numpy
 import tokio.timeseries
 import tokio.connectors.hdf5
+import tokio.tools.hdf5
+import tokio.instrument
 
 def humanize_units(byte_count, divisor=1024.0):
     """
@@ -33,29 +38,36 @@ def summarize_tts_hdf5(hdf5_file):
     """
     Generate summary data based on the contents of TOKIO timeseries HDF5 file
     """
-    read_bytes = hdf5_file['/datatargets/readbytes'][:, :].sum()
-    write_bytes = hdf5_file['/datatargets/writebytes'][:, :].sum()
+    write_bytes = 0.0
+    for _, block in tokio.tools.hdf5.iterate_blocks(hdf5_file['/datatargets/writebytes']):
+        write_bytes += block.sum()
 
     # readrates and writerates come via the same collectd message, so if one is
     # missing, both are missing
-    values = hdf5_file['/datatargets/readbytes'][:, :]
-    num_missing = tokio.connectors.hdf5.missing_values(values).sum()
-    total = values.shape[0] * values.shape[1]
+    read_bytes = 0.0
+    num_missing = 0
+    total = 0
+    nonzero_rows = []
+    for _, block in tokio.tools.hdf5.iterate_blocks(hdf5_file['/datatargets/readbytes']):
+        read_bytes += block.sum()
+        missing = tokio.connectors.hdf5.missing_values(block)
+        num_missing += missing.sum()
+        total += block.size
+        nonzero_rows.append(missing.shape[1] - missing.sum(axis=1))
 
     # find the row offset containing the first and last nonzero data
-    first_time_idx = -1
-    last_time_idx = -1
-    nonzero_rows = tokio.connectors.hdf5.missing_values(values, inverse=True).sum(axis=1)
-    for index, value in enumerate(nonzero_rows):
-        if first_time_idx < 0 and value > 0:
-            first_time_idx = index
-        if value > 0:
-            last_time_idx = index
+    nonzero_idx = numpy.flatnonzero(numpy.concatenate(nonzero_rows))
+    if len(nonzero_idx):
+        first_time_idx = int(nonzero_idx[0])
+        last_time_idx = int(nonzero_idx[-1])
+    else:
+        first_time_idx = -1
+        last_time_idx = -1
 
     return {
-        'read_bytes': read_bytes,
-        'write_bytes': write_bytes,
-        'missing_pts': num_missing,
+        'read_bytes': float(read_bytes),
+        'write_bytes': float(write_bytes),
+        'missing_pts': int(num_missing),
         'total_pts': total,
         'missing_pct': (100.0 * float(num_missing) / total),
         'first_nonzero_idx': first_time_idx,
@@ -74,47 +86,93 @@ def print_tts_hdf5_summary(results):
     print "First non-empty row:  %9d" % results['first_nonzero_idx']
     print "Last non-empty row:   %9d" % results['last_nonzero_idx']
 
-def summarize_timesteps(hdf5_file):
+def _reduce_dataset(dataset, axis):
+    """
+    Sum a dataset along one axis one block at a time
+    """
+    result = None
+    for _, block in tokio.tools.hdf5.iterate_blocks(dataset):
+        if axis == 0:
+            block_sum = block.sum(axis=0)
+            result = block_sum if result is None else result + block_sum
+        else:
+            if result is None:
+                result = []
+            result.append(block.sum(axis=1))
+    if axis != 0 and result is not None:
+        result = numpy.concatenate(result)
+    return result
+
+def summarize_timesteps(hdf5_file, compact=False):
     """
     Summarize read/write bytes for each time step using the raw HDF5 interface
     rather than casting into a DataFrame or TimeSeries
+
+    Args:
+        hdf5_file (connectors.hdf5.Hdf5): file to summarize
+        compact (bool): return a dict of equal-length numpy arrays keyed by
+            timestamps, read_bytes, and write_bytes instead of a dict keyed by
+            timestamp
+
+    Returns:
+        dict keyed by timestamp strings whose values are dicts containing
+        read_bytes and write_bytes, or a dict of arrays if compact is True
     """
-    results = {}
-    for dataset_name in '/datatargets/writebytes', '/datatargets/readbytes':
-        timestamps = hdf5_file.get_timestamps(dataset_name)[:]
-        sum_bytes = hdf5_file[dataset_name][:, :].sum(axis=1)
-        for index, timestamp in enumerate(timestamps):
-            output_key = 'read_bytes' if 'read' in dataset_name else 'write_bytes'
-            output_val = sum_bytes[index]
-            results[str(timestamp)] = {output_key: output_val}
+    arrays = {
+        'timestamps': hdf5_file.get_timestamps('/datatargets/readbytes')[:],
+        'read_bytes': _reduce_dataset(hdf5_file['/datatargets/readbytes'], axis=1),
+        'write_bytes': _reduce_dataset(hdf5_file['/datatargets/writebytes'], axis=1),
+    }
+    if compact:
+        return arrays
 
+    results = {}
+    for index, timestamp in enumerate(arrays['timestamps']):
+        results[str(timestamp)] = {
+            'read_bytes': arrays['read_bytes'][index],
+            'write_bytes': arrays['write_bytes'][index],
+        }
     return results
 
 def print_timestep_summary(summary):
     """
     Format and print the summary data calculated by summarize_timesteps()
     """
-    for timestamp, values in summary.iteritems():
+    for timestamp in sorted(summary.keys(), key=float):
+        values = summary[timestamp]
         print "%12s %14.2f read, %14.2f written" % (
             datetime.datetime.fromtimestamp(float(timestamp)),
             values.get('read_bytes', 0),
             values.get('write_bytes', 0))
 
-def summarize_columns(hdf5_file):
+def summarize_columns(hdf5_file, compact=False):
     """
     Summarize read/write bytes for each column
-    """
-    results = {}
-    for index, column_name in enumerate(list(hdf5_file.get_columns('/datatargets/readbytes'))):
-        if column_name not in results:
-            results[column_name] = {}
-        results[column_name]['read_bytes'] = hdf5_file['/datatargets/readbytes'][:, index].sum()
 
-    for index, column_name in enumerate(list(hdf5_file.get_columns('/datatargets/writebytes'))):
-        if column_name not in results:
-            results[column_name] = {}
-        results[column_name]['write_bytes'] = hdf5_file['/datatargets/writebytes'][:, index].sum()
+    Args:
+        hdf5_file (connectors.hdf5.Hdf5): file to summarize
+        compact (bool): return a dict of equal-length numpy arrays keyed by
+            columns, read_bytes, and write_bytes instead of a dict keyed by
+            column name
+
+    Returns:
+        dict keyed by column names whose values are dicts containing
+        read_bytes and write_bytes, or a dict of arrays if compact is True
+    """
+    arrays = {
+        'columns': hdf5_file.get_columns('/datatargets/readbytes'),
+        'read_bytes': _reduce_dataset(hdf5_file['/datatargets/readbytes'], axis=0),
+        'write_bytes': _reduce_dataset(hdf5_file['/datatargets/writebytes'], axis=0),
+    }
+    if compact:
+        return arrays
 
+    results = {}
+    for index, column_name in enumerate(arrays['columns']):
+        results[column_name] = {
+            'read_bytes': arrays['read_bytes'][index],
+            'write_bytes': arrays['write_bytes'][index],
+        }
     return results
 
 def print_column_summary(results):
@@ -127,6 +185,32 @@ def print_column_summary(results):
             values.get('read_bytes', 0),
             values.get('write_bytes', 0))
 
+def write_csv(arrays, index_key, output=None):
+    """
+    Stream the compact output of summarize_timesteps() or summarize_columns()
+    as CSV one row at a time
+
+    Args:
+        arrays (dict): output of summarize_timesteps or summarize_columns with
+            compact=True
+        index_key (str): key in arrays to use as the first column
+        output (file): file-like object to which CSV should be written;
+            defaults to stdout
+    """
+    if output is None:
+        output = sys.stdout
+    writer = csv.writer(output)
+    writer.writerow([index_key, 'read_bytes', 'write_bytes'])
+    for index, key in enumerate(arrays[index_key]):
+        writer.writerow([key, arrays['read_bytes'][index], arrays['write_bytes'][index]])
+
+def _jsonify_arrays(arrays):
+    """
+    Convert a dict of numpy arrays into a dict of lists
+    """
+    return dict([(key, numpy.asarray(value).tolist()) for key, value in arrays.iteritems()])
+
+@tokio.instrument.profile_main
 def main(argv=None):
     """
     Summarize the contents of an HDF5 file generated by cache_collectdes_supplemental.py
@@ -136,17 +220,38 @@ def main(argv=None):
     parser.add_argument('-j', '--json', action='store_true', help='output as json')
     parser.add_argument('--timesteps', action='store_true', help='print a summary at each timestep')
     parser.add_argument('--columns', action='store_true', help='print a summary of each column')
+    parser.add_argument('--compact', action='store_true',
+                        help='encode --timesteps/--columns json output as arrays')
+    parser.add_argument('--csv', action='store_true',
+                        help='print --timesteps or --columns as csv instead of the summary')
+    tokio.instrument.add_profile_argument(parser)
     args = parser.parse_args(argv)
 
     hdf5_file = tokio.connectors.hdf5.Hdf5(args.file, 'r')
+
+    if args.csv:
+        if args.timesteps:
+            write_csv(summarize_timesteps(hdf5_file, compact=True), 'timestamps')
+        elif args.columns:
+            write_csv(summarize_columns(hdf5_file, compact=True), 'columns')
+        else:
+            raise Exception('--csv requires either --timesteps or --columns')
+        return
+
     results = {
         'total': summarize_tts_hdf5(hdf5_file),
     }
 
+    # compact arrays are only meaningful when serialized as json
+    compact = args.compact and args.json
     if args.timesteps:
-        results['timesteps'] = summarize_timesteps(hdf5_file)
+        results['timesteps'] = summarize_timesteps(hdf5_file, compact=compact)
+        if compact:
+            results['timesteps'] = _jsonify_arrays(results['timesteps'])
     if args.columns:
-        results['columns'] = summarize_columns(hdf5_file)
+        results['columns'] = summarize_columns(hdf5_file, compact=compact)
+        if compact:
+            results['columns'] = _jsonify_arrays(results['columns'])
 
     if args.json:
         print json.dumps(results, indent=4, sort_keys=True)
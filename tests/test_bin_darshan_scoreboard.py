@@ -6,9 +6,11 @@ Test the bin/summarize_darshanlogs.py and bin/darshan_scoreboard.py tools
 import os
 import glob
 import json
+import tempfile
 import warnings
 import nose
 import tokiotest
+import tokio.tools.darshan
 import tokiobin.summarize_darshanlogs
 import tokiobin.darshan_scoreboard
 
@@ -209,3 +211,63 @@ def test_scoreboard_exclude_exe():
         # make sure that we successfully removed something that was present in
         # the unfiltered reference
         assert len(decoded_result['per_exe']) < len(reference_result['per_exe'])
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_scoreboard_store():
+    """bin/darshan_scoreboard.py with a summary store
+    """
+    summary = {}
+    for index, darshan_log in enumerate(LOGS_FROM_DIR):
+        summary[darshan_log] = {
+            '/': {'read_bytes': index, 'write_bytes': 0},
+            tokiotest.SAMPLE_DARSHAN_ALL_MOUNTS: {'read_bytes': 2**30 * index,
+                                                  'write_bytes': 2**20},
+        }
+    json.dump(summary, tokiotest.TEMP_FILE)
+    tokiotest.TEMP_FILE.flush()
+
+    store_file = tokiotest.TEMP_FILE.name + '.sqlite3'
+    store = tokio.tools.darshan.DarshanSummaryStore(store_file)
+    store.update(summary)
+    store.close()
+    try:
+        argv = ['--json', tokiotest.TEMP_FILE.name]
+        print "Executing:", " ".join(argv)
+        reference_result = json.loads(tokiotest.run_bin(tokiobin.darshan_scoreboard, argv))
+
+        argv = ['--json', store_file]
+        print "Executing:", " ".join(argv)
+        decoded_result = json.loads(tokiotest.run_bin(tokiobin.darshan_scoreboard, argv))
+        print "Result:", decoded_result
+        assert decoded_result['per_fs']
+        assert decoded_result == reference_result
+    finally:
+        os.unlink(store_file)
+
+@tokiotest.needs_darshan
+def test_summarize_store():
+    """bin/summarize_darshanlogs.py --store
+    """
+    tokiotest.check_darshan()
+    store_file = tempfile.mktemp(suffix='.sqlite3')
+    try:
+        argv = ['--store', store_file] + SAMPLE_DARSHAN_LOGS[0:1]
+        print "Executing:", " ".join(argv)
+        output_str = tokiotest.run_bin(tokiobin.summarize_darshanlogs, argv)
+        assert output_str.startswith('Added 1 ')
+
+        # only new logs are processed
+        argv = ['--store', store_file] + SAMPLE_DARSHAN_LOGS
+        print "Executing:", " ".join(argv)
+        output_str = tokiotest.run_bin(tokiobin.summarize_darshanlogs, argv)
+        assert output_str.startswith('Added %d ' % (len(SAMPLE_DARSHAN_LOGS) - 1))
+
+        # store contents match the json output
+        argv = SAMPLE_DARSHAN_LOGS
+        reference_result = json.loads(tokiotest.run_bin(tokiobin.summarize_darshanlogs, argv))
+        store = tokio.tools.darshan.DarshanSummaryStore(store_file)
+        assert store.to_dict() == reference_result
+        store.close()
+    finally:
+        if os.path.exists(store_file):
+            os.unlink(store_file)
@@ -22,6 +22,8 @@ def wrap_function(test_input):
         argv += ['--username', test_input['params']['username']]
     if test_input['params']['jobid'] is not None:
         argv += ['--jobid', str(test_input['params']['jobid'])]
+    if test_input['params'].get('index_file') is not None:
+        argv += ['--index', test_input['params']['index_file']]
     if 'which' in test_input['params']:
         argv += ['--load', test_input['params']['which']]
     argv += [test_input['params']['darshan_log_dir']]
@@ -6,7 +6,9 @@ Test the bin/summarize_h5lmt.py tool
 import os
 import json
 import datetime
+import numpy
 import tokio
+import tokio.tools.hdf5
 import tokiotest
 import tokiobin.summarize_h5lmt
 
@@ -25,6 +27,9 @@ INPUT_PARAMS = {
     '--summary tts': ['--summary', tokiotest.SAMPLE_LMTDB_TTS_HDF5],
     '--json tts': ['--json', tokiotest.SAMPLE_LMTDB_TTS_HDF5],
     '--json --summary tts': ['--json', '--summary', tokiotest.SAMPLE_LMTDB_TTS_HDF5],
+    'uneven bins tts': ['--json', '--bins', '7', tokiotest.SAMPLE_LMTDB_TTS_HDF5],
+    '--threads tts,h5lmt': ['--json', '--threads', '2', tokiotest.SAMPLE_LMTDB_TTS_HDF5,
+                            tokiotest.SAMPLE_LMTDB_H5LMT],
     'date range': [
         '--json',
         '--start', START_TIME.strftime(tokiobin.summarize_h5lmt.DATE_FMT),
@@ -64,3 +69,32 @@ def test_all():
         func = run_summarize_h5lmt
         func.description = 'bin/summarize_h5lmt.py ' + descr
         yield func, args
+
+def verify_bin_dataset(hdf5_filename, dataset_name, num_bins):
+    """
+    Compare tools.hdf5.bin_dataset to a bin-by-bin reduction
+    """
+    hdf5_file = tokio.connectors.hdf5.Hdf5(hdf5_filename, 'r')
+    bins = tokio.tools.hdf5.bin_dataset(hdf5_file, dataset_name, num_bins)
+    values = hdf5_file[dataset_name][:]
+    missing = hdf5_file.get_missing(dataset_name)
+
+    assert len(bins['index0']) == num_bins
+    assert bins['index0'][0] == 0
+    assert (bins['index0'][1:] == bins['indexf'][:-1]).all()
+    for index, (index0, indexf) in enumerate(zip(bins['index0'], bins['indexf'])):
+        assert numpy.isclose(bins['max'][index], values[index0:indexf].max())
+        assert numpy.isclose(bins['min'][index], values[index0:indexf].min())
+        assert numpy.isclose(bins['sum'][index], values[index0:indexf].sum())
+        assert bins['missing'][index] == missing[index0:indexf].sum()
+        assert bins['num'][index] == values[index0:indexf].size
+
+def test_bin_dataset():
+    """
+    tools.hdf5.bin_dataset correctness
+    """
+    for num_bins in 1, 6, 7, 60:
+        for dataset_name in tokiobin.summarize_h5lmt.DATASETS_TO_BIN_KEYS:
+            func = verify_bin_dataset
+            func.description = 'tools.hdf5.bin_dataset %s %d bins' % (dataset_name, num_bins)
+            yield func, tokiotest.SAMPLE_LMTDB_TTS_HDF5, dataset_name, num_bins
@@ -4,7 +4,9 @@ Test the bin/summarize_tts_hdf5.py tool.
 """
 
 import json
+import numpy
 import tokiotest
+import tokio.connectors.hdf5
 import tokiobin.summarize_tts_hdf5
 
 INPUT_ARGS = [
@@ -14,6 +16,10 @@ INPUT_ARGS = [
     ["--timesteps"],
     ["--columns", "--json"],
     ["--timesteps", "--json"],
+    ["--timesteps", "--json", "--compact"],
+    ["--columns", "--json", "--compact"],
+    ["--timesteps", "--csv"],
+    ["--columns", "--csv"],
 ]
 
 def verify_json(output):
@@ -45,3 +51,18 @@ def exec_cmd(argv):
     if 'json' in ''.join(argv):
         output_json = json.loads(output_str)
         verify_json(output_json)
+
+def test_compact_summaries():
+    """
+    bin/summarize_tts_hdf5.py compact summaries match full reductions
+    """
+    hdf5_file = tokio.connectors.hdf5.Hdf5(tokiotest.SAMPLE_TOKIOTS_FILE, 'r')
+    for dataset_name, key in ('/datatargets/readbytes', 'read_bytes'), \
+                             ('/datatargets/writebytes', 'write_bytes'):
+        values = hdf5_file[dataset_name][:, :]
+        timesteps = tokiobin.summarize_tts_hdf5.summarize_timesteps(hdf5_file, compact=True)
+        columns = tokiobin.summarize_tts_hdf5.summarize_columns(hdf5_file, compact=True)
+        assert numpy.allclose(timesteps[key], values.sum(axis=1))
+        assert numpy.allclose(columns[key], values.sum(axis=0))
+        assert len(timesteps['timestamps']) == values.shape[0]
+        assert len(columns['columns']) == values.shape[1]
@@ -6,6 +6,8 @@ database is not available, so only the sqlite3 functionality will be exercised.
 """
 
 import os
+import shutil
+import tempfile
 import nose
 import tokiotest
 import tokio.connectors.cachingdb
@@ -142,7 +144,97 @@ def verify_cache_functionality(test_db):
         print "Found table %s with %d records" % (test_table, len(result))
         assert len(result) == LIMIT_CYCLES[-1]
 
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def verify_write_cache(test_db):
+    """
+    Performs the same integration test as verify_cache_functionality, but
+    writes rows through to the cache db as they are retrieved.  Also verifies
+    that rows saved in memory before the write-through cache is connected are
+    written out.
+    """
+    test_tables = sorted(TEST_TABLES.keys())
+
+    ### Save one table in memory before connecting the write-through cache
+    test_db.query(
+        query_str='SELECT * from %s LIMIT %d' % (test_tables[0], LIMIT_CYCLES[-1]),
+        table=test_tables[0],
+        table_schema=TEST_TABLES[test_tables[0]])
+    assert len(test_db.saved_results[test_tables[0]]['rows']) == LIMIT_CYCLES[-1]
+
+    test_db.connect_write_cache(tokiotest.TEMP_FILE.name, flush_rows=LIMIT_CYCLES[0] + 1)
+    assert len(test_db.saved_results) == 0
+
+    for test_table in test_tables[1:]:
+        for iteration, limit in enumerate(LIMIT_CYCLES):
+            query_str = 'SELECT * from %s LIMIT %d' % (test_table, limit)
+            if iteration == 0:
+                schema_param = TEST_TABLES[test_table]
+            else:
+                schema_param = None
+            if iteration % 2:
+                result = test_db.query(query_str=query_str,
+                                       table=test_table,
+                                       table_schema=schema_param)
+            else:
+                result = [row
+                          for batch in test_db.iterate_query(query_str=query_str,
+                                                             table=test_table,
+                                                             table_schema=schema_param,
+                                                             batch_size=LIMIT_CYCLES[0] / 2)
+                          for row in batch]
+            assert len(result) == limit
+            assert len(test_db.saved_results) == 0
+
+    ### Flush and close the write-through cache
+    test_db.save_cache(tokiotest.TEMP_FILE.name)
+    assert test_db.write_cache_db is None
+
+    cache_db = tokio.connectors.cachingdb.CachingDb(cache_file=tokiotest.TEMP_FILE.name)
+    result = cache_db.query("SELECT COUNT(name) from sqlite_master WHERE type='table'")
+    print "Found %d tables in %s" % (result[0][0], cache_db.cache_file)
+    assert result[0][0] == len(TEST_TABLES)
+    for test_table in test_tables:
+        result = cache_db.query(query_str='SELECT * from %s' % test_table)
+        print "Found table %s with %d records" % (test_table, len(result))
+        assert len(result) == LIMIT_CYCLES[-1]
+    cache_db.close_cache()
+
+def verify_iterate_query(test_db):
+    """
+    cachingdb.iterate_query returns the same rows as cachingdb.query
+    """
+    for test_table, test_table_schema in TEST_TABLES.iteritems():
+        limit = LIMIT_CYCLES[-1]
+        query_str = 'SELECT * from %s LIMIT %d' % (test_table, limit)
+        expected = list(test_db.query(query_str=query_str))
+
+        for save_results in True, False:
+            test_db.drop_cache()
+            batches = list(test_db.iterate_query(query_str=query_str,
+                                                 table=test_table,
+                                                 table_schema=test_table_schema,
+                                                 batch_size=LIMIT_CYCLES[0],
+                                                 save_results=save_results))
+            assert [len(batch) for batch in batches] == [LIMIT_CYCLES[0]] * (limit / LIMIT_CYCLES[0])
+            assert [tuple(row) for batch in batches for row in batch] == expected
+            if save_results:
+                assert test_db.saved_results[test_table]['rows'] == expected
+                assert test_db.saved_results[test_table]['schema'] == test_table_schema
+            else:
+                assert test_table not in test_db.saved_results
+
+        # abandoning iteration early does not prevent further queries
+        batches = test_db.iterate_query(query_str=query_str, batch_size=1)
+        assert len(next(batches)) == 1
+        batches.close()
+        assert list(test_db.query(query_str=query_str)) == expected
+    test_db.drop_cache()
+
 TEST_FUNCTIONS = [
+    (
+        "cachingdb.iterate_query functionality",
+        verify_iterate_query,
+    ),
     (
         "cachingdb does not save results when table=None",
         query_without_saving,
@@ -151,6 +243,10 @@ TEST_FUNCTIONS = [
         "cachingdb.save_cache functionality",
         verify_cache_functionality,
     ),
+    (
+        "cachingdb.connect_write_cache functionality",
+        verify_write_cache,
+    ),
 ]
 
 def test_remote_db():
@@ -187,3 +283,175 @@ def test_cache_db():
         func = test_function
         func.description = description
         yield func, test_db
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_coverage():
+    """
+    cachingdb.add_coverage and cachingdb.get_coverage_gaps
+    """
+    test_db = tokio.connectors.cachingdb.CachingDb(cache_file=tokiotest.TEMP_FILE.name)
+    assert test_db.get_coverage_gaps('OST_DATA', 0, 100) == [(0, 100)]
+    assert test_db.get_coverage_gaps('OST_DATA', 100, 100) == []
+
+    test_db.add_coverage('OST_DATA', 10, 20)
+    test_db.add_coverage('OST_DATA', 40, 50)
+    test_db.add_coverage('OSS_DATA', 0, 100)
+    assert test_db.get_coverage_gaps('OST_DATA', 0, 100) == [(0, 10), (20, 40), (50, 100)]
+    assert test_db.get_coverage_gaps('OST_DATA', 15, 45) == [(20, 40)]
+    assert test_db.get_coverage_gaps('OST_DATA', 12, 18) == []
+    assert test_db.get_coverage_gaps('OSS_DATA', 0, 100) == []
+
+    ### adjoining and overlapping ranges are merged
+    test_db.add_coverage('OST_DATA', 20, 30)
+    test_db.add_coverage('OST_DATA', 25, 45)
+    assert test_db.get_coverage_gaps('OST_DATA', 0, 100) == [(0, 10), (50, 100)]
+    result = test_db.query("SELECT COUNT(*) FROM %s WHERE TABLE_NAME = 'OST_DATA'"
+                           % tokio.connectors.cachingdb.COVERAGE_TABLE)
+    assert result[0][0] == 1
+
+    ### coverage is retained by the cache db
+    test_db.close_cache()
+    test_db = tokio.connectors.cachingdb.CachingDb(cache_file=tokiotest.TEMP_FILE.name)
+    assert test_db.get_coverage_gaps('OST_DATA', 0, 100) == [(0, 10), (50, 100)]
+    test_db.close_cache()
+
+def test_result_cache():
+    """
+    cachingdb.QueryResultCache
+    """
+    result_cache = tokio.connectors.cachingdb.QueryResultCache(max_rows=10)
+    assert result_cache.get('a') is None
+    result_cache.put('a', 'OST_DATA', [(1, 2)] * 4)
+    result_cache.put('b', 'OST_DATA', [(3, 4)] * 4)
+    assert result_cache.get('a') == [(1, 2)] * 4
+
+    ### 'b' is the least recently used, so it is evicted to make room for 'c'
+    result_cache.put('c', 'OSS_DATA', [(5, 6)] * 4)
+    assert result_cache.get('b') is None
+    assert result_cache.get('c') == [(5, 6)] * 4
+
+    ### results that cannot fit are never cached
+    result_cache.put('d', 'OSS_DATA', [(7, 8)] * 11)
+    assert result_cache.get('d') is None
+
+    stats = result_cache.get_stats()
+    print stats
+    assert stats == {
+        'hits': 2,
+        'disk_hits': 0,
+        'misses': 3,
+        'evictions': 1,
+        'entries': 2,
+        'rows': 8,
+        'bytes': 0,
+    }
+
+    result_cache.clear(['OSS_DATA'])
+    assert result_cache.entries.keys() == ['a']
+    result_cache.clear()
+    assert result_cache.get_stats()['rows'] == 0
+
+    ### results are also bounded by their size
+    result_cache = tokio.connectors.cachingdb.QueryResultCache(max_rows=None, max_bytes=1)
+    result_cache.put('a', 'OST_DATA', [(1, 2)])
+    assert result_cache.get('a') is None
+    result_cache.max_bytes = 10000
+    result_cache.put('a', 'OST_DATA', [(1, 2)])
+    assert 0 < result_cache.get_stats()['bytes'] <= 10000
+
+def test_result_cache_disk():
+    """
+    cachingdb.QueryResultCache on-disk tier
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        result_cache = tokio.connectors.cachingdb.QueryResultCache(max_rows=4, cache_dir=cache_dir)
+        result_cache.put('a', 'OST_DATA', [(1, 2)] * 4, persist=True)
+        result_cache.put('b', 'OST_DATA', [(3, 4)] * 4, persist=True)
+
+        ### results evicted from memory or created by another process are read
+        ### back from disk
+        assert result_cache.get('a', persist=True) == [(1, 2)] * 4
+        other_cache = tokio.connectors.cachingdb.QueryResultCache(cache_dir=cache_dir)
+        assert other_cache.get('b') is None
+        assert other_cache.get('b', persist=True) == [(3, 4)] * 4
+        assert other_cache.get('c', persist=True) is None
+        assert other_cache.get_stats()['disk_hits'] == 1
+
+        ### results are only written to disk if requested
+        result_cache.put('c', 'OST_DATA', [(5, 6)] * 4)
+        assert len(os.listdir(cache_dir)) == 2
+
+        ### entries are evicted from disk once they exceed max_disk_bytes
+        entry_size = os.path.getsize(os.path.join(cache_dir, os.listdir(cache_dir)[0]))
+        result_cache.disk_cache.max_bytes = entry_size * 2
+        result_cache.put('d', 'OST_DATA', [(7, 8)] * 4, persist=True)
+        assert len(os.listdir(cache_dir)) <= 2
+    finally:
+        shutil.rmtree(cache_dir)
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_result_cache_stale():
+    """
+    cachingdb.CachingDb does not reuse results after its cache db is rewritten
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        test_table = 'OST_DATA'
+        query_str = 'SELECT * from %s' % test_table
+        for limit in LIMIT_CYCLES[0], LIMIT_CYCLES[-1]:
+            ### (re)generate the cache db at the same path
+            source_db = tokio.connectors.cachingdb.CachingDb(cache_file=tokiotest.SAMPLE_LMTDB_FILE)
+            source_db.query('SELECT * from %s LIMIT %d' % (test_table, limit),
+                            table=test_table,
+                            table_schema=TEST_TABLES[test_table])
+            if os.path.exists(tokiotest.TEMP_FILE.name):
+                os.unlink(tokiotest.TEMP_FILE.name)
+            source_db.save_cache(tokiotest.TEMP_FILE.name)
+
+            test_db = tokio.connectors.cachingdb.CachingDb(cache_file=tokiotest.TEMP_FILE.name)
+            test_db.memoized_tables.add(test_table)
+            test_db.persisted_tables.add(test_table)
+            test_db.result_cache = tokio.connectors.cachingdb.QueryResultCache(cache_dir=cache_dir)
+            assert len(test_db.query(query_str, table=test_table)) == limit
+            assert test_db.last_hit == tokio.connectors.cachingdb.HIT_CACHE_DB
+            test_db.close_cache()
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_memoization():
+    """
+    cachingdb.CachingDb memoization
+    """
+    test_db = tokio.connectors.cachingdb.CachingDb(cache_file=tokiotest.SAMPLE_LMTDB_FILE)
+    test_db.memoized_tables.add('OST_DATA')
+    query_str = 'SELECT * from OST_DATA LIMIT %d' % LIMIT_CYCLES[-1]
+
+    expected = test_db.query(query_str, table='OST_DATA')
+    assert test_db.last_hit == tokio.connectors.cachingdb.HIT_CACHE_DB
+    assert test_db.query(query_str, table='OST_DATA') == expected
+    assert test_db.last_hit == tokio.connectors.cachingdb.HIT_MEMORY
+
+    ### results are not memoized unless requested or their table opts in
+    test_db.query(query_str, table='OST_DATA', memoize=False)
+    assert test_db.last_hit == tokio.connectors.cachingdb.HIT_CACHE_DB
+    test_db.query('SELECT * from OSS_DATA LIMIT 1', table='OSS_DATA')
+    test_db.query('SELECT * from OSS_DATA LIMIT 1', table='OSS_DATA')
+    assert test_db.last_hit == tokio.connectors.cachingdb.HIT_CACHE_DB
+
+    ### iterate_query shares memoized results
+    batches = list(test_db.iterate_query(query_str, table='OST_DATA',
+                                         batch_size=LIMIT_CYCLES[0], memoize=True))
+    assert test_db.last_hit == tokio.connectors.cachingdb.HIT_MEMORY
+    assert [len(batch) for batch in batches] == [LIMIT_CYCLES[0]] * (LIMIT_CYCLES[-1] / LIMIT_CYCLES[0])
+    assert [row for batch in batches for row in batch] == expected
+
+    ### drop_cache also drops memoized results
+    test_db.drop_cache(['OST_DATA'])
+    assert len(test_db.result_cache.entries) == 0
+    query_str = 'SELECT * from OST_DATA LIMIT %d' % LIMIT_CYCLES[0]
+    for _ in range(2):
+        batches = list(test_db.iterate_query(query_str, table='OST_DATA', memoize=True))
+    assert test_db.last_hit == tokio.connectors.cachingdb.HIT_MEMORY
+    assert len(test_db.saved_results['OST_DATA']['rows']) == LIMIT_CYCLES[0]
+    assert test_db.result_cache.get_stats()['entries'] == 1
@@ -3,8 +3,69 @@
 Test the Darshan connector
 """
 
+import os
+import json
+import time
+import shutil
+import tempfile
+import nose
+import numpy
 import tokiotest
 import tokio.connectors.darshan
+import tokio.connectors._darshan
+
+# Darshan logs whose totals and perf estimates are compared to darshan-parser
+SAMPLE_DARSHAN_LOGS = [
+    tokiotest.SAMPLE_DARSHAN_LOG,
+    os.path.join(tokiotest.INPUT_DIR, 'sample-badost.darshan'),
+    os.path.join(tokiotest.INPUT_DIR, 'sample-goodost.darshan'),
+]
+
+# Abridged output of darshan-parser --base used to exercise the parser without
+# requiring darshan-parser itself
+SAMPLE_BASE_OUTPUT = """# darshan log version: 3.10
+# compression method: ZLIB
+# exe: /global/homes/u/user/a.out --verbose
+# uid: 69615
+# jobid: 4478544
+# start_time: 1489975667
+# start_time_asci: Mon Mar 20 02:07:47 2017
+# end_time: 1489975783
+# end_time_asci: Mon Mar 20 02:09:43 2017
+# nprocs: 2
+# run time: 117
+# metadata: lib_ver = 3.1.3
+# metadata: h = romio_no_indep_rw=true;cb_nodes=4
+
+# log file regions
+# -------------------------------------------------------
+# POSIX module: 345 bytes (compressed), 1640 bytes (uncompressed)
+
+# mounted file systems (mount point and fs type)
+# -------------------------------------------------------
+# mount entry:\t/scratch2\tlustre
+# mount entry:\t/\trootfs
+
+# **************************************************************
+# POSIX module data
+# **************************************************************
+
+#<module>\t<rank>\t<record id>\t<counter>\t<value>\t<file name>\t<mount pt>\t<fs type>
+POSIX\t0\t6563482044800691889\tPOSIX_OPENS\t1\t/scratch2/out.dat\t/scratch2\tlustre
+POSIX\t0\t6563482044800691889\tPOSIX_BYTES_WRITTEN\t4096\t/scratch2/out.dat\t/scratch2\tlustre
+POSIX\t0\t6563482044800691889\tPOSIX_F_WRITE_TIME\t0.250000\t/scratch2/out.dat\t/scratch2\tlustre
+POSIX\t1\t6563482044800691889\tPOSIX_OPENS\t1\t/scratch2/out.dat\t/scratch2\tlustre
+POSIX\t1\t6563482044800691889\tPOSIX_BYTES_WRITTEN\t8192\t/scratch2/out.dat\t/scratch2\tlustre
+POSIX\t1\t6563482044800691889\tPOSIX_F_WRITE_TIME\t0.500000\t/scratch2/out.dat\t/scratch2\tlustre
+
+# **************************************************************
+# STDIO module data
+# **************************************************************
+
+#<module>\t<rank>\t<record id>\t<counter>\t<value>\t<file name>\t<mount pt>\t<fs type>
+STDIO\t0\t9221139406627412924\tSTDIO_OPENS\t1\t<STDOUT>\tUNKNOWN\tUNKNOWN
+STDIO\t0\t9221139406627412924\tSTDIO_BYTES_WRITTEN\t1024\t<STDOUT>\tUNKNOWN\tUNKNOWN
+"""
 
 def verify_darshan(darshan_data):
     """
@@ -146,3 +207,344 @@ def test_all():
     verify_perf_counters(darshan)
     verify_base_counters(darshan)
     verify_total_counters(darshan)
+
+def streamed_darshan(input_file, **kwargs):
+    """Create a Darshan object whose darshan-parser simply streams input_file
+    """
+    darshan = tokio.connectors.darshan.Darshan(input_file, **kwargs)
+    # drop the darshan-parser flag and stream the log file argument instead
+    darshan.subprocess_cmd = ['sh', '-c', 'cat "$2"', 'sh']
+    return darshan
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_streaming_parse():
+    """
+    darshan-parser output streamed from a subprocess
+    """
+    tokiotest.TEMP_FILE.write(SAMPLE_BASE_OUTPUT)
+    tokiotest.TEMP_FILE.flush()
+
+    darshan = streamed_darshan(tokiotest.TEMP_FILE.name)
+    darshan.darshan_parser_base()
+    verify_darshan(darshan)
+    verify_base_counters(darshan)
+
+    posix_record = darshan['counters']['posix']['/scratch2/out.dat']
+    assert posix_record['1']['BYTES_WRITTEN'] == 8192
+    assert posix_record['1']['F_WRITE_TIME'] == 0.5
+    assert darshan['mounts']['/scratch2'] == 'lustre'
+    assert darshan['header']['exe'] == ['/global/homes/u/user/a.out', '--verbose']
+    assert len(darshan['header']['metadata']) == 2
+
+    # header and mounts must be identical to those parsed from a string
+    from_string = tokio.connectors.darshan.Darshan(from_string=SAMPLE_BASE_OUTPUT)
+    assert from_string['header'] == darshan['header']
+    assert from_string['mounts'] == darshan['mounts']
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_load_json_cache():
+    """
+    json cache files are detected and loaded
+    """
+    tokiotest.TEMP_FILE.write(SAMPLE_BASE_OUTPUT)
+    tokiotest.TEMP_FILE.flush()
+    darshan = streamed_darshan(tokiotest.TEMP_FILE.name)
+    darshan.darshan_parser_base()
+
+    cache_file = tokiotest.TEMP_FILE.name + '.json'
+    try:
+        with open(cache_file, 'w') as cache_fp:
+            # leading whitespace should not defeat format detection
+            cache_fp.write("\n  ")
+            json.dump(darshan, cache_fp, indent=4)
+        cached = tokio.connectors.darshan.Darshan(cache_file=cache_file)
+    finally:
+        tokiotest.try_unlink(cache_file)
+
+    assert cached == json.loads(json.dumps(darshan))
+    verify_darshan(cached)
+    verify_base_counters(cached)
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_columnar():
+    """
+    columnar record store matches nested dict counters
+    """
+    tokiotest.TEMP_FILE.write(SAMPLE_BASE_OUTPUT)
+    tokiotest.TEMP_FILE.flush()
+
+    darshan = streamed_darshan(tokiotest.TEMP_FILE.name)
+    darshan.darshan_parser_base()
+
+    columnar = streamed_darshan(tokiotest.TEMP_FILE.name, columnar=True)
+    columnar.darshan_parser_base()
+
+    assert not columnar['counters']
+    assert sorted(columnar.records.keys()) == sorted(darshan['counters'].keys())
+    for module, records in columnar.records.iteritems():
+        # compatibility accessor
+        assert records.to_dict() == darshan['counters'][module]
+        for file_name, ranks_data in darshan['counters'][module].iteritems():
+            assert file_name in records
+            assert records[file_name] == ranks_data
+
+    posix = columnar.records['posix']
+    assert posix.num_records == 2
+    assert posix.counters['BYTES_WRITTEN'].sum() == 4096 + 8192
+    assert posix.counters['F_WRITE_TIME'].dtype.kind == 'f'
+
+    # DataFrame view
+    dataframe = posix.to_dataframe()
+    assert len(dataframe) == posix.num_records
+    assert (dataframe['mount_pt'] == '/scratch2').all()
+    assert dataframe.groupby('file_name')['BYTES_WRITTEN'].sum()['/scratch2/out.dat'] == 12288
+
+@tokiotest.needs_darshan
+def test_columnar_base():
+    """
+    columnar darshan_parser_base() method
+    """
+    tokiotest.check_darshan()
+    darshan = tokio.connectors.darshan.Darshan(tokiotest.SAMPLE_DARSHAN_LOG)
+    darshan.darshan_parser_base()
+    columnar = tokio.connectors.darshan.Darshan(tokiotest.SAMPLE_DARSHAN_LOG, columnar=True)
+    columnar.darshan_parser_base()
+    for module, records in columnar.records.iteritems():
+        assert records.to_dict() == darshan['counters'][module]
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_select_counters():
+    """
+    modules and counters selection
+    """
+    tokiotest.TEMP_FILE.write(SAMPLE_BASE_OUTPUT)
+    tokiotest.TEMP_FILE.flush()
+
+    for columnar in False, True:
+        darshan = streamed_darshan(tokiotest.TEMP_FILE.name,
+                                   columnar=columnar,
+                                   modules=['posix'],
+                                   counters=['BYTES_*', 'OPENS'])
+        darshan.darshan_parser_base()
+        if columnar:
+            counters = dict((module, records.to_dict()) for module, records in darshan.records.iteritems())
+        else:
+            counters = darshan['counters']
+        assert counters.keys() == ['posix']
+        for ranks_data in counters['posix'].itervalues():
+            for counter_data in ranks_data.itervalues():
+                assert sorted(counter_data.keys()) == ['BYTES_WRITTEN', 'OPENS']
+
+    # modules whose counters were all filtered out should still appear
+    darshan = streamed_darshan(tokiotest.TEMP_FILE.name, counters=['F_WRITE_TIME'])
+    darshan.darshan_parser_base()
+    assert sorted(darshan['counters'].keys()) == ['posix', 'stdio']
+    assert not darshan['counters']['stdio']
+
+@tokiotest.needs_darshan
+def test_select_counters_logs():
+    """
+    modules and counters selection on real logs
+    """
+    tokiotest.check_darshan()
+    darshan = tokio.connectors.darshan.Darshan(tokiotest.SAMPLE_DARSHAN_LOG)
+    darshan.darshan_parser_base()
+    darshan.darshan_parser_total()
+    selected = tokio.connectors.darshan.Darshan(tokiotest.SAMPLE_DARSHAN_LOG,
+                                                modules=['POSIX', 'mpi-io'],
+                                                counters=['BYTES_READ', 'F_*_TIME'])
+    selected.darshan_parser_base()
+    selected.darshan_parser_total()
+
+    assert sorted(selected['counters'].keys()) == ['mpiio', 'posix']
+    for module, files_data in selected['counters'].iteritems():
+        for file_name, ranks_data in files_data.iteritems():
+            if file_name == '_total':
+                ranks_data = {None: ranks_data}
+            for rank, counter_data in ranks_data.iteritems():
+                assert counter_data
+                for counter, value in counter_data.iteritems():
+                    assert counter == 'BYTES_READ' \
+                           or (counter.startswith('F_') and counter.endswith('_TIME'))
+                    if file_name == '_total':
+                        assert darshan['counters'][module][file_name][counter] == value
+                    else:
+                        assert darshan['counters'][module][file_name][rank][counter] == value
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_derive_from_base():
+    """
+    total and perf counters derived from base counters
+    """
+    tokiotest.TEMP_FILE.write(SAMPLE_BASE_OUTPUT)
+    tokiotest.TEMP_FILE.flush()
+
+    for columnar in False, True:
+        darshan = streamed_darshan(tokiotest.TEMP_FILE.name, columnar=columnar)
+        darshan.darshan_parser_base(total=True, perf=True)
+        verify_total_counters(darshan)
+
+        total = darshan['counters']['posix']['_total']
+        assert total['OPENS'] == 2
+        assert total['BYTES_WRITTEN'] == 12288
+        assert abs(total['F_WRITE_TIME'] - 0.75) < 1.0e-6
+
+        perf = darshan['counters']['posix']['_perf']
+        assert perf['total_bytes'] == 12288
+        assert perf['slowest_rank_unique_files'] == 1
+        assert abs(perf['slowest_rank_io_time_unique_files'] - 0.5) < 1.0e-6
+        assert abs(perf['agg_perf_by_slowest'] - 12288 / 1048576.0 / 0.5) < 1.0e-6
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_load_header():
+    """
+    load_header() stops darshan-parser once counters begin
+    """
+    tokiotest.TEMP_FILE.write(SAMPLE_BASE_OUTPUT)
+    tokiotest.TEMP_FILE.flush()
+
+    darshan = streamed_darshan(tokiotest.TEMP_FILE.name, parsed_cache_dir='')
+    # a darshan-parser that never finishes on its own
+    darshan.subprocess_cmd = ['sh', '-c', 'cat "$2"; exec sleep 60', 'sh']
+    time0 = time.time()
+    darshan.load_header()
+    assert time.time() - time0 < 30.0
+
+    assert 'counters' not in darshan
+    assert darshan['header']['nprocs'] == 2
+    assert darshan['header']['jobid'] == '4478544'
+    assert darshan['mounts']['/scratch2'] == 'lustre'
+
+    # the header must match that of a full parse
+    full = streamed_darshan(tokiotest.TEMP_FILE.name, parsed_cache_dir='')
+    full.darshan_parser_base()
+    assert full['header'] == darshan['header']
+    assert full['mounts'] == darshan['mounts']
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_parsed_cache():
+    """
+    parsed logs are cached on disk and reused
+    """
+    tokiotest.TEMP_FILE.write(SAMPLE_BASE_OUTPUT)
+    tokiotest.TEMP_FILE.flush()
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        for columnar in False, True:
+            reference = streamed_darshan(tokiotest.TEMP_FILE.name,
+                                         columnar=columnar,
+                                         parsed_cache_dir='')
+            reference.darshan_parser_base(total=True)
+            assert reference.parsed_cache is None
+
+            for expect_hit in False, True:
+                darshan = streamed_darshan(tokiotest.TEMP_FILE.name,
+                                           columnar=columnar,
+                                           parsed_cache_dir=cache_dir)
+                hits = darshan.parsed_cache.hits
+                darshan.darshan_parser_base(total=True)
+                assert (darshan.parsed_cache.hits > hits) == expect_hit
+                assert darshan == reference
+                assert sorted(darshan.records.keys()) == sorted(reference.records.keys())
+                for module, records in darshan.records.iteritems():
+                    assert records.to_dict() == reference.records[module].to_dict()
+
+        # parsing with different parameters must not reuse the same entry
+        darshan = streamed_darshan(tokiotest.TEMP_FILE.name,
+                                   counters=['BYTES_WRITTEN'],
+                                   parsed_cache_dir=cache_dir)
+        hits = darshan.parsed_cache.hits
+        darshan.darshan_parser_base()
+        assert darshan.parsed_cache.hits == hits
+        assert darshan['counters']['posix']['/scratch2/out.dat']['0'] == {'BYTES_WRITTEN': 4096}
+
+        # modifying the log must invalidate its entry
+        tokiotest.TEMP_FILE.write("\n")
+        tokiotest.TEMP_FILE.flush()
+        os.utime(tokiotest.TEMP_FILE.name, (time.time() + 10, time.time() + 10))
+        darshan = streamed_darshan(tokiotest.TEMP_FILE.name, parsed_cache_dir=cache_dir)
+        hits = darshan.parsed_cache.hits
+        darshan.darshan_parser_base()
+        assert darshan.parsed_cache.hits == hits
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_parsed_cache_eviction():
+    """
+    parsed log cache evicts least recently used entries
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        arrays = {'values': numpy.arange(1000)}
+        parsed_cache = tokio.connectors._darshan.ParsedLogCache(cache_dir)
+        parsed_cache.put('a', arrays)
+        entry_bytes = os.path.getsize(os.path.join(cache_dir, 'a.npz'))
+
+        parsed_cache = tokio.connectors._darshan.ParsedLogCache(cache_dir,
+                                                                max_bytes=2 * entry_bytes)
+        now = time.time()
+        os.utime(os.path.join(cache_dir, 'a.npz'), (now - 30, now - 30))
+        parsed_cache.put('b', arrays)
+        os.utime(os.path.join(cache_dir, 'b.npz'), (now - 20, now - 20))
+
+        # using a makes b the least recently used entry
+        assert parsed_cache.get('a') is not None
+        parsed_cache.put('c', arrays)
+
+        assert sorted(os.listdir(cache_dir)) == ['a.npz', 'c.npz']
+        assert parsed_cache.get('b') is None
+        assert parsed_cache.hits == 1
+        assert parsed_cache.misses == 1
+    finally:
+        shutil.rmtree(cache_dir)
+
+def compare_counters(reference, derived):
+    """Ensure derived counters match those reported by darshan-parser
+
+    Derived floating-point counters are sums of values that darshan-parser has
+    already rounded, so they are only compared to within a tolerance.
+    """
+    for counter, value in reference.iteritems():
+        print "Comparing", counter, value, derived[counter]
+        assert abs(value - derived[counter]) <= 1.0e-4 * max(1.0, abs(value))
+
+def check_derived(darshan_log):
+    """
+    Compare derived total and perf counters with darshan-parser's
+    """
+    reference = tokio.connectors.darshan.Darshan(darshan_log)
+    reference.darshan_parser_total()
+    reference.darshan_parser_perf()
+
+    derived = tokio.connectors.darshan.Darshan(darshan_log)
+    derived.darshan_parser_base(total=True, perf=True)
+
+    for module in tokio.connectors._darshan.AGGREGATED_MODULES:
+        if module not in reference['counters']:
+            continue
+        ref_total = reference['counters'][module]['_total']
+        derived_total = derived['counters'][module]['_total']
+        assert sorted(ref_total.keys()) == sorted(derived_total.keys())
+        compare_counters(ref_total, derived_total)
+
+        # darshan-parser versions differ in which estimates they report
+        ref_perf = reference['counters'][module]['_perf']
+        derived_perf = derived['counters'][module]['_perf']
+        for key in 'total_bytes', 'agg_perf_by_slowest', 'slowest_rank_io_time_unique_files', \
+                   'time_by_slowest_shared_files':
+            assert key in derived_perf
+        compare_counters(dict((key, ref_perf[key]) for key in ref_perf if key in derived_perf),
+                         derived_perf)
+
+@tokiotest.needs_darshan
+def test_derived():
+    """
+    darshan_parser_base() derived total and perf counters
+    """
+    tokiotest.check_darshan()
+    for darshan_log in SAMPLE_DARSHAN_LOGS:
+        func = check_derived
+        func.description = "darshan_parser_base() derived total and perf counters: %s" \
+                           % os.path.basename(darshan_log)
+        yield func, darshan_log
@@ -3,8 +3,12 @@
 Test the HDF5 connector
 """
 
+import os
+import shutil
+import tempfile
 import datetime
 import random
+import nose
 import numpy
 import tokiotest
 import tokio.connectors
@@ -270,3 +274,50 @@ def test_missing_values():
                                                                  missing_matrix.sum())
     assert len(remove_list) == missing_matrix.sum()
     assert ((missing_matrix == 0.0) | inverse).all()
+
+def test_get_stats():
+    """
+    connectors.hdf5.Hdf5.get_stats() without stored statistics
+    """
+    for input_file in tokiotest.SAMPLE_LMTDB_TTS_HDF5, tokiotest.SAMPLE_LMTDB_H5LMT:
+        hdf5_file = tokio.connectors.Hdf5(input_file, mode='r')
+        for dataset_name in 'datatargets/readbytes', 'dataservers/cpuload':
+            stats = hdf5_file.get_stats(dataset_name)
+            values = hdf5_file[dataset_name][:]
+            assert len(stats['columns']) == values.shape[1]
+            assert numpy.allclose(stats['sum'], values.sum(axis=0))
+            assert numpy.isclose(stats['total']['sum'], values.sum())
+            assert stats['total']['count'] + stats['total']['missing'] == values.size
+
+def test_to_parquet():
+    """
+    connectors.hdf5.Hdf5.to_parquet()
+    """
+    if tokio.connectors.hdf5.pyarrow is None:
+        raise nose.SkipTest("pyarrow not available")
+    import pyarrow.parquet
+
+    hdf5_file = tokio.connectors.Hdf5(tokiotest.SAMPLE_TOKIOTS_FILE, mode='r')
+    dataset_name = 'datatargets/readbytes'
+    values = hdf5_file[dataset_name][:]
+    missing = tokio.connectors.hdf5.missing_values(values).astype(bool)
+
+    batches = list(hdf5_file.to_record_batches(dataset_name, batch_rows=100))
+    assert len(batches) == (values.shape[0] + 99) // 100
+    assert sum([batch.num_rows for batch in batches]) == values.shape[0]
+
+    output_dir = tempfile.mkdtemp()
+    try:
+        output_files = hdf5_file.to_parquet(dataset_name, output_dir, batch_rows=100)
+        assert output_files
+        for output_file in output_files:
+            assert os.path.basename(os.path.dirname(output_file)).startswith('date=')
+        table = pyarrow.parquet.ParquetDataset(output_dir).read()
+        assert table.schema.metadata['dataset_name'] == dataset_name
+        dataframe = table.to_pandas()
+        exported = dataframe[list(hdf5_file.get_columns(dataset_name))].values
+        assert exported.shape == values.shape
+        assert numpy.isnan(exported[missing]).all()
+        assert numpy.array_equal(exported[~missing], values[~missing])
+    finally:
+        shutil.rmtree(output_dir)
@@ -73,6 +73,34 @@ def test_init_sqlite():
     lmtdb = tokio.connectors.lmtdb.LmtDb(cache_file=SAMPLE_CACHE_DB)
     verify_lmtdb_obj(lmtdb)
 
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_hybrid():
+    """
+    LmtDb hybrid cache (MySQL and SQLite)
+    """
+    try:
+        remote_lmtdb = tokio.connectors.lmtdb.LmtDb()
+    except RuntimeError as error:
+        raise nose.plugins.skip.SkipTest(error)
+
+    lmtdb = tokio.connectors.lmtdb.LmtDb(cache_file=tokiotest.TEMP_FILE.name, hybrid=True)
+    assert lmtdb.is_hybrid()
+    verify_lmtdb_obj(lmtdb)
+
+    dt_start = datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_START)
+    dt_end = datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_END)
+    dt_mid = dt_start + (dt_end - dt_start) / 2
+    for query_start, query_end in (dt_mid, dt_end), (dt_start, dt_end), (dt_start, dt_mid):
+        expected, _ = remote_lmtdb.get_timeseries_data('OST_DATA', query_start, query_end)
+        result, _ = lmtdb.get_timeseries_data('OST_DATA', query_start, query_end)
+        assert sorted(result) == sorted(expected)
+
+    # the whole time range is now answered by the cache db
+    assert lmtdb.get_coverage_gaps('OST_DATA',
+                                   dt_start.strftime("%Y-%m-%d %H:%M:%S"),
+                                   dt_end.strftime("%Y-%m-%d %H:%M:%S")) == []
+    assert lmtdb.fill_timeseries_gaps('OST_DATA', dt_start, dt_end) == 0
+
 def test_ts_id():
     """
     LmtDb.get_ts_ids()
@@ -110,3 +138,30 @@ def test_get_timeseries_data():
                                         datetime.timedelta(seconds=60))
     assert result0 == result1 == result2 == result3
     print result0
+
+    # past time ranges are served from memory once they have been queried
+    misses = lmtdb.result_cache.misses
+    assert lmtdb.get_timeseries_data('OST_DATA', dt_start, dt_end) == result0
+    assert lmtdb.result_cache.misses == misses
+    assert lmtdb.result_cache.hits > 0
+    assert lmtdb.last_hit == tokio.connectors.lmtdb.cachingdb.HIT_MEMORY
+
+def test_iterate_timeseries_data():
+    """
+    LmtDb.iterate_timeseries_data()
+    """
+    lmtdb = tokio.connectors.lmtdb.LmtDb(cache_file=SAMPLE_CACHE_DB)
+    dt_start = datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_START)
+    dt_end = datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_END)
+    expected, columns = lmtdb.get_timeseries_data('OST_DATA', dt_start, dt_end)
+    assert columns == tokio.connectors.lmtdb.get_timeseries_columns('OST_DATA')
+    lmtdb.drop_cache()
+
+    for timechunk in None, datetime.timedelta(seconds=30):
+        batches = list(lmtdb.iterate_timeseries_data('OST_DATA', dt_start, dt_end,
+                                                     timechunk=timechunk,
+                                                     batch_size=100))
+        assert max([len(batch) for batch in batches]) <= 100
+        assert [row for batch in batches for row in batch] == list(expected)
+        # rows are not retained unless requested
+        assert 'OST_DATA' not in lmtdb.saved_results
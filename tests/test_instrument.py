@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Test the instrumentation API and the --profile option of bin scripts
+"""
+
+import json
+import datetime
+import nose
+import tokiotest
+import tokio.instrument
+import tokiobin.cache_nersc_jobsdb
+
+def teardown_instrument():
+    """Disable and clear instrumentation after each test
+    """
+    tokio.instrument.enable(False)
+    tokio.instrument.reset()
+
+@nose.tools.with_setup(teardown=teardown_instrument)
+def test_timers_and_counters():
+    """tokio.instrument timers and counters
+    """
+    # nothing is recorded until instrumentation is enabled
+    tokio.instrument.count('test.disabled')
+    with tokio.instrument.span('test.disabled') as timer:
+        pass
+    assert timer.elapsed >= 0.0
+    assert tokio.instrument.get_stats() == {'timers': {}, 'counters': {}}
+
+    tokio.instrument.enable()
+    tokio.instrument.count('test.bytes', 100)
+    tokio.instrument.count('test.bytes', 28)
+    for _ in range(3):
+        with tokio.instrument.span('test.span'):
+            pass
+
+    @tokio.instrument.timed('test.timed')
+    def timed_func(value):
+        """Function to be timed"""
+        return value * 2
+
+    assert timed_func(21) == 42
+
+    try:
+        with tokio.instrument.span('test.error'):
+            raise ValueError
+    except ValueError:
+        pass
+
+    stats = tokio.instrument.get_stats()
+    print json.dumps(stats, indent=4, sort_keys=True)
+    assert stats['counters'] == {'test.bytes': 128}
+    assert stats['timers']['test.span']['calls'] == 3
+    assert stats['timers']['test.timed']['calls'] == 1
+    assert stats['timers']['test.error']['calls'] == 1
+    for timer in stats['timers'].itervalues():
+        assert 0.0 <= timer['min'] <= timer['max'] <= timer['total']
+
+    assert json.loads(tokio.instrument.to_json()) == stats
+    table = tokio.instrument.to_table()
+    print table
+    for name in 'test.bytes', 'test.span', 'test.timed':
+        assert name in table
+
+    tokio.instrument.reset()
+    assert tokio.instrument.get_stats() == {'timers': {}, 'counters': {}}
+
+def test_bin_profile():
+    """bin/cache_nersc_jobsdb.py --profile
+    """
+    for profile_format in tokio.instrument.PROFILE_FORMATS:
+        func = run_profile
+        func.description = "bin/cache_nersc_jobsdb.py --profile %s" % profile_format
+        yield func, profile_format
+
+    func = run_profile
+    func.description = "bin/cache_nersc_jobsdb.py without --profile"
+    yield func, None
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def run_profile(profile_format):
+    """Run a bin script and verify the profile it reports
+    """
+    argv = [
+        '-i', tokiotest.SAMPLE_NERSCJOBSDB_FILE,
+        '-o', tokiotest.TEMP_FILE.name,
+        datetime.datetime.fromtimestamp(
+            tokiotest.SAMPLE_NERSCJOBSDB_START).strftime("%Y-%m-%dT%H:%M:%S"),
+        datetime.datetime.fromtimestamp(
+            tokiotest.SAMPLE_NERSCJOBSDB_END).strftime("%Y-%m-%dT%H:%M:%S"),
+        tokiotest.SAMPLE_NERSCJOBSDB_HOST,
+    ]
+    if profile_format is not None:
+        argv = ['--profile', profile_format] + argv
+    _, stderr = tokiotest.run_bin(tokiobin.cache_nersc_jobsdb, argv, also_error=True)
+    print stderr
+
+    # instrumentation is only enabled while the profiled script runs
+    assert not tokio.instrument.ENABLED
+
+    if profile_format is None:
+        assert 'cachingdb' not in stderr
+    elif profile_format == 'json':
+        stats = json.loads(stderr)
+        assert stats['timers']['main']['calls'] == 1
+        assert stats['counters']['cachingdb.query_sqlite3.rows'] > 0
+        assert stats['counters']['cachingdb.save_cache.rows'] > 0
+    else:
+        assert 'cachingdb.query_sqlite3.rows' in stderr
+        assert 'cachingdb.save_cache' in stderr
@@ -248,6 +248,38 @@ def test_commit_dataset():
     print "Comparing before/after read/write/read"
     compare_timeseries(timeseries2, timeseries1, verbose=True)
 
+def verify_stored_stats(hdf5_file, dataset_name):
+    """
+    Compare the statistics stored by commit_dataset to a full scan
+    """
+    stored = hdf5_file.get_stats(dataset_name)
+    actual = tokio.connectors.hdf5.column_stats(hdf5_file[dataset_name][:, :])
+    for key in tokio.connectors.hdf5.STATS_KEYS:
+        print "Comparing stats_%s" % key
+        assert numpy.allclose(stored[key], actual[key], equal_nan=True)
+
+@nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
+def test_commit_dataset_stats():
+    """
+    TimeSeries.commit_dataset() statistics
+    """
+    tokiotest.TEMP_FILE.close()
+
+    timeseries1 = generate_timeseries()
+    with tokio.connectors.hdf5.Hdf5(tokiotest.TEMP_FILE.name, 'w') as hdf5_file:
+        timeseries1.commit_dataset(hdf5_file)
+        verify_stored_stats(hdf5_file, timeseries1.dataset_name)
+
+    # Overwrite a subset of rows, including the largest value in the dataset
+    # and some missing data, to exercise the incremental update
+    timeseries1.trim_rows(3)
+    max_index = numpy.unravel_index(timeseries1.dataset.argmax(), timeseries1.dataset.shape)
+    timeseries1.dataset[max_index] /= 2.0
+    timeseries1.dataset[0, :] = -0.0
+    with tokio.connectors.hdf5.Hdf5(tokiotest.TEMP_FILE.name) as hdf5_file:
+        timeseries1.commit_dataset(hdf5_file)
+        verify_stored_stats(hdf5_file, timeseries1.dataset_name)
+
 @nose.tools.with_setup(tokiotest.create_tempfile, tokiotest.delete_tempfile)
 def test_commit_dataset_bad_bounds():
     """
@@ -1,8 +1,13 @@
 """Test tools.darshan interfaces
 """
+import os
+import time
+import shutil
+import tempfile
 import nose.tools
 import datetime
 import tokio.tools.darshan
+import tokio.connectors.darshan
 import tokiotest
 
 DATETIME_START = datetime.datetime.strptime(tokiotest.SAMPLE_DARSHAN_START_TIME, "%Y-%m-%d %H:%M:%S")
@@ -36,6 +41,16 @@ def wrap_load_darshanlogs_assert_raises(test_input, exception):
     print "Test args:", test_input['params']
     nose.tools.assert_raises(exception, tokio.tools.darshan.load_darshanlogs, **(test_input['params']))
 
+def only_derived_records(results):
+    """Ensure that loaded Darshan logs contain no per-file records
+    """
+    for darshan_data in results.itervalues():
+        for module_data in darshan_data.get('counters', {}).itervalues():
+            for file_name in module_data:
+                if not file_name.startswith('_'):
+                    return False
+    return True
+
 TEST_MATRIX = [
     {
         'descr': "valid jobid",
@@ -145,6 +160,32 @@ TEST_MATRIX = [
         },
         'pass_criteria': lambda x: len(x) >= (2 * tokiotest.SAMPLE_DARSHAN_LOGS_PER_DIR),
     },
+    {
+        'descr': "valid jobid via index",
+        'test_function': wrap_find_darshanlogs,
+        'params': {
+            'datetime_start': DATETIME_START,
+            'datetime_end': None,
+            'username': None,
+            'jobid': tokiotest.SAMPLE_DARSHAN_JOBID,
+            'darshan_log_dir': tokiotest.SAMPLE_DARSHAN_LOG_DIR,
+            'index_file': ':memory:',
+        },
+        'pass_criteria': lambda x: len(x) > 0,
+    },
+    {
+        'descr': "jobid without date via index",
+        'test_function': wrap_find_darshanlogs,
+        'params': {
+            'datetime_start': None,
+            'datetime_end': None,
+            'username': None,
+            'jobid': tokiotest.SAMPLE_DARSHAN_JOBID_2,
+            'darshan_log_dir': tokiotest.SAMPLE_DARSHAN_LOG_DIR,
+            'index_file': ':memory:',
+        },
+        'pass_criteria': lambda x: len(x) > 0,
+    },
     {
         'descr': "load base",
         'test_function': wrap_load_darshanlogs,
@@ -171,6 +212,19 @@ TEST_MATRIX = [
         },
         'pass_criteria': lambda x: len(x) > 0,
     },
+    {
+        'descr': "load perf,total",
+        'test_function': wrap_load_darshanlogs,
+        'params': {
+            'datetime_start': DATETIME_START,
+            'datetime_end': None,
+            'username': None,
+            'jobid': tokiotest.SAMPLE_DARSHAN_JOBID,
+            'darshan_log_dir': tokiotest.SAMPLE_DARSHAN_LOG_DIR,
+            'which': 'perf,total'
+        },
+        'pass_criteria': lambda x: len(x) > 0,
+    },
     {
         'descr': "load invalid",
         'test_function': wrap_load_darshanlogs,#lambda x: wrap_load_darshanlogs_assert_raises(x, TypeError),
@@ -187,6 +241,209 @@ TEST_MATRIX = [
     },
 ]
 
+@tokiotest.needs_darshan
+def test_load_darshanlogs_derived():
+    """tools.darshan.load_darshanlogs() without per-file records
+    """
+    tokiotest.check_darshan()
+    results = tokio.tools.darshan.load_darshanlogs(datetime_start=DATETIME_START,
+                                                   datetime_end=None,
+                                                   username=None,
+                                                   jobid=tokiotest.SAMPLE_DARSHAN_JOBID,
+                                                   darshan_log_dir=tokiotest.SAMPLE_DARSHAN_LOG_DIR,
+                                                   which='perf,total')
+    assert len(results) > 0
+    assert only_derived_records(results)
+
+@tokiotest.needs_darshan
+def test_filter_darshanlogs():
+    """tools.darshan.filter_darshanlogs()
+    """
+    tokiotest.check_darshan()
+    darshan_log = tokiotest.SAMPLE_DARSHAN_LOG
+    header = tokio.connectors.darshan.Darshan(darshan_log)
+    header.load_header()
+    nprocs = header['header']['nprocs']
+
+    assert tokio.tools.darshan.filter_darshanlogs([darshan_log]) == [darshan_log]
+    assert tokio.tools.darshan.filter_darshanlogs([darshan_log], min_nprocs=nprocs) == [darshan_log]
+    assert tokio.tools.darshan.filter_darshanlogs([darshan_log], min_nprocs=nprocs + 1) == []
+    assert tokio.tools.darshan.filter_darshanlogs([darshan_log], max_nprocs=nprocs - 1) == []
+    assert tokio.tools.darshan.filter_darshanlogs([darshan_log], uid=header['header']['uid']) == [darshan_log]
+    assert tokio.tools.darshan.filter_darshanlogs([darshan_log], uid=header['header']['uid'] + 1) == []
+    assert tokio.tools.darshan.filter_darshanlogs([darshan_log], exe='notarealexe') == []
+    assert tokio.tools.darshan.filter_darshanlogs(
+        [darshan_log],
+        datetime_end=datetime.datetime.fromtimestamp(header['header']['start_time'])) == []
+
+def get_nprocs(darshan_data):
+    """Reduce a Darshan log to its process count
+    """
+    return darshan_data['header']['nprocs']
+
+def sleep_forever(darshan_data):
+    """Reduce a Darshan log very slowly
+    """
+    time.sleep(60)
+    return darshan_data
+
+@tokiotest.needs_darshan
+def test_bulk_load_darshanlogs():
+    """tools.darshan.bulk_load_darshanlogs()
+    """
+    tokiotest.check_darshan()
+    darshan_logs = [
+        tokiotest.SAMPLE_DARSHAN_LOG,
+        os.path.join(tokiotest.INPUT_DIR, 'sample-goodost.darshan'),
+        os.path.join(tokiotest.INPUT_DIR, 'does-not-exist.darshan'),
+    ]
+    results, errors = tokio.tools.darshan.bulk_load_darshanlogs(darshan_logs,
+                                                                processes=2,
+                                                                reduce_function=get_nprocs,
+                                                                silent_errors=True)
+    print "Results:", results
+    print "Errors:", errors
+    assert sorted(results.keys()) == sorted(darshan_logs[:2])
+    assert errors.keys() == darshan_logs[2:]
+    for darshan_log, nprocs in results.iteritems():
+        header = tokio.connectors.darshan.Darshan(darshan_log)
+        header.load_header()
+        assert nprocs == header['header']['nprocs']
+
+    # streaming results without reduction
+    loaded = list(tokio.tools.darshan.iterate_darshanlogs(darshan_logs[:1],
+                                                         which='base,total',
+                                                         processes=1,
+                                                         modules=['posix']))
+    assert len(loaded) == 1
+    darshan_log, darshan_data, error = loaded[0]
+    assert darshan_log == darshan_logs[0]
+    assert error is None
+    assert darshan_data['counters'].keys() == ['posix']
+    assert '_total' in darshan_data['counters']['posix']
+
+@tokiotest.needs_darshan
+def test_bulk_load_darshanlogs_invalid():
+    """tools.darshan.bulk_load_darshanlogs() with unparseable logs
+    """
+    tokiotest.check_darshan()
+    darshan_logs = [
+        os.path.join(tokiotest.INPUT_DIR, 'does-not-exist.darshan'),
+        os.path.join(tokiotest.INPUT_DIR, 'lfs-df.txt'),
+    ]
+    results, errors = tokio.tools.darshan.bulk_load_darshanlogs(darshan_logs,
+                                                                processes=2,
+                                                                silent_errors=True)
+    print "Results:", results
+    print "Errors:", errors
+    assert not results
+    assert sorted(errors.keys()) == sorted(darshan_logs)
+
+@tokiotest.needs_darshan
+def test_bulk_load_darshanlogs_timeout():
+    """tools.darshan.bulk_load_darshanlogs() with timeout
+    """
+    tokiotest.check_darshan()
+    time0 = time.time()
+    results, errors = tokio.tools.darshan.bulk_load_darshanlogs([tokiotest.SAMPLE_DARSHAN_LOG],
+                                                                processes=1,
+                                                                timeout=1.0,
+                                                                reduce_function=sleep_forever)
+    assert time.time() - time0 < 30.0
+    assert not results
+    assert 'timed out' in errors[tokiotest.SAMPLE_DARSHAN_LOG]
+
+def test_darshan_log_index():
+    """tools.darshan.DarshanLogIndex
+    """
+    log_dir = tempfile.mkdtemp()
+    index_file = os.path.join(log_dir, 'index.db')
+    try:
+        # copy the repository so that it can be modified
+        darshan_log_dir = os.path.join(log_dir, 'darshanlogs')
+        shutil.copytree(tokiotest.SAMPLE_DARSHAN_LOG_DIR, darshan_log_dir)
+        day_dirs = []
+        for dir_name, subdirs, _ in os.walk(darshan_log_dir):
+            if not subdirs:
+                day_dirs.append(dir_name)
+        # make day directories look as if they haven't changed recently
+        old_mtime = time.time() - 3600
+        for day_dir in day_dirs:
+            os.utime(day_dir, (old_mtime, old_mtime))
+
+        # index must give the same answers as searching the directories
+        index = tokio.tools.darshan.DarshanLogIndex(index_file, darshan_log_dir)
+        assert index.update() == len(day_dirs)
+        for test in TEST_MATRIX:
+            params = test['params']
+            if test['test_function'] != wrap_find_darshanlogs or params['datetime_start'] is None:
+                continue
+            print "Comparing results of", test['descr']
+            expected = tokio.tools.darshan.find_darshanlogs(
+                datetime_start=params['datetime_start'],
+                datetime_end=params['datetime_end'],
+                username=params['username'],
+                jobid=params['jobid'],
+                darshan_log_dir=darshan_log_dir)
+            found = index.find(datetime_start=params['datetime_start'],
+                               datetime_end=params['datetime_end'],
+                               username=params['username'],
+                               jobid=params['jobid'])
+            assert sorted(found) == sorted(expected)
+
+        # unchanged directories are not rescanned
+        assert index.update() == 0
+        index.close()
+
+        # only changed directories are rescanned
+        new_log = os.path.join(day_dirs[0], 'newuser_a.out_id1234_3-21-1-1_1.darshan')
+        open(new_log, 'w').close()
+        os.utime(day_dirs[0], (old_mtime + 60, old_mtime + 60))
+        index = tokio.tools.darshan.DarshanLogIndex(index_file, darshan_log_dir)
+        assert index.update() == 1
+        assert index.find(username='newuser') == [new_log]
+        assert index.find(jobid=1234) == [new_log]
+        index.close()
+    finally:
+        shutil.rmtree(log_dir)
+
+def test_darshan_summary_store():
+    """tools.darshan.DarshanSummaryStore
+    """
+    store_dir = tempfile.mkdtemp()
+    store_file = os.path.join(store_dir, 'summary.sqlite3')
+    summaries = {}
+    for index in range(25):
+        summaries['user_exe_id%d_3-20-1-1_1.darshan' % index] = {
+            '/': {'read_bytes': index, 'write_bytes': 0},
+            '/scratch1': {'read_bytes': 2**30, 'write_bytes': index * 2**20},
+        }
+    try:
+        store = tokio.tools.darshan.DarshanSummaryStore(store_file, batch_size=10)
+        store.update(summaries)
+        assert len(store) == len(summaries)
+        for log_path in summaries:
+            assert log_path in store
+        store.close()
+
+        # summaries persist and can be replaced
+        store = tokio.tools.darshan.DarshanSummaryStore(store_file)
+        assert store.to_dict() == summaries
+        log_path = sorted(summaries.keys())[0]
+        summaries[log_path] = {'/scratch2': {'read_bytes': 1, 'write_bytes': 2}}
+        store.add(log_path, summaries[log_path])
+        assert store.to_dict() == summaries
+        assert len(store) == len(summaries)
+
+        # only logs not in the store are new
+        new_logs = ['new%d.darshan' % index for index in range(3)]
+        assert store.filter_new(new_logs + summaries.keys()) == new_logs
+        store.close()
+
+        assert tokio.tools.darshan.is_summary_store(store_file)
+    finally:
+        shutil.rmtree(store_dir)
+
 def test_find_darshanlogs():
     """tools.darshan.find_darshanlogs()
     """
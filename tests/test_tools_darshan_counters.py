@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Test the Darshan counter aggregation tools
+"""
+
+import tokio.connectors.darshan
+import tokio.tools.darshan_counters
+
+SAMPLE_MOUNTS = ['/', '/scratch1', '/scratch2']
+
+# (module, file name, rank, {counter: value}) of each record
+SAMPLE_RECORDS = [
+    ('posix', '/scratch1/in.dat', '0', {'BYTES_READ': '1024', 'BYTES_WRITTEN': '0', 'F_READ_TIME': '0.5'}),
+    ('posix', '/scratch1/in.dat', '1', {'BYTES_READ': '2048', 'BYTES_WRITTEN': '0', 'F_READ_TIME': '1.25'}),
+    ('posix', '/scratch2/out.dat', '-1', {'BYTES_READ': '0', 'BYTES_WRITTEN': '8192', 'F_READ_TIME': '0.0'}),
+    ('posix', '/home/user/a.out', '0', {'BYTES_READ': '100', 'BYTES_WRITTEN': '0', 'F_READ_TIME': '0.125'}),
+    ('mpiio', '/scratch2/out.dat', '-1', {'BYTES_READ': '0', 'BYTES_WRITTEN': '8192'}),
+    ('stdio', '<STDOUT>', '0', {'BYTES_READ': '0', 'BYTES_WRITTEN': '10'}),
+    ('stdio', '/scratch1/in.dat', '0', {'BYTES_READ': '3072', 'BYTES_WRITTEN': '0'}),
+]
+
+def build_records():
+    """Load SAMPLE_RECORDS into ModuleRecords
+    """
+    records = {}
+    for module, file_name, rank, counters in SAMPLE_RECORDS:
+        module_records = records.setdefault(module, tokio.connectors.darshan.ModuleRecords())
+        for counter, value in counters.iteritems():
+            module_records.append(file_name=file_name,
+                                  rank=rank,
+                                  mount_pt='UNKNOWN',
+                                  fs_type='UNKNOWN',
+                                  counter=counter,
+                                  value=value)
+    return records
+
+def test_summarize_counters():
+    """tools.darshan_counters.summarize_counters
+    """
+    records = build_records()
+    results = tokio.tools.darshan_counters.summarize_counters(records['posix'],
+                                                              ['BYTES_READ', 'F_READ_TIME', 'OPENS'],
+                                                              suffix='_posix')
+    print results
+    assert results == {
+        'tot_bytes_read_posix': 3172,
+        'ave_bytes_read_posix': 3172 / 4.0,
+        'num_bytes_read_posix': 4,
+        'min_bytes_read_posix': 0,
+        'max_bytes_read_posix': 2048,
+        'tot_f_read_time_posix': 1.875,
+        'ave_f_read_time_posix': 1.875 / 4.0,
+        'num_f_read_time_posix': 4,
+        'min_f_read_time_posix': 0.0,
+        'max_f_read_time_posix': 1.25,
+    }
+
+    empty = tokio.connectors.darshan.ModuleRecords()
+    assert tokio.tools.darshan_counters.summarize_counters(empty, ['BYTES_READ']) == {}
+
+def test_get_biggest_api():
+    """tools.darshan_counters.get_biggest_api
+    """
+    records = build_records()
+    api_bytes = tokio.tools.darshan_counters.get_api_bytes(records)
+    assert api_bytes['posix'] == {'read': 3172, 'write': 8192, 'read_files': 3, 'write_files': 1}
+    assert api_bytes['stdio'] == {'read': 3072, 'write': 10, 'read_files': 1, 'write_files': 1}
+
+    results = tokio.tools.darshan_counters.get_biggest_api(records)
+    print results
+    assert results == {
+        'biggest_read_api': 'posix',
+        'biggest_read_api_bytes': 3172,
+        'biggest_read_api_files': 3,
+        'biggest_write_api': results['biggest_write_api'],
+        'biggest_write_api_bytes': 8192,
+        'biggest_write_api_files': 1,
+    }
+    assert results['biggest_write_api'] in ('posix', 'mpiio')
+
+    assert tokio.tools.darshan_counters.get_biggest_api({}) == {}
+
+def test_get_biggest_fs():
+    """tools.darshan_counters.get_biggest_fs
+    """
+    records = build_records()
+    fs_bytes = tokio.tools.darshan_counters.get_fs_bytes(records, SAMPLE_MOUNTS, ['posix', 'stdio'])
+    assert fs_bytes == {
+        '/scratch1': {'read': 6144, 'write': 0},
+        '/scratch2': {'read': 0, 'write': 8192},
+        '/': {'read': 100, 'write': 0},
+        '_unknown': {'read': 0, 'write': 10},
+    }
+
+    # the same module is only counted once even if it is listed twice
+    results = tokio.tools.darshan_counters.get_biggest_fs(records, SAMPLE_MOUNTS, ['posix', 'posix'])
+    print results
+    assert results == {
+        'biggest_read_fs': '/scratch1',
+        'biggest_read_fs_bytes': 3072,
+        'biggest_write_fs': '/scratch2',
+        'biggest_write_fs_bytes': 8192,
+    }
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Test the Darshan OST correlation tools
+"""
+
+import random
+import numpy
+import scipy.stats
+import tokio.connectors.darshan
+import tokio.tools.darshan_ost
+
+NUM_FILES = 200
+NUM_OSTS = 16
+BAD_OST = 3
+
+def build_records(num_files=NUM_FILES, seed=0):
+    """Generate POSIX and Lustre records for files striped over random OSTs
+
+    Files striped over BAD_OST perform poorly.
+    """
+    rng = random.Random(seed)
+    posix_records = tokio.connectors.darshan.ModuleRecords()
+    lustre_records = tokio.connectors.darshan.ModuleRecords()
+    for index in range(num_files):
+        file_name = '/scratch1/file%d' % index
+        stripe_width = rng.randint(1, 4)
+        osts = rng.sample(range(NUM_OSTS), stripe_width)
+        io_time = rng.uniform(1.0, 2.0) * (10.0 if BAD_OST in osts else 1.0)
+        for rank in '0', '1':
+            posix_records.append(file_name, rank, '/scratch1', 'lustre', 'BYTES_WRITTEN', str(2**20))
+            posix_records.append(file_name, rank, '/scratch1', 'lustre', 'F_WRITE_TIME', '%.4f' % io_time)
+        lustre_records.append(file_name, '-1', '/scratch1', 'lustre', 'STRIPE_WIDTH', str(stripe_width))
+        for ost_index in range(4):
+            ost_id = osts[ost_index] if ost_index < stripe_width else rng.randint(0, NUM_OSTS - 1)
+            lustre_records.append(file_name, '-1', '/scratch1', 'lustre',
+                                  'OST_ID_%d' % ost_index, str(ost_id))
+    return posix_records, lustre_records
+
+def test_stripe_matrix():
+    """tools.darshan_ost.OstStripeMatrix
+    """
+    posix_records, lustre_records = build_records()
+    stripe_matrix = tokio.tools.darshan_ost.OstStripeMatrix()
+    assert stripe_matrix.add_records('test.darshan', posix_records, lustre_records) == NUM_FILES
+    assert stripe_matrix.matrix.shape == (NUM_FILES, len(stripe_matrix.osts))
+
+    # every file is divided evenly across its stripes
+    row_sums = numpy.asarray(stripe_matrix.matrix.sum(axis=1)).ravel()
+    assert numpy.allclose(row_sums, 1.0)
+
+    # adding the same records again updates rather than duplicates files
+    assert stripe_matrix.add_records('test.darshan', posix_records, lustre_records) == NUM_FILES
+    assert stripe_matrix.matrix.shape[0] == NUM_FILES
+    assert numpy.allclose(numpy.asarray(stripe_matrix.matrix.sum(axis=1)).ravel(), 1.0)
+
+    # identical file paths from a different log are distinct files
+    stripe_matrix.add_records('test2.darshan', posix_records, lustre_records)
+    assert stripe_matrix.matrix.shape[0] == 2 * NUM_FILES
+
+def test_correlate():
+    """tools.darshan_ost.OstStripeMatrix.correlate
+    """
+    posix_records, lustre_records = build_records()
+    stripe_matrix = tokio.tools.darshan_ost.OstStripeMatrix()
+    stripe_matrix.add_records('test.darshan', posix_records, lustre_records)
+    results = stripe_matrix.correlate()
+    assert len(results) == len(stripe_matrix.osts)
+
+    # results must agree with scipy.stats.pearsonr applied to each OST
+    dataframe = stripe_matrix.to_dataframe()
+    for result in results:
+        coeff, pval = scipy.stats.pearsonr(dataframe['performance'], dataframe[result['ost_name']])
+        print "%(ost_name)s %(coefficient)f %(p-value)g" % result, coeff, pval
+        assert numpy.isclose(result['coefficient'], coeff)
+        assert numpy.isclose(result['p-value'], pval, rtol=1e-6, atol=1e-300)
+
+    # the bad OST must stand out
+    worst = min(results, key=lambda k: k['coefficient'])
+    assert worst['ost_name'] == tokio.tools.darshan_ost.OST_NAME_FMT % BAD_OST
+    assert worst['p-value'] < 1e-5
+
+def test_correlate_insufficient():
+    """tools.darshan_ost.OstStripeMatrix.correlate with too little data
+    """
+    posix_records, lustre_records = build_records(num_files=1)
+    stripe_matrix = tokio.tools.darshan_ost.OstStripeMatrix()
+    stripe_matrix.add_records('test.darshan', posix_records, lustre_records)
+    assert stripe_matrix.correlate() == []
+    assert tokio.tools.darshan_ost.OstStripeMatrix().correlate() == []
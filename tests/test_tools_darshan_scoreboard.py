@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Test the Darshan scoreboard tools
+"""
+
+import os
+import gzip
+import json
+import shutil
+import StringIO
+import tempfile
+import tokio.tools.darshan
+import tokio.tools.darshan_scoreboard
+
+SAMPLE_SUMMARIES = [
+    {
+        '/logs/alice_vpic_id1_3-20-1-1_1.darshan': {
+            '/': {'read_bytes': 1, 'write_bytes': 1},
+            '/scratch1': {'read_bytes': 100, 'write_bytes': 200},
+        },
+        '/logs/bob_a.out_id2_3-20-1-1_1.darshan': {
+            '/scratch1': {'read_bytes': 10, 'write_bytes': 0},
+            '/home': {'read_bytes': 0, 'write_bytes': 20},
+        },
+    },
+    {
+        # a newer summary of a log that is also in the first file
+        '/logs/alice_vpic_id1_3-20-1-1_1.darshan': {
+            '/scratch1': {'read_bytes': 1000, 'write_bytes': 2000},
+        },
+        '/logs/alice_a.out_id3_3-20-1-1_1.darshan': {
+            '/home': {'read_bytes': 5, 'write_bytes': 5},
+        },
+        '/logs/nounderscores.darshan': {
+            '/scratch1': {'read_bytes': 1, 'write_bytes': 1},
+        },
+    },
+]
+
+EXPECTED_RESULTS = {
+    'per_user': {
+        'alice': {'read_bytes': 1005, 'write_bytes': 2005, 'num_jobs': 2},
+        'bob': {'read_bytes': 10, 'write_bytes': 20, 'num_jobs': 2},
+        '<unknown>': {'read_bytes': 1, 'write_bytes': 1, 'num_jobs': 1},
+    },
+    'per_fs': {
+        '/scratch1': {'read_bytes': 1011, 'write_bytes': 2001, 'num_jobs': 3},
+        '/home': {'read_bytes': 5, 'write_bytes': 25, 'num_jobs': 2},
+    },
+    'per_exe': {
+        'vpic': {'read_bytes': 1000, 'write_bytes': 2000, 'num_jobs': 1},
+        'a.out': {'read_bytes': 15, 'write_bytes': 25, 'num_jobs': 3},
+        '<unknown>': {'read_bytes': 1, 'write_bytes': 1, 'num_jobs': 1},
+    },
+}
+
+def write_summaries(output_dir):
+    """Write SAMPLE_SUMMARIES as a gzipped json file and a summary store
+    """
+    json_file = os.path.join(output_dir, 'summary0.json.gz')
+    with gzip.open(json_file, 'w') as output_file:
+        json.dump(SAMPLE_SUMMARIES[0], output_file, indent=4)
+
+    store_file = os.path.join(output_dir, 'summary1.sqlite3')
+    store = tokio.tools.darshan.DarshanSummaryStore(store_file)
+    store.update(SAMPLE_SUMMARIES[1])
+    store.close()
+
+    return [json_file, store_file]
+
+def test_build_scoreboard():
+    """tools.darshan_scoreboard.build_scoreboard
+    """
+    output_dir = tempfile.mkdtemp()
+    try:
+        summary_files = write_summaries(output_dir)
+        for processes in 1, 2:
+            for batch_size in 1, 1000:
+                print "processes=%d batch_size=%d" % (processes, batch_size)
+                results = tokio.tools.darshan_scoreboard.build_scoreboard(summary_files,
+                                                                          processes=processes,
+                                                                          batch_size=batch_size)
+                print json.dumps(results, indent=4, sort_keys=True)
+                assert results == EXPECTED_RESULTS
+
+        results = tokio.tools.darshan_scoreboard.build_scoreboard(summary_files,
+                                                                  limit_user=['alice'],
+                                                                  exclude_fs=['/home'])
+        assert results['per_user'] == {'alice': {'read_bytes': 1000, 'write_bytes': 2000, 'num_jobs': 1}}
+        assert results['per_fs'].keys() == ['/scratch1']
+        assert results['per_exe'].keys() == ['vpic']
+    finally:
+        shutil.rmtree(output_dir)
+
+def test_json_object_stream():
+    """tools.darshan_scoreboard._JsonObjectStream
+    """
+    for indent in None, 2:
+        json_str = json.dumps(SAMPLE_SUMMARIES[0], indent=indent)
+        for chunk_size in 1, 7, 2**20:
+            stream = tokio.tools.darshan_scoreboard._JsonObjectStream(StringIO.StringIO(json_str),
+                                                                      chunk_size=chunk_size)
+            assert dict(stream) == SAMPLE_SUMMARIES[0]
+
+    stream = tokio.tools.darshan_scoreboard._JsonObjectStream(StringIO.StringIO(' { } '))
+    assert list(stream) == []
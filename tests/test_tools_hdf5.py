@@ -89,3 +89,57 @@ def test():
             func.description = "tools.hdf5.get_df_from_time_range(%s): %s" % (dataset_name,
                                                                               description)
             yield func, dataset_name, start_offset, duration
+
+def check_iterate_windows(dataset_name, start_offset, duration, prefetch):
+    """
+    Iterate over windows of data from time range
+    """
+    start_time = datetime.datetime.fromtimestamp(TIME_0) + start_offset
+    end_time = start_time + duration
+    files_and_indices = tokio.tools.hdf5.get_files_and_indices(SAMPLE_H5LMT_FILE_BN,
+                                                               dataset_name,
+                                                               start_time,
+                                                               end_time)
+    windows = list(tokio.tools.hdf5.iterate_windows(SAMPLE_H5LMT_FILE_BN,
+                                                    dataset_name,
+                                                    start_time,
+                                                    end_time,
+                                                    prefetch=prefetch))
+    assert len(windows) == len(files_and_indices)
+    for window, file_and_indices in zip(windows, files_and_indices):
+        file_name, istart, iend, (timestamps, values) = window
+        assert (file_name, istart, iend) == file_and_indices
+        assert len(timestamps) == len(values)
+        assert datetime.datetime.fromtimestamp(timestamps[0]) == start_time or istart == 0
+
+def test_iterate_windows():
+    """
+    tools.hdf5.iterate_windows()
+    """
+    for (description, start_offset, duration) in TIME_OFFSETS:
+        for prefetch in 0, 1, 3:
+            func = check_iterate_windows
+            func.description = "tools.hdf5.iterate_windows(prefetch=%d): %s" % (prefetch,
+                                                                                description)
+            yield func, DATASETS_2D[0], start_offset, duration, prefetch
+
+def test_iterate_windows_error():
+    """
+    tools.hdf5.iterate_windows() exception handling
+    """
+    def bad_reader(hdf5_file, dataset_name, i_0, i_f):
+        """raise an exception from inside the prefetch thread"""
+        raise ValueError("bad reader")
+
+    start_time = datetime.datetime.fromtimestamp(TIME_0)
+    caught = False
+    try:
+        for _ in tokio.tools.hdf5.iterate_windows(SAMPLE_H5LMT_FILE_BN,
+                                                  DATASETS_2D[0],
+                                                  start_time,
+                                                  start_time + datetime.timedelta(days=1),
+                                                  reader=bad_reader):
+            pass
+    except ValueError:
+        caught = True
+    assert caught
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Test the job summary tools
+"""
+
+import os
+import shutil
+import datetime
+import tempfile
+import tokiotest
+import tokio.config
+import tokio.tools.hdf5
+import tokio.tools.jobsummary
+
+# Point this script at our inputs directory instead of the site-specific default
+tokio.config.LFSSTATUS_BASE_DIR = os.path.join(tokiotest.INPUT_DIR, "%Y-%m-%d")
+
+SAMPLE_JOB = {
+    '_jobid': tokiotest.SAMPLE_DARSHAN_JOBID,
+    '_datetime_start': datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_START),
+    '_datetime_end': datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_END),
+}
+
+SUMMARIZER_ARGS = {
+    'file_system': tokiotest.SAMPLE_DARSHAN_FILE_SYSTEM,
+    'slurm_cache_file': tokiotest.SAMPLE_SLURM_CACHE_FILE,
+    'topology': tokiotest.SAMPLE_XTDB2PROC_FILE,
+    'ost': True,
+    'ost_fullness': tokiotest.SAMPLE_OSTFULLNESS_FILE,
+    'ost_map': tokiotest.SAMPLE_OSTMAP_FILE,
+    'jobhost': tokiotest.SAMPLE_DARSHAN_JOBHOST,
+    'concurrentjobs': tokiotest.SAMPLE_NERSCJOBSDB_FILE,
+}
+
+def make_h5lmt_dir(h5lmt_file):
+    """Create an H5LMT_BASE_DIR containing the sample H5LMT file
+
+    Returns:
+        tuple: path to the new directory and the previous H5LMT_BASE_DIR
+    """
+    output_dir = tempfile.mkdtemp()
+    day_dir = os.path.join(output_dir, datetime.datetime.fromtimestamp(
+        tokiotest.SAMPLE_LMTDB_START).strftime("%Y-%m-%d"))
+    os.mkdir(day_dir)
+    shutil.copyfile(tokiotest.SAMPLE_LMTDB_H5LMT, os.path.join(day_dir, h5lmt_file))
+    h5lmt_base_dir = tokio.config.H5LMT_BASE_DIR
+    tokio.config.H5LMT_BASE_DIR = os.path.join(output_dir, "%Y-%m-%d")
+    return output_dir, h5lmt_base_dir
+
+def test_summarize_jobs():
+    """tools.jobsummary.summarize_jobs
+    """
+    output_dir, h5lmt_base_dir = make_h5lmt_dir(
+        tokio.config.FSNAME_TO_H5LMT_FILE[SUMMARIZER_ARGS['file_system']])
+    try:
+        verify_summarize_jobs()
+    finally:
+        tokio.config.H5LMT_BASE_DIR = h5lmt_base_dir
+        shutil.rmtree(output_dir)
+
+def verify_summarize_jobs():
+    """Compare summarize_jobs to summarizing a job one connector at a time
+    """
+    # summarize the job without sharing any state between connectors
+    expected = tokio.tools.jobsummary.retrieve_lmt_data(dict(SAMPLE_JOB),
+                                                        SUMMARIZER_ARGS['file_system'])
+    expected = tokio.tools.jobsummary.retrieve_topology_data(expected,
+                                                             SUMMARIZER_ARGS['slurm_cache_file'],
+                                                             SUMMARIZER_ARGS['topology'])
+    expected = tokio.tools.jobsummary.retrieve_ost_data(expected,
+                                                        SUMMARIZER_ARGS['ost'],
+                                                        SUMMARIZER_ARGS['ost_fullness'],
+                                                        SUMMARIZER_ARGS['ost_map'])
+    expected = tokio.tools.jobsummary.retrieve_concurrent_job_data(expected,
+                                                                   SUMMARIZER_ARGS['jobhost'],
+                                                                   SUMMARIZER_ARGS['concurrentjobs'])
+    for key in ('fs_tot_gibs_written', 'topology_job_max_radius',
+                'fshealth_ost_overloaded_pct', 'jobsdb_concurrent_nodehrs'):
+        assert key in expected
+
+    # neither shared state nor concurrent connectors may change any summary
+    for processes in 1, 2:
+        for parallel in False, True:
+            print "processes=%d parallel=%s" % (processes, parallel)
+            summaries = tokio.tools.jobsummary.summarize_jobs([None, None, None],
+                                                              processes=processes,
+                                                              results=SAMPLE_JOB,
+                                                              parallel=parallel,
+                                                              **SUMMARIZER_ARGS)
+            assert summaries == [expected] * 3
+
+    assert tokio.tools.jobsummary.summarize_jobs([]) == []
+
+    # latency is reported for every connector that ran
+    with tokio.tools.jobsummary.JobSummarizer(report_latency=True, **SUMMARIZER_ARGS) as summarizer:
+        summary = summarizer.summarize(results=SAMPLE_JOB)
+    for connector in tokio.tools.jobsummary.CONNECTORS:
+        assert summary.pop('_latency_%s' % connector) >= 0.0
+    assert summary == expected
+
+def test_get_lmt_dataframe():
+    """tools.jobsummary.JobSummarizer.get_lmt_dataframe
+    """
+    h5lmt_file = os.path.basename(tokiotest.SAMPLE_LMTDB_H5LMT)
+    output_dir, h5lmt_base_dir = make_h5lmt_dir(h5lmt_file)
+    try:
+        datetime_start = datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_START)
+        datetime_end = datetime.datetime.fromtimestamp(tokiotest.SAMPLE_LMTDB_END)
+        time_ranges = [
+            (datetime_start, datetime_end),
+            (datetime_start + datetime.timedelta(seconds=60), datetime_end),
+            (datetime_start - datetime.timedelta(days=1), datetime_end),
+        ]
+        with tokio.tools.jobsummary.JobSummarizer(max_cached_files=1) as summarizer:
+            for time_range in time_ranges:
+                for dataset_name, _, _ in tokio.tools.jobsummary.LMT_DATASETS:
+                    print "Comparing %s from %s to %s" % ((dataset_name,) + time_range)
+                    expected = tokio.tools.hdf5.get_dataframe_from_time_range(h5lmt_file,
+                                                                              dataset_name,
+                                                                              *time_range)
+                    result = summarizer.get_lmt_dataframe(h5lmt_file, dataset_name, *time_range)
+                    assert result.equals(expected)
+    finally:
+        tokio.config.H5LMT_BASE_DIR = h5lmt_base_dir
+        shutil.rmtree(output_dir)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Test mount and file system matching tools
+"""
+
+import tokio.config
+import tokio.tools.mounts
+
+SAMPLE_MOUNTS = [
+    '/',
+    '/global/cscratch1',
+    '/global/project',
+    '/scratch1',
+    '/usr/lib64/libibverbs.so.1.0.0',
+]
+
+TEST_MATRIX = [
+    ('/global/cscratch1/sd/user/file', '/global/cscratch1'),
+    ('/global/cscratch1', '/global/cscratch1'),
+    ('/global/project//projectdirs/file', '/global/project'),
+    ('/scratch10/file', '/'),
+    ('/usr/lib64/libibverbs.so.1.0.0', '/usr/lib64/libibverbs.so.1.0.0'),
+    ('/usr/lib64/libc.so', '/'),
+    ('<STDOUT>', None),
+]
+
+def test_mount_matcher():
+    """
+    tools.mounts.MountMatcher
+    """
+    matcher = tokio.tools.mounts.MountMatcher(SAMPLE_MOUNTS)
+    for _ in range(2): # second pass exercises memoized results
+        for path, expected in TEST_MATRIX:
+            print "Checking %s (expecting %s)" % (path, expected)
+            assert matcher.match(path) == expected
+
+    matcher = tokio.tools.mounts.MountMatcher(['/global/cscratch1/'])
+    assert matcher.match('/global/cscratch1/file') == '/global/cscratch1/'
+    assert matcher.match('/') is None
+
+def test_identify_fsname():
+    """
+    tools.mounts.identify_fsname
+    """
+    mount_to_fsname = {
+        '^/scratch1': 'scratch1',
+        '^/var/opt/cray/dws/mounts/.*/ss/': 'bb-shared',
+        '^/var/opt/cray/dws/mounts/batch/.*_private_scratch/': 'bb-private',
+    }
+    assert tokio.tools.mounts.identify_fsname('/scratch1/user/file', mount_to_fsname) == 'scratch1'
+    assert tokio.tools.mounts.identify_fsname('/scratch2/user/file', mount_to_fsname) is None
+    assert tokio.tools.mounts.identify_fsname('/var/opt/cray/dws/mounts/123/ss/file',
+                                              mount_to_fsname) == 'bb-shared'
+    # the longest matching regex wins
+    assert tokio.tools.mounts.identify_fsname(
+        '/var/opt/cray/dws/mounts/batch/123_private_scratch/ss/file',
+        mount_to_fsname) == 'bb-private'
+
+    # matchers are shared between calls using the same mapping
+    assert tokio.tools.mounts.get_fsname_matcher(dict(mount_to_fsname)) \
+        is tokio.tools.mounts.get_fsname_matcher(mount_to_fsname)
+
+    # default to the site configuration
+    for fs_regex, fs_name in tokio.config.MOUNT_TO_FSNAME.iteritems():
+        if fs_regex == '^/scratch1':
+            assert tokio.tools.mounts.identify_fsname('/scratch1/file') == fs_name
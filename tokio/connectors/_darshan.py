@@ -0,0 +1,432 @@
+"""Helper classes and functions used by the Darshan connector
+
+This contains the rules needed to reproduce the output of ``darshan-parser
+--total`` and ``darshan-parser --perf`` from the base counters that
+``darshan-parser --base`` emits so that a log only needs to be parsed once, as
+well as the on-disk cache that allows a log to never be parsed more than once.
+"""
+
+import os
+import re
+import json
+import zipfile
+import hashlib
+import numpy
+import tokio.instrument
+from tokio.connectors.common import DiskCache
+
+# Modules whose records darshan-parser knows how to aggregate
+AGGREGATED_MODULES = ('posix', 'mpiio', 'stdio')
+
+# Counters that retain the value of the last record
+_LAST_VALUE_COUNTERS = set(['MODE', 'MEM_ALIGNMENT', 'FILE_ALIGNMENT'])
+
+# Counters that retain the largest value of any record
+_MAX_VALUE_COUNTERS = set([
+    'MAX_BYTE_READ',
+    'MAX_BYTE_WRITTEN',
+    'F_MAX_READ_TIME',
+    'F_MAX_WRITE_TIME',
+])
+
+# Counters whose value is -1 when they were not recorded
+_OPTIONAL_COUNTERS = set(['FILENOS', 'DUPS', 'RENAME_SOURCES', 'RENAME_TARGETS'])
+
+# Counters that take their value from the record with the largest paired counter
+_PAIRED_COUNTERS = {
+    'MAX_READ_TIME_SIZE': 'F_MAX_READ_TIME',
+    'MAX_WRITE_TIME_SIZE': 'F_MAX_WRITE_TIME',
+}
+
+# Counters that describe a single file shared by many ranks and have no
+# meaning once more than one record has been aggregated
+_RANK_COUNTERS = {
+    'FASTEST_RANK': -1L,
+    'FASTEST_RANK_BYTES': -1L,
+    'SLOWEST_RANK': -1L,
+    'SLOWEST_RANK_BYTES': -1L,
+    'F_FASTEST_RANK_TIME': 0.0,
+    'F_SLOWEST_RANK_TIME': 0.0,
+}
+
+# Counters that are never aggregated
+_ZEROED_COUNTERS = set(['F_VARIANCE_RANK_TIME', 'F_VARIANCE_RANK_BYTES'])
+
+# (value, count) counter pairs that track the four most common values
+_COMMON_VALUE_REX = re.compile(r'^(STRIDE|ACCESS)([1-4])_(STRIDE|ACCESS|COUNT)$')
+
+def _get_common_value_counters(counter_type):
+    """Return the names of the value and count counters for a common value set
+    """
+    values = ['%s%d_%s' % (counter_type, index, counter_type) for index in range(1, 5)]
+    counts = ['%s%d_COUNT' % (counter_type, index) for index in range(1, 5)]
+    return values, counts
+
+class ModuleAccumulator(object):
+    """Aggregate the base counters of one module as they are parsed
+
+    Reproduces the module-wide counters of ``darshan-parser --total`` and the
+    performance estimates of ``darshan-parser --perf`` from a sequence of
+    records.  Counters must be added in the order they appear in the output of
+    ``darshan-parser --base`` since some aggregation rules depend on the order
+    in which records are encountered.
+    """
+    def __init__(self):
+        self.num_records = 0
+        self.total = {}
+        self.total_bytes = 0L
+        self.shared_time_by_slowest = 0.0
+        self.rank_io_time = {}
+        self.rank_meta_time = {}
+        self.rank_rw_time = {}
+        self._common_values = {}
+        self._record_key = None
+        self._record = {}
+
+    def add(self, record_key, counter, value):
+        """Add a single counter from a base record
+
+        Args:
+            record_key (tuple): (rank, record id) identifying the record to
+                which this counter belongs
+            counter (str): name of the counter without its module prefix
+            value (str): value of the counter as printed by darshan-parser
+        """
+        if record_key != self._record_key:
+            self.flush()
+            self._record_key = record_key
+
+        if '.' in value:
+            self._record[counter] = float(value)
+        else:
+            self._record[counter] = long(value)
+
+    def flush(self):
+        """Aggregate the record currently being assembled
+        """
+        if self._record:
+            self._inject(int(self._record_key[0]), self._record)
+        self._record_key = None
+        self._record = {}
+
+    def _inject(self, rank, record):
+        """Aggregate a single complete record into the module totals
+        """
+        self.num_records += 1
+        total = self.total
+
+        # compare paired counters before their pairs are updated below
+        for counter, paired in _PAIRED_COUNTERS.iteritems():
+            if counter in record:
+                if record.get(paired, 0.0) > total.get(paired, 0.0):
+                    total[counter] = record[counter]
+                elif counter not in total:
+                    total[counter] = 0 * record[counter]
+
+        for counter, value in record.iteritems():
+            if counter in _PAIRED_COUNTERS:
+                continue
+            elif counter.endswith('_START_TIMESTAMP'):
+                if counter not in total or total[counter] <= 0.0:
+                    total[counter] = max(value, 0.0)
+                elif 0.0 < value < total[counter]:
+                    total[counter] = value
+            elif counter.endswith('_END_TIMESTAMP') or counter in _MAX_VALUE_COUNTERS:
+                total[counter] = max(total.get(counter, 0 * value), value)
+            elif counter in _LAST_VALUE_COUNTERS:
+                total[counter] = value
+            elif counter in _OPTIONAL_COUNTERS:
+                if value >= 0:
+                    total[counter] = max(total.get(counter, 0L), 0L) + value
+                elif counter not in total:
+                    total[counter] = value
+            elif counter in _RANK_COUNTERS:
+                if counter not in total:
+                    total[counter] = value
+            elif counter in _ZEROED_COUNTERS:
+                total[counter] = 0 * value
+            elif _COMMON_VALUE_REX.match(counter):
+                continue
+            else:
+                total[counter] = total.get(counter, 0 * value) + value
+
+        for counter_type in 'STRIDE', 'ACCESS':
+            self._update_common_values(counter_type, record)
+
+        # performance estimates
+        self.total_bytes += record.get('BYTES_READ', 0L) + record.get('BYTES_WRITTEN', 0L)
+        if rank < 0:
+            self.shared_time_by_slowest += record.get('F_SLOWEST_RANK_TIME', 0.0)
+        else:
+            meta_time = record.get('F_META_TIME', 0.0)
+            rw_time = record.get('F_READ_TIME', 0.0) + record.get('F_WRITE_TIME', 0.0)
+            self.rank_io_time[rank] = self.rank_io_time.get(rank, 0.0) + meta_time + rw_time
+            self.rank_meta_time[rank] = self.rank_meta_time.get(rank, 0.0) + meta_time
+            self.rank_rw_time[rank] = self.rank_rw_time.get(rank, 0.0) + rw_time
+
+    def _update_common_values(self, counter_type, record):
+        """Merge a record's most common values into the module's
+
+        Each of the record's (value, count) pairs either increments the count
+        of a matching value or displaces the value with the lowest count if its
+        own count is higher.
+        """
+        value_names, count_names = _get_common_value_counters(counter_type)
+        if value_names[0] not in record:
+            return
+
+        common_values = self._common_values.get(counter_type)
+        if common_values is None:
+            common_values = ([0L] * 4, [0L] * 4)
+            self._common_values[counter_type] = common_values
+        values, counts = common_values
+
+        for value_name, count_name in zip(value_names, count_names):
+            add_value = record.get(value_name, 0L)
+            add_count = record.get(count_name, 0L)
+            if add_value == 0:
+                continue
+            if add_value in values:
+                counts[values.index(add_value)] += add_count
+            else:
+                min_index = counts.index(min(counts))
+                if add_count > counts[min_index]:
+                    values[min_index] = add_value
+                    counts[min_index] = add_count
+
+    def get_total(self):
+        """Return the aggregated module counters
+
+        Returns:
+            dict: counter names (without their module prefix) and values in
+            the form of the ``_total`` record produced by darshan-parser --total
+        """
+        self.flush()
+        result = dict(self.total)
+        if self.num_records > 1:
+            for counter, value in _RANK_COUNTERS.iteritems():
+                if counter in result:
+                    result[counter] = value
+        for counter_type, (values, counts) in self._common_values.iteritems():
+            value_names, count_names = _get_common_value_counters(counter_type)
+            result.update(zip(value_names, values))
+            result.update(zip(count_names, counts))
+        return result
+
+    def get_perf(self):
+        """Return the module's performance estimates
+
+        Returns:
+            dict: estimates keyed as in the ``_perf`` record produced by
+            darshan-parser --perf
+        """
+        self.flush()
+        slowest_rank = 0
+        slowest_io_time = 0.0
+        slowest_meta_time = 0.0
+        slowest_rw_time = 0.0
+        for rank in sorted(self.rank_io_time.keys()):
+            if self.rank_io_time[rank] > slowest_io_time:
+                slowest_rank = rank
+                slowest_io_time = self.rank_io_time[rank]
+                slowest_meta_time = self.rank_meta_time[rank]
+                slowest_rw_time = self.rank_rw_time[rank]
+
+        agg_time_by_slowest = slowest_io_time + self.shared_time_by_slowest
+        if agg_time_by_slowest:
+            agg_perf_by_slowest = (self.total_bytes / 1048576.0) / agg_time_by_slowest
+        else:
+            agg_perf_by_slowest = 0.0
+
+        return {
+            'total_bytes': self.total_bytes,
+            'slowest_rank_io_time_unique_files': slowest_io_time,
+            'slowest_rank_meta_only_time_unique_files': slowest_meta_time,
+            'slowest_rank_rw_only_time_unique_files': slowest_rw_time,
+            'slowest_rank_unique_files': long(slowest_rank),
+            'time_by_slowest_shared_files': self.shared_time_by_slowest,
+            'agg_perf_by_slowest': agg_perf_by_slowest,
+        }
+
+# Version of the parsed log cache format; incrementing it invalidates all
+# existing cache entries
+PARSED_CACHE_VERSION = 1
+
+class ParsedLogCache(DiskCache):
+    """Size-bounded on-disk cache of parsed Darshan logs
+
+    Each entry is a compressed numpy archive (.npz) of named arrays whose name
+    is a digest of the log's path, size, and modification time and of the
+    parameters used to parse it.  Darshan logs are never modified once they are
+    written, so a matching entry can always be used in place of running
+    darshan-parser again.
+
+    Entries are evicted in least-recently-used order once their combined size
+    exceeds max_bytes.  The modification time of each entry records when it
+    was last used so that the cache can be shared by concurrent processes.
+    """
+    def __init__(self, cache_dir, max_bytes=None):
+        """Initialize a parsed log cache
+
+        Args:
+            cache_dir (str): directory in which cache entries are stored.  It
+                is created if it does not exist.
+            max_bytes (int): evict entries once they occupy more than this
+                many bytes; None never evicts entries
+        """
+        super(ParsedLogCache, self).__init__(cache_dir, '.npz', max_bytes=max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, log_file, params):
+        """Calculate the key of a log file's cache entry
+
+        Args:
+            log_file (str): path to a Darshan log
+            params (dict): json-serializable parameters that affect the parsed
+                representation of log_file
+
+        Returns:
+            str: key identifying the cache entry, or None if log_file cannot
+            be found
+        """
+        try:
+            stat = os.stat(log_file)
+        except OSError:
+            return None
+        key = json.dumps([PARSED_CACHE_VERSION,
+                          os.path.abspath(log_file),
+                          stat.st_size,
+                          stat.st_mtime,
+                          params], sort_keys=True)
+        return hashlib.sha1(key).hexdigest()
+
+    def get(self, key):
+        """Retrieve a cache entry
+
+        Args:
+            key (str): key returned by get_key
+
+        Returns:
+            dict: numpy arrays keyed by the names they were stored with, or
+            None if no valid entry exists
+        """
+        arrays = self.load(key, _load_npz, errors=(IOError, OSError, ValueError,
+                                                   zipfile.BadZipfile))
+        if arrays is None:
+            self.misses += 1
+            tokio.instrument.count('darshan.parsed_cache.misses')
+        else:
+            self.hits += 1
+            tokio.instrument.count('darshan.parsed_cache.hits')
+        return arrays
+
+    def put(self, key, arrays):
+        """Store a cache entry
+
+        Args:
+            key (str): key returned by get_key
+            arrays (dict): numpy arrays to store keyed by name
+        """
+        self.store(key, lambda output_fp: numpy.savez_compressed(output_fp, **arrays))
+
+def _load_npz(path):
+    """Load all arrays from a numpy archive into a dict
+    """
+    npz_file = numpy.load(path)
+    try:
+        return dict((name, npz_file[name]) for name in npz_file.files)
+    finally:
+        npz_file.close()
+
+def pack_counters(counters, prefix):
+    """Convert the nested dicts of Darshan['counters'] into numpy arrays
+
+    Each (file name, rank) record is assigned a record id, and every counter is
+    stored as a (record id, counter id, value) triplet in either integer or
+    floating-point arrays.  Records of pseudo-files such as ``_total`` that are
+    not keyed by rank are stored with an empty rank.
+
+    Args:
+        counters (dict): counters keyed by module, file name, and rank
+        prefix (str): prefix to apply to the name of each array
+
+    Returns:
+        dict: numpy arrays keyed by name suitable for ParsedLogCache.put
+    """
+    arrays = {'%s.modules' % prefix: numpy.array(sorted(counters.keys()), dtype=str)}
+    for module, module_data in counters.iteritems():
+        file_names = []
+        record_files = []
+        record_ranks = []
+        counter_ids = {}
+        triplets = {'int': ([], [], []), 'float': ([], [], [])}
+        for file_name, file_data in module_data.iteritems():
+            file_id = len(file_names)
+            file_names.append(file_name)
+            if any([isinstance(value, dict) for value in file_data.itervalues()]):
+                rank_items = file_data.iteritems()
+            else:
+                rank_items = [('', file_data)]
+            for rank, record in rank_items:
+                record_id = len(record_files)
+                record_files.append(file_id)
+                record_ranks.append(rank)
+                for counter, value in record.iteritems():
+                    counter_id = counter_ids.get(counter)
+                    if counter_id is None:
+                        counter_id = len(counter_ids)
+                        counter_ids[counter] = counter_id
+                    record_ids, value_counters, values = \
+                        triplets['float' if isinstance(value, float) else 'int']
+                    record_ids.append(record_id)
+                    value_counters.append(counter_id)
+                    values.append(value)
+
+        counter_names = sorted(counter_ids.keys(), key=counter_ids.get)
+        module_prefix = '%s.%s.' % (prefix, module)
+        arrays[module_prefix + 'file_names'] = numpy.array(file_names, dtype=str)
+        arrays[module_prefix + 'record_files'] = numpy.array(record_files, dtype=numpy.int64)
+        arrays[module_prefix + 'record_ranks'] = numpy.array(record_ranks, dtype=str)
+        arrays[module_prefix + 'counter_names'] = numpy.array(counter_names, dtype=str)
+        for dtype, (record_ids, value_counters, values) in triplets.iteritems():
+            arrays[module_prefix + dtype + '_records'] = numpy.array(record_ids, dtype=numpy.int64)
+            arrays[module_prefix + dtype + '_counters'] = numpy.array(value_counters, dtype=numpy.int64)
+            arrays[module_prefix + dtype + '_values'] = numpy.array(
+                values, dtype=(numpy.float64 if dtype == 'float' else numpy.int64))
+    return arrays
+
+def unpack_counters(arrays, prefix):
+    """Convert numpy arrays created by pack_counters back into nested dicts
+
+    Args:
+        arrays (dict): numpy arrays keyed by name as returned by pack_counters
+        prefix (str): prefix that was passed to pack_counters
+
+    Returns:
+        dict: counters keyed by module, file name, and rank
+    """
+    counters = {}
+    for module in arrays['%s.modules' % prefix].tolist():
+        module_prefix = '%s.%s.' % (prefix, module)
+        file_names = arrays[module_prefix + 'file_names'].tolist()
+        counter_names = arrays[module_prefix + 'counter_names'].tolist()
+        module_data = {}
+        records = []
+        for file_id, rank in zip(arrays[module_prefix + 'record_files'].tolist(),
+                                 arrays[module_prefix + 'record_ranks'].tolist()):
+            record = {}
+            if rank:
+                module_data.setdefault(file_names[file_id], {})[rank] = record
+            else:
+                module_data[file_names[file_id]] = record
+            records.append(record)
+
+        for dtype, convert in ('int', long), ('float', float):
+            for record_id, counter_id, value in zip(
+                    arrays[module_prefix + dtype + '_records'].tolist(),
+                    arrays[module_prefix + dtype + '_counters'].tolist(),
+                    arrays[module_prefix + dtype + '_values'].tolist()):
+                records[record_id][counter_names[counter_id]] = convert(value)
+        counters[module] = module_data
+    return counters
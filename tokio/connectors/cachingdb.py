@@ -5,8 +5,13 @@ contains immutable data.  Can use a local caching database (sqlite3) to allow
 for reanalysis on platforms that cannot access the original remote database.
 """
 
+import os
+import sys
 import json
+import hashlib
 import warnings
+import collections
+import cPickle
 try:
     import pymysql
     pymysql.install_as_MySQLdb()
@@ -18,19 +23,56 @@ except ImportError:
     pass
 
 import sqlite3
+import tokio.config
+import tokio.instrument
+from tokio.connectors.common import DiskCache
 
+HIT_MEMORY = 0
 HIT_CACHE_DB = 1
 HIT_REMOTE_DB = 2
 
+### Number of rows fetched from a database at a time by iterate_query
+QUERY_BATCH_SIZE = 10000
+
+### Number of rows written through to a cache db between commits
+WRITE_FLUSH_ROWS = 100000
+
+### Table in a cache db that records which ranges of other tables it contains
+COVERAGE_TABLE = 'CACHINGDB_COVERAGE'
+
+### Bounds on the query results memoized in memory by each CachingDb
+RESULT_CACHE_MAX_ROWS = 1000000
+RESULT_CACHE_MAX_BYTES = None
+
+### Version of the on-disk query result cache format; incrementing it
+### invalidates all existing entries
+RESULT_CACHE_VERSION = 1
+
 class CachingDb(object):
     """
     Connect to and interact with a relational database. If this class is
     instantiated with a cache_file argument, all queries will go to that
     SQLite-based cache database.  If this class is not instantiated with a
     cache_file argument, all queries will go out to the remote database.
+
+    If this class is instantiated with hybrid=True and both a cache_file and a
+    remote database, queries still go to the cache database, but the remote
+    database remains connected so that subclasses can copy the parts of it that
+    the cache database does not yet contain using fill_cache() and record which
+    ranges of each table are cached using add_coverage().
+
+    The results of queries against tables listed in self.memoized_tables are
+    also kept in self.result_cache, a size-bounded QueryResultCache, so that
+    repeating a query does not touch any database.  Subclasses should only add
+    tables whose rows never change once they appear to memoized_tables.  The
+    results of tables that are also listed in self.persisted_tables are stored
+    on disk as well and reused by later processes, so subclasses should only
+    add tables to persisted_tables if the result of any memoized query can
+    never change, e.g., because its time range is in the past.
     """
     #pylint: disable=too-many-arguments
-    def __init__(self, dbhost=None, dbuser=None, dbpassword=None, dbname=None, cache_file=None):
+    def __init__(self, dbhost=None, dbuser=None, dbpassword=None, dbname=None, cache_file=None,
+                 hybrid=False):
         # self.saved_results is the in-memory data cache.  It has a structure of
         # saved_results = {
         #    'table1': {
@@ -42,15 +84,31 @@ class CachingDb(object):
         # }
         self.saved_results = {}
         self.last_hit = None
+        self.hybrid = hybrid
+
+        # memoized query results
+        self.memoized_tables = set([])
+        self.persisted_tables = set([])
+        self.result_cache = QueryResultCache(
+            cache_dir=getattr(tokio.config, 'CACHINGDB_RESULT_CACHE_DIR', None),
+            max_disk_bytes=getattr(tokio.config, 'CACHINGDB_RESULT_CACHE_BYTES', None))
 
         # cache db
         self.cache_file = None
         self.cache_db = None
         self.cache_db_ps = None
 
+        # write-through cache db
+        self.write_cache_file = None
+        self.write_cache_db = None
+        self.write_flush_rows = None
+        self._write_tables = set([])
+        self._write_pending = 0
+
         # actual db
         self.remote_db = None
         self.remote_db_ps = None
+        self.remote_db_name = None
 
         # Connect to cache db if specified
         if cache_file is not None:
@@ -73,7 +131,7 @@ class CachingDb(object):
         """
         Establish db connection
         """
-        if self.cache_db is not None:
+        if self.cache_db is not None and not self.hybrid:
             # can't really do both local and remote dbs; all queries will be
             # run against the cache_db, which is probably not what someone
             # wants
@@ -85,6 +143,7 @@ class CachingDb(object):
                                          passwd=dbpassword,
                                          db=dbname)
         self.remote_db_ps = get_paramstyle_symbol(MySQLdb.paramstyle)
+        self.remote_db_name = "%s/%s" % (dbhost, dbname)
 
     def close(self):
         """
@@ -93,6 +152,7 @@ class CachingDb(object):
         """
         self.remote_db = None
         self.remote_db_ps = None
+        self.remote_db_name = None
 
     def connect_cache(self, cache_file):
         """
@@ -100,7 +160,9 @@ class CachingDb(object):
         read and write.
         """
         if cache_file is not None:
-            self.cache_db = sqlite3.connect(cache_file)
+            # allow threads that take turns querying this object (e.g., the
+            # connectors run by tools.jobsummary) to share the connection
+            self.cache_db = sqlite3.connect(cache_file, check_same_thread=False)
             self.cache_file = cache_file
             self.cache_db_ps = get_paramstyle_symbol(sqlite3.paramstyle)
 
@@ -114,9 +176,12 @@ class CachingDb(object):
 
     def drop_cache(self, tables=None):
         """
-        Flush saved results from memory.  If tables are specified, only drop
-        those tables' results.  If no tables are provided, flush everything.
+        Flush saved results and memoized query results from memory.  If tables
+        are specified, only drop those tables' results.  If no tables are
+        provided, flush everything.
         """
+        self.result_cache.clear(tables)
+
         drop_caches = set([])
         for table in self.saved_results.keys():
             if tables is None or table in tables:
@@ -127,9 +192,11 @@ class CachingDb(object):
 
     def save_cache(self, cache_file):
         """
-        Commit the in-memory cache to a cache database.  Currently very
-        memory-inefficient and not good for caching giant pieces of a database
-        without something wrapping it to feed it smaller pieces.
+        Commit the in-memory cache to a cache database.  This requires holding
+        every saved row in memory until the cache is saved, so caching giant
+        pieces of a database should instead use connect_write_cache() to write
+        rows out as they are retrieved.  If cache_file is the current
+        write-through cache, it is flushed and closed.
 
         Also note that we manipulate the object's cache_db* attributes in a
         dirty way here to prevent closing and re-opening the original cache
@@ -137,6 +204,9 @@ class CachingDb(object):
         more state, this function must also be updated to retain that state
         while the old cache db state is being temporarily shuffled out.
         """
+        if self.write_cache_db is not None and self.write_cache_file == cache_file:
+            self.close_write_cache()
+
         ### Shuffle out the old cache db state (if it exists)
         old_state = {}
         if self.cache_file is not None and self.cache_file != cache_file:
@@ -152,48 +222,23 @@ class CachingDb(object):
         ### Commit each table we've retained in memory
         drop_caches = set([])
         for table, table_info in self.saved_results.iteritems():
-            if len(self.saved_results[table]['rows']) < 1:
+            if len(table_info['rows']) < 1:
                 warnings.warn("table %s has no rows" % table)
                 continue
 
-            num_fields = None
-            ### Verify and preprocess each saved row
-            for index, row in enumerate(self.saved_results[table]['rows']):
-                if num_fields is None:
-                    num_fields = len(row)
-
-                ### Verify that the rows we've saved are actually all of the
-                ### same length so that they have a hope of being inserted
-                ### into the schema
-                if len(row) != num_fields:
-                    warnings.warn(
-                        "saved_results[%s] contains non-uniform rows (%d, %d); skipping table" %
-                        table, len(row), num_fields)
-                    continue
-                else:
-                    ### Prepend table name to row to facilitate the bulk insert
-                    ### query below
-#                   self.saved_results[table]['rows'][index] = (table,) + row
-                    pass
-
-            ### Create the table (if necessary).  This will throw all sorts of
-            ### exceptions if
-            ###   (1) the table doesn't already exist in the cache database, or
-            ###   (2) 'schema' isn't set correctly by the downstream application
-            if table_info['schema'] is not None:
-                self.cache_db.execute(
-                    "CREATE TABLE IF NOT EXISTS %s (%s, PRIMARY KEY(%s))" %
-                    (table,
-                    ', '.join(table_info['schema']['columns']),
-                    ', '.join(table_info['schema']['primary_key'])))
-
-            ### INSERT OR REPLACE so that the cache db never wins if a duplicate
-            ### primary key is detected
-            query_str = "insert or replace into %s values (%s)" % (table, ','.join(['?'] * num_fields))
-            self.cache_db.executemany(
-                query_str,
-                table_info['rows'])
-            self.cache_db.commit()
+            ### Verify that the rows we've saved are actually all of the same
+            ### length so that they have a hope of being inserted into the
+            ### schema
+            num_fields = len(table_info['rows'][0])
+            if any(len(row) != num_fields for row in table_info['rows']):
+                warnings.warn("saved_results[%s] contains non-uniform rows; skipping table"
+                              % table)
+                continue
+
+            _create_table(self.cache_db, table, table_info['schema'])
+            _insert_rows(self.cache_db, table, table_info['rows'])
+            with tokio.instrument.span('cachingdb.save_cache'):
+                self.cache_db.commit()
 
             ### Drop committed rows from memory
             drop_caches.add(table)
@@ -209,16 +254,204 @@ class CachingDb(object):
             self.cache_db = old_state['cache_db']
             self.cache_db_ps = old_state['cache_db_ps']
 
-    def query(self, query_str, query_variables=(), table=None, table_schema=None):
+    def connect_write_cache(self, cache_file, flush_rows=WRITE_FLUSH_ROWS):
+        """Write saved results through to a cache database as they arrive
+
+        Once connected, rows that queries would otherwise save in memory (i.e.,
+        those of queries with a table) are instead inserted into cache_file
+        and committed every flush_rows rows, so the size of a cache is not
+        limited by the memory available.  Rows already saved in memory are
+        written out immediately.  Queries are still answered by the cache or
+        remote database as before; cache_file is only written to.
+
+        A table is created in cache_file from the first schema passed for it,
+        so table_schema must be given on the first query of any table that
+        does not already exist in cache_file.
+
+        Args:
+            cache_file (str): path to the SQLite database to write rows into
+            flush_rows (int): number of rows to insert between commits
+        """
+        self.close_write_cache()
+        self.write_cache_db = sqlite3.connect(cache_file, check_same_thread=False)
+        self.write_cache_file = cache_file
+        self.write_flush_rows = flush_rows
+
+        saved_results = self.saved_results
+        self.saved_results = {}
+        for table, table_info in saved_results.iteritems():
+            self._save_rows(table, table_info['schema'], table_info['rows'])
+
+    def flush_write_cache(self):
+        """Commit all rows written through to the cache database so far
+        """
+        if self.write_cache_db is not None:
+            with tokio.instrument.span('cachingdb.save_cache'):
+                self.write_cache_db.commit()
+            self._write_pending = 0
+
+    def close_write_cache(self):
+        """Flush and close the write-through cache database, if one is open
+
+        Subsequent query results are saved in memory again.
+        """
+        if self.write_cache_db is not None:
+            self.flush_write_cache()
+            self.write_cache_db = self.write_cache_db.close()
+            self.write_cache_file = None
+            self.write_flush_rows = None
+            self._write_tables = set([])
+
+    def is_hybrid(self):
+        """Determine whether both a cache and a remote database are connected
+
+        Returns:
+            bool: True if queries go to the cache database and gaps in it can be
+            filled from the remote database
+        """
+        return self.hybrid and self.cache_db is not None and self.remote_db is not None
+
+    def fill_cache(self, query_str, query_variables=(), table=None, table_schema=None,
+                   columns=None, batch_size=QUERY_BATCH_SIZE):
+        """Copy the results of a remote database query into the cache database
+
+        Rows are streamed from the remote database and inserted into table in
+        the cache database a batch at a time, then committed.
+
+        Args:
+            query_str (str): query to run against the remote database
+            query_variables (tuple): values to substitute into query_str
+            table (str): name of the cache database table to insert rows into
+            table_schema (dict): schema used to create table if it does not
+                already exist; see query()
+            columns (list of str): names of the table columns corresponding to
+                each column of the query results.  If None, the query results
+                must contain every column of table in order.
+            batch_size (int): maximum number of rows to insert at once
+
+        Returns:
+            int: number of rows copied into the cache database
+        """
+        if self.cache_db is None or self.remote_db is None:
+            raise RuntimeError('fill_cache requires both a cache and a remote database')
+
+        query_str = ' '.join(query_str.split())
+        _create_table(self.cache_db, table, table_schema)
+        num_rows = 0
+        for rows in self._iterate_mysql(query_str, query_variables, batch_size):
+            _insert_rows(self.cache_db, table, rows, columns)
+            num_rows += len(rows)
+        with tokio.instrument.span('cachingdb.save_cache'):
+            self.cache_db.commit()
+        self.last_hit = HIT_REMOTE_DB
+        return num_rows
+
+    def get_coverage_gaps(self, table, start, end):
+        """Find the parts of a range of a table that the cache db does not contain
+
+        Ranges are half-open intervals of any values that can be compared both
+        in SQLite and in Python, e.g., timestamps as YYYY-MM-DD HH:MM:SS
+        strings.
+
+        Args:
+            table (str): name of the table whose coverage is being checked
+            start: lower bound of the range, inclusive
+            end: upper bound of the range, exclusive
+
+        Returns:
+            list: (start, end) tuples of each sub-range of start to end that
+            has not been recorded using add_coverage(), in ascending order
+        """
+        if start >= end:
+            return []
+        if self.cache_db is None or not self._has_table(COVERAGE_TABLE):
+            return [(start, end)]
+
+        cursor = self.cache_db.execute(
+            "SELECT RANGE_START, RANGE_END FROM %s"
+            " WHERE TABLE_NAME = ? AND RANGE_END > ? AND RANGE_START < ?"
+            " ORDER BY RANGE_START" % COVERAGE_TABLE,
+            (table, start, end))
+
+        gaps = []
+        gap_start = start
+        for range_start, range_end in cursor.fetchall():
+            if range_start > gap_start:
+                gaps.append((gap_start, range_start))
+            if range_end > gap_start:
+                gap_start = range_end
+        if gap_start < end:
+            gaps.append((gap_start, end))
+        return gaps
+
+    def add_coverage(self, table, start, end):
+        """Record that the cache db contains every row of a range of a table
+
+        The new range is merged with any overlapping or adjoining ranges that
+        were already recorded.
+
+        Args:
+            table (str): name of the table whose coverage is being recorded
+            start: lower bound of the range, inclusive
+            end: upper bound of the range, exclusive
+        """
+        if start >= end:
+            return
+
+        self.cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS %s (TABLE_NAME, RANGE_START, RANGE_END,"
+            " PRIMARY KEY(TABLE_NAME, RANGE_START))" % COVERAGE_TABLE)
+
+        query_variables = (table, start, end)
+        cursor = self.cache_db.execute(
+            "SELECT MIN(RANGE_START), MAX(RANGE_END) FROM %s"
+            " WHERE TABLE_NAME = ? AND RANGE_END >= ? AND RANGE_START <= ?" % COVERAGE_TABLE,
+            query_variables)
+        range_start, range_end = cursor.fetchone()
+        if range_start is not None and range_start < start:
+            start = range_start
+        if range_end is not None and range_end > end:
+            end = range_end
+
+        self.cache_db.execute(
+            "DELETE FROM %s WHERE TABLE_NAME = ? AND RANGE_END >= ? AND RANGE_START <= ?"
+            % COVERAGE_TABLE,
+            query_variables)
+        self.cache_db.execute(
+            "INSERT INTO %s VALUES (?, ?, ?)" % COVERAGE_TABLE,
+            (table, start, end))
+        self.cache_db.commit()
+
+    def _has_table(self, table):
+        """Determine whether a table exists in the cache database
+        """
+        cursor = self.cache_db.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name=?",
+            (table,))
+        return cursor.fetchone()[0] > 0
+
+    def query(self, query_str, query_variables=(), table=None, table_schema=None,
+              memoize=True):
         """
         Pass a query through all layers of cache and return on the first hit.
         If a table is specified, the results of this query can be saved to the
-        cache db into a table of that name.
+        cache db into a table of that name.  If the table is also one of
+        memoized_tables and memoize is True, the results are served from and
+        kept in the query result cache.
         """
 
         ### Collapse query string to remove extraneous whitespace
         query_str = ' '.join(query_str.split())
 
+        ### Check the query result cache (if this table may be memoized)
+        result_key = None
+        if memoize and table in self.memoized_tables:
+            result_key = self._get_result_key(query_str, query_variables)
+            results = self.result_cache.get(result_key, persist=table in self.persisted_tables)
+            if results is not None:
+                self.last_hit = HIT_MEMORY
+                return results
+
         ### Check the cache database (if available)
         if self.cache_db is not None:
             results = self._query_sqlite3(query_str, query_variables)
@@ -231,34 +464,146 @@ class CachingDb(object):
             raise RuntimeError('No databases available to query')
 
         if table is not None:
-            ### Initialize the table if our intent is to save the result of this
-            ### query.
-            if table not in self.saved_results:
-                self.saved_results[table] = {
-                    'rows': [],
-                    'schema': None,
-                }
-            ### Table schema can be defined or re-defined on any query.  It is
-            ### up to the downstream application to manage this correctly.
-            if table_schema is not None:
-                self.saved_results[table]['schema'] = table_schema
-
-            ### Append our results
-            self.saved_results[table]['rows'] += list(results)
+            self._save_rows(table, table_schema, results)
+
+        if result_key is not None:
+            self.result_cache.put(result_key, table, results,
+                                  persist=table in self.persisted_tables)
 
         return results
 
+    def iterate_query(self, query_str, query_variables=(), table=None, table_schema=None,
+                      batch_size=QUERY_BATCH_SIZE, save_results=True, memoize=False):
+        """Run a query and yield its results a batch of rows at a time
+
+        Unlike query(), the full result set is never held in memory at once
+        unless it is being saved.  Rows are fetched from the remote database
+        using an unbuffered (server-side) cursor, so no other query can be
+        issued to the remote database until iteration is complete.
+
+        Args:
+            query_str (str): query to run
+            query_variables (tuple): values to substitute into query_str
+            table (str): name of the table into which results may be saved
+            table_schema (dict): schema of table; see query()
+            batch_size (int): maximum number of rows to fetch and yield at once
+            save_results (bool): append each batch to saved_results[table] so
+                it can later be written out by save_cache().  Has no effect if
+                table is None.
+            memoize (bool): serve results from the query result cache and keep
+                them there if table is one of memoized_tables.  Results are only
+                kept if they are iterated over in full and fit in the cache, and
+                results served from the cache are not saved again.
+
+        Yields:
+            list: tuples containing up to batch_size rows of results
+        """
+        ### Collapse query string to remove extraneous whitespace
+        query_str = ' '.join(query_str.split())
+
+        result_key = None
+        if memoize and table in self.memoized_tables:
+            result_key = self._get_result_key(query_str, query_variables)
+            results = self.result_cache.get(result_key, persist=table in self.persisted_tables)
+            if results is not None:
+                self.last_hit = HIT_MEMORY
+                for index in range(0, len(results), batch_size):
+                    yield results[index:index + batch_size]
+                return
+
+        if self.cache_db is not None:
+            batches = self._iterate_sqlite3(query_str, query_variables, batch_size)
+            self.last_hit = HIT_CACHE_DB
+        elif self.remote_db is not None:
+            batches = self._iterate_mysql(query_str, query_variables, batch_size)
+            self.last_hit = HIT_REMOTE_DB
+        else:
+            raise RuntimeError('No databases available to query')
+
+        results = [] if result_key is not None else None
+        for rows in batches:
+            if table is not None and save_results:
+                self._save_rows(table, table_schema, rows)
+            if results is not None:
+                results += rows
+                if not self.result_cache.fits(len(results)):
+                    results = None
+            yield rows
+
+        if results is not None:
+            self.result_cache.put(result_key, table, results,
+                                  persist=table in self.persisted_tables)
+
+    def _get_result_key(self, query_str, query_variables):
+        """Identify a query and the database that answers it in the result cache
+
+        A cache db is identified by its size and modification time as well as
+        its path so that results are never reused after it is rewritten.
+        """
+        if self.cache_db is not None:
+            try:
+                stat = os.stat(self.cache_file)
+                db_name = "sqlite3:%s:%d:%r" % (os.path.abspath(self.cache_file),
+                                                stat.st_size,
+                                                stat.st_mtime)
+            except OSError:
+                db_name = "sqlite3:%s" % self.cache_file
+        else:
+            db_name = "mysql:%s" % self.remote_db_name
+        return (db_name, query_str, tuple(query_variables))
+
+    def _save_rows(self, table, table_schema, rows):
+        """Append rows to the in-memory cache of a table, or insert them into
+        the write-through cache database if one is connected
+        """
+        if self.write_cache_db is not None:
+            self._write_rows(table, table_schema, rows)
+            return
+
+        ### Initialize the table if our intent is to save the result of this
+        ### query.
+        if table not in self.saved_results:
+            self.saved_results[table] = {
+                'rows': [],
+                'schema': None,
+            }
+        ### Table schema can be defined or re-defined on any query.  It is
+        ### up to the downstream application to manage this correctly.
+        if table_schema is not None:
+            self.saved_results[table]['schema'] = table_schema
+
+        ### Append our results
+        self.saved_results[table]['rows'] += list(rows)
+
+    def _write_rows(self, table, table_schema, rows):
+        """Insert rows into the write-through cache database and commit them
+        once enough rows have accumulated
+        """
+        if table not in self._write_tables and table_schema is not None:
+            _create_table(self.write_cache_db, table, table_schema)
+            self._write_tables.add(table)
+
+        if not rows:
+            return
+
+        _insert_rows(self.write_cache_db, table, rows)
+        self._write_pending += len(rows)
+        if self._write_pending >= self.write_flush_rows:
+            self.flush_write_cache()
+
     def _query_sqlite3(self, query_str, query_variables):
         """
         Run a query against the cache database and yield the full output.  No
         buffering, so be careful.
         """
-        cursor = self.cache_db.cursor()
-        if '%(ps)' in query_str:
-            query_str = query_str % {'ps': self.cache_db_ps}
-        cursor.execute(query_str, query_variables)
-        rows = cursor.fetchall()
-        cursor.close()
+        with tokio.instrument.span('cachingdb.query_sqlite3'):
+            cursor = self.cache_db.cursor()
+            if '%(ps)' in query_str:
+                query_str = query_str % {'ps': self.cache_db_ps}
+            cursor.execute(query_str, query_variables)
+            rows = cursor.fetchall()
+            cursor.close()
+        tokio.instrument.count('cachingdb.query_sqlite3.rows', len(rows))
         return rows
 
     def _query_mysql(self, query_str, query_variables):
@@ -267,13 +612,289 @@ class CachingDb(object):
         No buffering, so be careful.
 
         """
-        cursor = self.remote_db.cursor()
+        with tokio.instrument.span('cachingdb.query_mysql'):
+            cursor = self.remote_db.cursor()
+            if '%(ps)' in query_str:
+                query_str = query_str % {'ps': self.remote_db_ps}
+            cursor.execute(query_str, query_variables)
+            rows = cursor.fetchall()
+            cursor.close()
+        tokio.instrument.count('cachingdb.query_mysql.rows', len(rows))
+        return rows
+
+    def _iterate_sqlite3(self, query_str, query_variables, batch_size):
+        """
+        Run a query against the cache database and yield its output a batch of
+        rows at a time.
+        """
+        cursor = self.cache_db.cursor()
+        if '%(ps)' in query_str:
+            query_str = query_str % {'ps': self.cache_db_ps}
+        return _iterate_cursor(cursor, query_str, query_variables, batch_size,
+                               'cachingdb.query_sqlite3')
+
+    def _iterate_mysql(self, query_str, query_variables, batch_size):
+        """
+        Run a query against the MySQL database using a server-side cursor and
+        yield its output a batch of rows at a time.
+        """
+        cursor = self.remote_db.cursor(MySQLdb.cursors.SSCursor)
         if '%(ps)' in query_str:
             query_str = query_str % {'ps': self.remote_db_ps}
+        return _iterate_cursor(cursor, query_str, query_variables, batch_size,
+                               'cachingdb.query_mysql')
+
+class QueryResultCache(object):
+    """Size-bounded LRU cache of query results
+
+    Results are kept in memory until their total number of rows exceeds
+    max_rows or their estimated size exceeds max_bytes, at which point the
+    least recently used results are evicted.
+
+    If cache_dir is given, results that are put with persist=True are also
+    pickled into a connectors.common.DiskCache there so that they can be used
+    after being evicted from memory or by other processes.  Only results that
+    can never change should be persisted since on-disk entries never expire;
+    they are only evicted once they occupy more than max_disk_bytes.
+    """
+    def __init__(self, max_rows=RESULT_CACHE_MAX_ROWS, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 cache_dir=None, max_disk_bytes=None):
+        """Initialize a query result cache
+
+        Args:
+            max_rows (int): evict results from memory once they contain more
+                than this many rows; None never evicts based on rows
+            max_bytes (int): evict results from memory once their estimated
+                size exceeds this many bytes; None never evicts based on size
+            cache_dir (str): directory in which results are also stored; None
+                keeps results only in memory
+            max_disk_bytes (int): evict results from cache_dir once they occupy
+                more than this many bytes; None never evicts them
+        """
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        if cache_dir:
+            self.disk_cache = DiskCache(cache_dir, '.pickle', max_bytes=max_disk_bytes)
+        else:
+            self.disk_cache = None
+        # (table, rows, bytes) of each result keyed by query, least recently
+        # used first
+        self.entries = collections.OrderedDict()
+        self.num_rows = 0
+        self.num_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def fits(self, num_rows, num_bytes=0):
+        """Determine whether a result is small enough to be kept in memory
+
+        Args:
+            num_rows (int): number of rows in the result
+            num_bytes (int): estimated size of the result
+
+        Returns:
+            bool: True if the result does not exceed max_rows or max_bytes
+        """
+        return (self.max_rows is None or num_rows <= self.max_rows) \
+            and (self.max_bytes is None or num_bytes <= self.max_bytes)
+
+    def get(self, key, persist=False):
+        """Retrieve the result of a query
+
+        Args:
+            key (tuple): hashable key identifying the query
+            persist (bool): also look for the result in cache_dir
+
+        Returns:
+            list: rows of the result, or None if the result is not cached
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            # mark this result as most recently used
+            self.entries[key] = entry
+            self.hits += 1
+            tokio.instrument.count('cachingdb.result_cache.hits')
+            return list(entry[1])
+
+        entry = self._get_disk(key) if persist else None
+        if entry is not None:
+            self.disk_hits += 1
+            tokio.instrument.count('cachingdb.result_cache.disk_hits')
+            self._put_memory(key, *entry)
+            return list(entry[1])
+
+        self.misses += 1
+        tokio.instrument.count('cachingdb.result_cache.misses')
+        return None
+
+    def put(self, key, table, rows, persist=False):
+        """Store the result of a query
+
+        Args:
+            key (tuple): hashable key identifying the query
+            table (str): name of the table the result came from
+            rows (list): rows of the result
+            persist (bool): also store the result in cache_dir.  Only results
+                that can never change should be persisted.
+        """
+        rows = tuple(rows)
+        self._put_memory(key, table, rows)
+        if persist and self.disk_cache is not None:
+            digest = _get_digest(key)
+            self.disk_cache.store(
+                digest,
+                lambda output_fp: cPickle.dump((key, table, rows), output_fp,
+                                               cPickle.HIGHEST_PROTOCOL))
+
+    def clear(self, tables=None):
+        """Evict results from memory
+
+        Results persisted in cache_dir are retained.
+
+        Args:
+            tables (list of str): only evict results that came from these
+                tables; None evicts all results
+        """
+        for key, (table, rows, num_bytes) in self.entries.items():
+            if tables is None or table in tables:
+                del self.entries[key]
+                self.num_rows -= len(rows)
+                self.num_bytes -= num_bytes
+
+    def get_stats(self):
+        """Report the effectiveness and size of the cache
+
+        Returns:
+            dict: number of ``hits`` served from memory, ``disk_hits`` served
+            from cache_dir, ``misses``, ``evictions`` from memory, and the
+            number of ``entries``, ``rows``, and estimated ``bytes`` in memory
+        """
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'rows': self.num_rows,
+            'bytes': self.num_bytes,
+        }
+
+    def _put_memory(self, key, table, rows):
+        """Store a result in memory and evict others until the cache fits
+        """
+        num_bytes = _estimate_bytes(rows) if self.max_bytes is not None else 0
+        if key in self.entries:
+            _, old_rows, old_bytes = self.entries.pop(key)
+            self.num_rows -= len(old_rows)
+            self.num_bytes -= old_bytes
+        if not self.fits(len(rows), num_bytes):
+            return
+
+        self.entries[key] = (table, rows, num_bytes)
+        self.num_rows += len(rows)
+        self.num_bytes += num_bytes
+        while not self.fits(self.num_rows, self.num_bytes):
+            _, (_, old_rows, old_bytes) = self.entries.popitem(last=False)
+            self.num_rows -= len(old_rows)
+            self.num_bytes -= old_bytes
+            self.evictions += 1
+
+    def _get_disk(self, key):
+        """Retrieve a (table, rows) tuple from cache_dir
+        """
+        if self.disk_cache is None:
+            return None
+        entry = self.disk_cache.load(_get_digest(key), _load_pickle,
+                                     errors=(IOError, OSError, EOFError, ValueError,
+                                             cPickle.UnpicklingError))
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1:]
+
+def _get_digest(key):
+    """Convert a query result key into the name of an on-disk cache entry
+    """
+    return hashlib.sha1(repr((RESULT_CACHE_VERSION, key))).hexdigest()
+
+def _load_pickle(path):
+    """Load a pickled query result
+    """
+    with open(path, 'rb') as pickle_file:
+        return cPickle.load(pickle_file)
+
+def _estimate_bytes(rows):
+    """Estimate the memory occupied by rows of query results
+    """
+    num_bytes = sys.getsizeof(rows)
+    for row in rows:
+        num_bytes += sys.getsizeof(row) + sum([sys.getsizeof(value) for value in row])
+    return num_bytes
+
+def _iterate_cursor(cursor, query_str, query_variables, batch_size, timer_name):
+    """Execute a query on a cursor and yield its results using fetchmany
+
+    The cursor is closed once all rows have been fetched or the consumer stops
+    iterating.
+
+    Args:
+        cursor: DB-API cursor on which to execute query_str
+        query_str (str): query to execute
+        query_variables (tuple): values to substitute into query_str
+        batch_size (int): number of rows to request from each fetchmany
+        timer_name (str): name under which time and rows are reported to
+            tokio.instrument
+
+    Yields:
+        list: up to batch_size rows
+    """
+    timer = tokio.instrument.Timer(timer_name)
+    num_rows = 0
+    try:
         cursor.execute(query_str, query_variables)
-        rows = cursor.fetchall()
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            num_rows += len(rows)
+            yield list(rows)
+    finally:
         cursor.close()
-        return rows
+        timer.stop()
+        tokio.instrument.count(timer_name + '.rows', num_rows)
+
+def _create_table(cache_db, table, table_schema):
+    """Create a table in a cache database from its schema if it does not exist
+
+    If table_schema is None, the table must already exist in cache_db or
+    subsequent inserts into it will fail.
+    """
+    if table_schema is not None:
+        cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS %s (%s, PRIMARY KEY(%s))" %
+            (table,
+             ', '.join(table_schema['columns']),
+             ', '.join(table_schema['primary_key'])))
+
+def _insert_rows(cache_db, table, rows, columns=None):
+    """Insert rows into a table of a cache database without committing them
+
+    INSERT OR REPLACE is used so that the cache db never wins if a duplicate
+    primary key is detected.  The statement for a given table and row width is
+    always the same string, so sqlite3 compiles it once and reuses the prepared
+    statement from its statement cache for every subsequent batch.
+
+    If columns are given, each row contains only those columns of the table.
+    """
+    if columns is None:
+        table_str = table
+    else:
+        table_str = "%s (%s)" % (table, ', '.join(columns))
+    query_str = "insert or replace into %s values (%s)" % (table_str, ','.join(['?'] * len(rows[0])))
+    with tokio.instrument.span('cachingdb.save_cache'):
+        cache_db.executemany(query_str, rows)
+    tokio.instrument.count('cachingdb.save_cache.rows', len(rows))
 
 def get_paramstyle_symbol(paramstyle):
     """
@@ -7,6 +7,7 @@ import copy
 import time
 import json
 import tokio
+import tokio.instrument
 try:
     from elasticsearch import Elasticsearch
 except ImportError:
@@ -323,15 +324,15 @@ class CollectdEs(object):
         tokio.debug.debug_print(json.dumps(query, indent=4))
 
         ### Run query
-        time0 = time.time()
-        self.query_and_scroll(
-            query=query,
-            source_filter=COLLECTD_SOURCE_FILTER,
-            filter_function=lambda x: x['hits']['hits'],
-            flush_every=50000,
-            flush_function=lambda x: x,
-        )
-        tokio.debug.debug_print("ElasticSearch query took %s seconds" % (time.time() - time0))
+        with tokio.instrument.span('collectd_es.query_timeseries') as timer:
+            self.query_and_scroll(
+                query=query,
+                source_filter=COLLECTD_SOURCE_FILTER,
+                filter_function=lambda x: x['hits']['hits'],
+                flush_every=50000,
+                flush_function=lambda x: x,
+            )
+        tokio.debug.debug_print("ElasticSearch query took %s seconds" % timer.elapsed)
 
 def build_timeseries_query(orig_query, start, end):
     """
@@ -6,9 +6,11 @@ import os
 import sys
 import gzip
 import errno
+import tempfile
 import warnings
 import mimetypes
 import subprocess
+import tokio.instrument
 
 class SubprocessOutputDict(dict):
     """Generic class to support connectors that parse the output of a subprocess
@@ -26,6 +28,7 @@ class SubprocessOutputDict(dict):
         self.silent_errors = silent_errors
         self.from_string = from_string
         self.subprocess_cmd = []
+        self.subprocess_returncode = None
 
     def load(self):
         """Load based on initialization state of object
@@ -41,26 +44,87 @@ class SubprocessOutputDict(dict):
         """Run a subprocess and pass its stdout to a self-initializing parser
         """
 
-        cmd = self.subprocess_cmd
-        if args:
-            cmd += args
+        cmd = self.subprocess_cmd + list(args)
+        timer_name = self._get_timer_name()
 
         try:
-            if self.silent_errors:
-                with open(os.devnull, 'w') as devnull:
-                    output_str = subprocess.check_output(cmd, stderr=devnull)
-            else:
-                output_str = subprocess.check_output(cmd)
+            with tokio.instrument.span(timer_name):
+                if self.silent_errors:
+                    with open(os.devnull, 'w') as devnull:
+                        output_str = subprocess.check_output(cmd, stderr=devnull)
+                else:
+                    output_str = subprocess.check_output(cmd)
+            self.subprocess_returncode = 0
         except subprocess.CalledProcessError as error:
             warnings.warn("%s returned nonzero exit code (%d)" % (cmd, error.returncode))
+            self.subprocess_returncode = error.returncode
             output_str = error.output
         except OSError as error:
             if error[0] == errno.ENOENT:
                 raise type(error)(error[0], "%s command not found" % self.subprocess_cmd[0])
             raise
 
+        tokio.instrument.count(timer_name + '.bytes', len(output_str))
         self.load_str(output_str)
 
+    def _iterate_subprocess(self, *args):
+        """Run a subprocess and yield its stdout one line at a time
+
+        Unlike _load_subprocess, the subprocess's output is never buffered in
+        its entirety; each line is yielded as soon as it is read from the pipe.
+        If the consumer stops iterating before the subprocess finishes, the
+        subprocess is terminated.  The time reported to tokio.instrument covers
+        the whole iteration, including the time the consumer spends parsing.
+
+        Args:
+            args: additional arguments to append to subprocess_cmd
+
+        Yields:
+            str: lines of the subprocess's stdout, including trailing newlines
+        """
+        cmd = self.subprocess_cmd + list(args)
+        timer = tokio.instrument.Timer(self._get_timer_name())
+        num_bytes = 0
+
+        devnull = open(os.devnull, 'w') if self.silent_errors else None
+        try:
+            try:
+                proc = subprocess.Popen(cmd, bufsize=-1, stdout=subprocess.PIPE, stderr=devnull)
+            except OSError as error:
+                if error[0] == errno.ENOENT:
+                    raise type(error)(error[0], "%s command not found" % self.subprocess_cmd[0])
+                raise
+
+            try:
+                # file iteration reads ahead and would block until the pipe's
+                # buffer fills, so read one line at a time instead
+                for line in iter(proc.stdout.readline, ''):
+                    num_bytes += len(line)
+                    yield line
+                returncode = proc.wait()
+                self.subprocess_returncode = returncode
+                if returncode != 0:
+                    warnings.warn("%s returned nonzero exit code (%d)" % (cmd, returncode))
+            finally:
+                # only reached with a live subprocess if the consumer bailed early
+                if proc.poll() is None:
+                    proc.terminate()
+                    proc.wait()
+                proc.stdout.close()
+        finally:
+            if devnull is not None:
+                devnull.close()
+            timer.stop()
+            tokio.instrument.count(timer.name + '.bytes', num_bytes)
+
+    def _get_timer_name(self):
+        """Return the name under which subprocess time is reported
+
+        Returns:
+            str: ``subprocess.`` followed by the name of the command being run
+        """
+        return 'subprocess.' + os.path.basename(self.subprocess_cmd[0])
+
     def load_cache(self):
         """Load subprocess output from a cached text file
         """
@@ -93,3 +157,126 @@ class SubprocessOutputDict(dict):
         else:
             with open(output_file, 'w') as output_fp:
                 output_fp.write(str(self))
+
+class DiskCache(object):
+    """Size-bounded directory of cache entries shared by concurrent processes
+
+    Each entry is a single file named after its key.  Entries are written to a
+    temporary file and then renamed so that concurrent readers never see a
+    partially written entry, and they are evicted in least-recently-used order
+    once their combined size exceeds max_bytes.  The modification time of each
+    entry records when it was last used.
+
+    This class only manages files; subclasses and callers decide how entries
+    are serialized.
+    """
+    def __init__(self, cache_dir, suffix, max_bytes=None):
+        """Initialize a cache directory
+
+        Args:
+            cache_dir (str): directory in which cache entries are stored.  It
+                is created if it does not exist.
+            suffix (str): file name extension of each entry, e.g., ``.npz``
+            max_bytes (int): evict entries once they occupy more than this
+                many bytes; None never evicts entries
+        """
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self._cache_bytes = None
+
+    def get_path(self, key):
+        """Return the path to the cache entry for a key
+
+        Args:
+            key (str): key of the entry; must be usable as a file name
+        """
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def load(self, key, load_func, errors=(IOError, OSError, ValueError)):
+        """Read a cache entry and mark it as most recently used
+
+        Entries that exist but cannot be read are removed.
+
+        Args:
+            key (str): key of the entry
+            load_func (function): called with the path to the entry and returns
+                its deserialized contents
+            errors (tuple): exceptions raised by load_func that indicate the
+                entry is missing or invalid
+
+        Returns:
+            The return value of load_func, or None if no valid entry exists
+        """
+        path = self.get_path(key)
+        try:
+            value = load_func(path)
+        except errors as error:
+            if getattr(error, 'errno', None) != errno.ENOENT and os.path.isfile(path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def store(self, key, dump_func):
+        """Write a cache entry and evict others if the cache is too big
+
+        Args:
+            key (str): key of the entry
+            dump_func (function): called with a file object opened for binary
+                writing to which it serializes the entry
+        """
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+        path = self.get_path(key)
+        tmp_fd, tmp_path = tempfile.mkstemp(prefix='.' + key, dir=self.cache_dir)
+        try:
+            with os.fdopen(tmp_fd, 'wb') as tmp_fp:
+                dump_func(tmp_fp)
+            os.rename(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        if self.max_bytes is not None:
+            if self._cache_bytes is not None:
+                self._cache_bytes += os.path.getsize(path)
+            if self._cache_bytes is None or self._cache_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes
+        """
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(self.suffix) or file_name.startswith('.'):
+                continue
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        cache_bytes = sum([entry[1] for entry in entries])
+        for _, size, path in sorted(entries):
+            if self.max_bytes is None or cache_bytes <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            cache_bytes -= size
+        self._cache_bytes = cache_bytes
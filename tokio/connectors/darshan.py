@@ -7,20 +7,59 @@ parsing library (like darshan-ruby does).
 
 import os
 import re
-import sys
+import gzip
 import json
-import errno
-import warnings
-import subprocess
+import array
+import itertools
+import mimetypes
+import collections
+import numpy
+import pandas
+import tokio.config
 from tokio.connectors.common import SubprocessOutputDict
+from tokio.connectors._darshan import ModuleAccumulator, AGGREGATED_MODULES, \
+                                      ParsedLogCache, pack_counters, unpack_counters
 
 DARSHAN_PARSER_BIN = 'darshan-parser'
 
+# ParsedLogCache objects shared by all Darshan objects, keyed by directory
+_PARSED_CACHES = {}
+
 class Darshan(SubprocessOutputDict):
-    def __init__(self, log_file=None, *args, **kwargs):
+    def __init__(self, log_file=None, columnar=False, modules=None, counters=None,
+                 parsed_cache_dir=None, *args, **kwargs):
+        """Initialize a Darshan log parser
+
+        Args:
+            log_file (str): path to a Darshan log to be parsed by darshan-parser
+            columnar (bool): store base counters in per-module ModuleRecords
+                objects under self.records instead of as nested dicts under
+                self['counters']
+            modules (list of str): only retain counters from these modules
+                (e.g., ``['posix', 'lustre']``); None retains all modules
+            counters (list of str): only retain base and total counters with
+                these names, given without their module prefix (e.g.,
+                ``['BYTES_READ', 'OST_ID_*']``).  ``*`` matches any part of a
+                counter name.  None retains all counters.
+            parsed_cache_dir (str): directory in which parsed logs are cached
+                so that darshan-parser only runs once for each log.  Defaults
+                to tokio.config.DARSHAN_PARSED_CACHE_DIR; an empty string
+                disables the cache.
+        """
         super(Darshan,self).__init__(*args, **kwargs)
         self.log_file = log_file
+        self.columnar = columnar
+        if modules is None:
+            self.select_modules = None
+        else:
+            self.select_modules = set([_normalize_module(x) for x in modules])
+        self.select_counters = counters
+        self.records = {}
         self._parser_mode = None
+        self._derive = ()
+        if parsed_cache_dir is None:
+            parsed_cache_dir = getattr(tokio.config, 'DARSHAN_PARSED_CACHE_DIR', None)
+        self.parsed_cache = _get_parsed_cache(parsed_cache_dir)
         self.subprocess_cmd = [DARSHAN_PARSER_BIN]
         if log_file is None:
             self.load()
@@ -36,8 +75,30 @@ class Darshan(SubprocessOutputDict):
         elif self.log_file is None:
             raise Exception("parameters should be provided (at least log_file or cache_file)")
     
-    def darshan_parser_base(self):
+    def darshan_parser_base(self, total=False, perf=False):
+        """Populate base counters and optionally derive total and perf counters
+
+        Args:
+            total (bool): also calculate the counters that darshan-parser
+                --total would produce from the base counters
+            perf (bool): also calculate the estimates that darshan-parser
+                --perf would produce from the base counters
+        """
         self._parser_mode = "BASE"
+        self._derive = tuple([key for key, val in (('total', total), ('perf', perf)) if val])
+        try:
+            return self._darshan_parser()
+        finally:
+            self._derive = ()
+
+    def load_header(self):
+        """Populate only the header and mount table
+
+        Stops reading the output of darshan-parser and terminates it as soon as
+        the first module's counters begin, so the cost of loading a header does
+        not depend on the number of records in the log.
+        """
+        self._parser_mode = "HEADER"
         return self._darshan_parser()
 
     def darshan_parser_total(self):
@@ -57,32 +118,182 @@ class Darshan(SubprocessOutputDict):
 
         if self._parser_mode in ["BASE", "TOTAL", "PERF"]:
             darshan_flag = "--" + self._parser_mode.lower()
+        elif self._parser_mode == "HEADER":
+            darshan_flag = "--base"
         else:
             self._parser_mode = "BASE"
             darshan_flag = ""
 
         args = [darshan_flag, self.log_file]
 
-        self._load_subprocess(*args)
+        if self.parsed_cache is None:
+            self._load_parser_output(args)
+            return self
+
+        key = self.parsed_cache.get_key(self.log_file, self._get_cache_params())
+        arrays = None if key is None else self.parsed_cache.get(key)
+        if arrays is not None:
+            if 'counters.modules' in arrays:
+                counters = unpack_counters(arrays, 'counters')
+            else:
+                counters = None
+            self._merge_parsed(json.loads(arrays['sections'].item()),
+                               counters,
+                               _unpack_records(arrays))
+            return self
+
+        # parse into an empty object so that only this parser mode's output
+        # is cached, then merge it into self
+        parsed = Darshan(log_file=self.log_file,
+                         columnar=self.columnar,
+                         modules=self.select_modules,
+                         counters=self.select_counters,
+                         parsed_cache_dir='',
+                         silent_errors=self.silent_errors)
+        parsed.subprocess_cmd = self.subprocess_cmd
+        parsed._parser_mode = self._parser_mode
+        parsed._derive = self._derive
+        complete = parsed._load_parser_output(args)
+        self.subprocess_returncode = parsed.subprocess_returncode
+
+        counters = parsed.pop('counters', None)
+        if key is not None and complete:
+            try:
+                sections = json.dumps(parsed)
+            except UnicodeDecodeError:
+                # header contains bytes that cannot be represented in json
+                sections = None
+            if sections is not None:
+                arrays = _pack_records(parsed.records)
+                if counters is not None:
+                    arrays.update(pack_counters(counters, 'counters'))
+                arrays['sections'] = numpy.array(sections)
+                self.parsed_cache.put(key, arrays)
+        self._merge_parsed(parsed, counters, parsed.records)
 
         return self
 
-    def load_str(self, input_str):
+    def _load_parser_output(self, args):
+        """Run darshan-parser and parse its output
+
+        When only loading the header, darshan-parser is terminated once its
+        output reaches the first module's counters.
+
+        Args:
+            args (list of str): arguments to pass to darshan-parser
+
+        Returns:
+            bool: True if all of the output required by the parser mode was
+            read from a darshan-parser that did not fail
+        """
+        self.subprocess_returncode = None
+        lines = self._iterate_subprocess(*args)
+        try:
+            if self._parser_mode == "HEADER":
+                self.load_lines(itertools.takewhile(
+                    lambda line: not line.startswith("# *****"), lines))
+                # darshan-parser is still running only if the counters were found
+                return self.subprocess_returncode is None and 'header' in self
+            self.load_lines(lines)
+            return self.subprocess_returncode == 0
+        finally:
+            lines.close()
+
+    def _get_cache_params(self):
+        """Return the parameters that affect the parsed form of the log
+        """
+        return {
+            'cmd': self.subprocess_cmd,
+            'mode': self._parser_mode,
+            'derive': sorted(self._derive),
+            'columnar': self.columnar,
+            'modules': None if self.select_modules is None else sorted(self.select_modules),
+            'counters': None if self.select_counters is None else sorted(self.select_counters),
+        }
+
+    def _merge_parsed(self, sections, counters, records):
+        """Merge the output of a single parse into self
+
+        Args:
+            sections (dict): header, mounts, and any other parsed sections
+                except counters
+            counters (dict): counters keyed by module, file name, and rank, or
+                None if the parsed output contained no counters section
+            records (dict): ModuleRecords keyed by module
+        """
+        for section, section_data in sections.iteritems():
+            if section not in self:
+                self[section] = {}
+            self[section].update(section_data)
+
+        if counters is not None:
+            if 'counters' not in self:
+                self['counters'] = {}
+            for module, module_data in counters.iteritems():
+                if module not in self['counters']:
+                    self['counters'][module] = {}
+                for file_name, file_data in module_data.iteritems():
+                    if file_name in self['counters'][module]:
+                        self['counters'][module][file_name].update(file_data)
+                    else:
+                        self['counters'][module][file_name] = file_data
+
+        self.records.update(records)
+
+    def load_cache(self):
         """Load from either a json cache or the output of darshan-parser
+
+        Streams the cache file through the parser rather than reading it into
+        memory first.
         """
-        loaded_data = None
+        _, encoding = mimetypes.guess_type(self.cache_file)
+        if encoding == 'gzip':
+            input_fp = gzip.open(self.cache_file, 'r')
+        else:
+            input_fp = open(self.cache_file, 'r')
         try:
-            loaded_data = json.loads(input_str)
-        except ValueError:
-            pass
+            self.load_lines(input_fp)
+        finally:
+            input_fp.close()
+
+    def load_str(self, input_str):
+        """Load from either a json cache or the output of darshan-parser
+        """
+        self.load_lines(input_str.splitlines())
+
+    def load_lines(self, lines):
+        """Load from an iterable of lines of json or darshan-parser output
 
-        if loaded_data:
-            self.__setitem__(loaded_data)
+        Only the first non-blank line is inspected to determine whether the
+        input is json; darshan-parser output is then parsed incrementally so
+        that lines can come directly from a pipe or file without ever holding
+        the full text in memory.
+
+        Args:
+            lines: iterable of str containing either a json cache or the output
+                of darshan-parser
+        """
+        lines = iter(lines)
+        sniffed = []
+        for line in lines:
+            sniffed.append(line)
+            if line.strip():
+                break
+
+        if sniffed and sniffed[-1].lstrip()[:1] == '{':
+            loaded_data = json.loads(''.join(sniffed) + ''.join(lines))
+            if not isinstance(loaded_data, dict):
+                raise TypeError("json input must be a dict, not %s" % type(loaded_data))
+            self.update(loaded_data)
         else:
-            self._parse_darshan_parser(input_str)
+            self._parse_darshan_parser(itertools.chain(sniffed, lines))
 
-    def _parse_darshan_parser(self, output_str):
+    def _parse_darshan_parser(self, lines):
         """Load values from output of darshan-parser
+
+        Args:
+            lines: either a str containing the full output of darshan-parser or
+                an iterable that yields it one line at a time
         """
         def is_valid_counter(counter):
             """
@@ -144,10 +355,26 @@ class Darshan(SubprocessOutputDict):
         section = None
         counter = None
         module_section = None
+        skip_module = False
+        accumulators = {}
         # This regex must match every possible module name
         module_rex = re.compile('^# ([A-Z\-0-9/]+) module data\s*$')
+        # Match only the lines containing selected counters so that others can
+        # be skipped before they are split or converted
+        counter_rex = None
+        if self.select_counters is not None and self._parser_mode in ("BASE", "TOTAL"):
+            counter_names = '|'.join([re.escape(x).replace('\\*', '[^\t:]*')
+                                      for x in self.select_counters])
+            if self._parser_mode == "BASE":
+                counter_rex = re.compile('[^\t]*\t[^\t]*\t[^\t]*\t[^\t_]+_(?:%s)\t' % counter_names)
+            else:
+                counter_rex = re.compile('total_[^_:]+_(?:%s):' % counter_names)
  
-        for line in output_str.splitlines():
+        if isinstance(lines, basestring):
+            lines = lines.splitlines()
+
+        for line in lines:
+            line = line.rstrip('\r\n')
             # Is this the start of a new section?
             # Why do we look at section, refactorize failed 
             if section is None and line.startswith("# darshan log version:"):
@@ -182,6 +409,14 @@ class Darshan(SubprocessOutputDict):
                     self[section][key] = val
 
             elif section == 'counters':
+                if skip_module or counter_rex is not None:
+                    if line.startswith('#'):
+                        # keep looking for the next module's section
+                        if skip_module and module_rex.match(line) is None:
+                            continue
+                    elif skip_module or counter_rex.match(line) is None:
+                        continue
+
                 if self._parser_mode == "BASE":
                     module, rank, record_id, counter, value, file_name, mount_pt, fs_type = self._parse_base_counters(line)
                     if module_section is not None:
@@ -205,8 +440,42 @@ class Darshan(SubprocessOutputDict):
             valid, new_module_section = is_valid_counter(counter)
             if new_module_section is not None:
                 module_section = new_module_section
+                skip_module = self.select_modules is not None \
+                              and _normalize_module(module_section) not in self.select_modules
+                if section == 'counters' and counter_rex is not None and not skip_module:
+                    # ensure selected modules appear even if none of their
+                    # counters were selected
+                    module = module_section.lower()
+                    if self.columnar and self._parser_mode == "BASE":
+                        if module not in self.records:
+                            self.records[module] = ModuleRecords()
+                    elif module not in self[section]:
+                        self[section][module] = {}
             if valid is False:
                     continue
+            if self._derive and self._parser_mode == "BASE":
+                module = module_section.lower()
+                if module in AGGREGATED_MODULES and counter.startswith(counter_prefix):
+                    accumulator = accumulators.get(module)
+                    if accumulator is None:
+                        accumulator = ModuleAccumulator()
+                        accumulators[module] = accumulator
+                    accumulator.add((rank, record_id), counter[len(counter_prefix):], value)
+            if self.columnar and self._parser_mode == "BASE":
+                if not counter.startswith(counter_prefix):
+                    raise Exception("counter %s does not start with prefix %s" % (counter, counter_prefix))
+                module = module_section.lower()
+                records = self.records.get(module)
+                if records is None:
+                    records = ModuleRecords()
+                    self.records[module] = records
+                records.append(file_name=file_name,
+                               rank=rank,
+                               mount_pt=mount_pt,
+                               fs_type=fs_type,
+                               counter=counter[len(counter_prefix):],
+                               value=value)
+                continue
             # Reminder: section is already defined as the global parser state
             insert_record(section=section,
                           module=module_section,
@@ -215,6 +484,14 @@ class Darshan(SubprocessOutputDict):
                           counter=counter,
                           value=value,
                           counter_prefix=counter_prefix)
+
+        for module, accumulator in accumulators.iteritems():
+            if module not in self['counters']:
+                self['counters'][module] = {}
+            if 'total' in self._derive:
+                self['counters'][module]['_total'] = accumulator.get_total()
+            if 'perf' in self._derive:
+                self['counters'][module]['_perf'] = accumulator.get_perf()
         return self
 
     def _parse_header(self, line):
@@ -313,5 +590,335 @@ class Darshan(SubprocessOutputDict):
 
         return key.strip(), value.strip()
 
+def _get_parsed_cache(cache_dir):
+    """Return the ParsedLogCache for a directory
+
+    Args:
+        cache_dir (str): directory containing parsed log cache entries
+
+    Returns:
+        ParsedLogCache: cache shared by all Darshan objects using cache_dir, or
+        None if cache_dir is empty
+    """
+    if not cache_dir:
+        return None
+    cache_dir = os.path.abspath(cache_dir)
+    parsed_cache = _PARSED_CACHES.get(cache_dir)
+    if parsed_cache is None:
+        parsed_cache = ParsedLogCache(
+            cache_dir,
+            max_bytes=getattr(tokio.config, 'DARSHAN_PARSED_CACHE_BYTES', None))
+        _PARSED_CACHES[cache_dir] = parsed_cache
+    return parsed_cache
+
+def _pack_records(records):
+    """Convert ModuleRecords into numpy arrays for ParsedLogCache.put
+    """
+    arrays = {'records.modules': numpy.array(sorted(records.keys()), dtype=str)}
+    for module, module_records in records.iteritems():
+        for name, values in module_records.to_arrays().iteritems():
+            arrays['records.%s.%s' % (module, name)] = values
+    return arrays
+
+def _unpack_records(arrays):
+    """Convert numpy arrays created by _pack_records back into ModuleRecords
+    """
+    records = {}
+    for module in arrays['records.modules'].tolist():
+        module_prefix = 'records.%s.' % module
+        records[module] = ModuleRecords.from_arrays(
+            dict((name[len(module_prefix):], values)
+                 for name, values in arrays.iteritems()
+                 if name.startswith(module_prefix)))
+    return records
+
+def _normalize_module(module):
+    """Convert a module name into the form used as a key in Darshan['counters']
+
+    Args:
+        module (str): module name as it appears in darshan-parser output (e.g.,
+            ``MPI-IO``) or in Darshan['counters'] (e.g., ``mpiio``)
+
+    Returns:
+        str: normalized module name
+    """
+    return module.replace('-', '').replace('/', '').lower()
+
+class ModuleRecords(collections.Mapping):
+    """Columnar store of the base counters of a single Darshan module
+
+    Each (file name, rank) record occupies one row.  File names and mount
+    points are stored once and referenced by integer ids, and each counter is
+    stored as its own numpy array.  This object also behaves as a read-only
+    mapping of ``{file_name: {rank: {counter: value}}}`` so that it can stand in
+    for the nested dicts of ``Darshan['counters'][module]``.
+
+    Counters that are absent from a record are stored as zero.
+    """
+    def __init__(self):
+        self.file_names = []
+        self.mount_pts = []
+        self.fs_types = []
+        self._file_ids = {}
+        self._mount_ids = {}
+        self._row_ids = {}
+        self._last_row = (None, None)
+        # columns being appended to as array.array; None once materialized
+        self._builders = {
+            'file_id': array.array('l'),
+            'rank': array.array('l'),
+            'mount_id': array.array('l'),
+        }
+        self._counter_builders = {}
+        # columns as numpy arrays; None while being appended to
+        self._arrays = None
+        self._counter_arrays = None
+
+    def append(self, file_name, rank, mount_pt, fs_type, counter, value):
+        """Insert a single counter value
+
+        Args:
+            file_name (str): name of the file to which the counter belongs
+            rank (str or int): MPI rank to which the counter belongs
+            mount_pt (str): mount point of file_name
+            fs_type (str): file system type of mount_pt
+            counter (str): name of the counter without its module prefix
+            value (str): value of the counter as printed by darshan-parser
+        """
+        if self._builders is None:
+            self._thaw()
 
-        
+        key = (file_name, rank)
+        if self._last_row[0] == key:
+            row = self._last_row[1]
+        else:
+            row = self._row_ids.get(key)
+            if row is None:
+                row = self._add_row(file_name, rank, mount_pt, fs_type)
+            self._last_row = (key, row)
+
+        column = self._counter_builders.get(counter)
+        if column is None:
+            column = array.array('d' if '.' in value else 'l')
+            self._counter_builders[counter] = column
+
+        if column.typecode == 'd':
+            value = float(value)
+        else:
+            value = long(value)
+
+        num_missing = row - len(column)
+        if num_missing >= 0:
+            if num_missing:
+                column.fromlist([0] * num_missing)
+            column.append(value)
+        else:
+            column[row] = value
+
+    def to_arrays(self):
+        """Return the contents of this object as numpy arrays
+
+        Returns:
+            dict: numpy arrays keyed by name that can be passed to from_arrays
+        """
+        arrays = {
+            'file_names': numpy.array(self.file_names, dtype=str),
+            'mount_pts': numpy.array(self.mount_pts, dtype=str),
+            'fs_types': numpy.array(self.fs_types, dtype=str),
+            'file_id': self.file_ids,
+            'rank': self.ranks,
+            'mount_id': self.mount_ids,
+        }
+        for counter, values in self.counters.iteritems():
+            arrays['counter.' + counter] = values
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Create a ModuleRecords from the output of to_arrays
+
+        Args:
+            arrays (dict): numpy arrays keyed by name
+
+        Returns:
+            ModuleRecords: object containing the records described by arrays
+        """
+        records = cls()
+        records.file_names = arrays['file_names'].tolist()
+        records.mount_pts = arrays['mount_pts'].tolist()
+        records.fs_types = arrays['fs_types'].tolist()
+        records._file_ids = dict((name, index) for index, name in enumerate(records.file_names))
+        records._mount_ids = dict((name, index) for index, name in enumerate(records.mount_pts))
+        records._arrays = dict((name, arrays[name]) for name in ('file_id', 'rank', 'mount_id'))
+        records._counter_arrays = dict((name[len('counter.'):], values)
+                                       for name, values in arrays.iteritems()
+                                       if name.startswith('counter.'))
+        records._builders = None
+        records._counter_builders = None
+        for row, (file_id, rank) in enumerate(zip(arrays['file_id'].tolist(),
+                                                  arrays['rank'].tolist())):
+            records._row_ids[(records.file_names[file_id], str(rank))] = row
+        return records
+
+    def _add_row(self, file_name, rank, mount_pt, fs_type):
+        """Add a new (file_name, rank) record and return its row index
+        """
+        file_id = self._file_ids.get(file_name)
+        if file_id is None:
+            file_id = len(self.file_names)
+            self._file_ids[file_name] = file_id
+            self.file_names.append(file_name)
+
+        mount_id = self._mount_ids.get(mount_pt)
+        if mount_id is None:
+            mount_id = len(self.mount_pts)
+            self._mount_ids[mount_pt] = mount_id
+            self.mount_pts.append(mount_pt)
+            self.fs_types.append(fs_type)
+
+        row = len(self._builders['rank'])
+        self._builders['file_id'].append(file_id)
+        self._builders['rank'].append(int(rank))
+        self._builders['mount_id'].append(mount_id)
+        self._row_ids[(file_name, rank)] = row
+        return row
+
+    def __getstate__(self):
+        """Pickle columns as numpy arrays rather than as array.array builders
+        """
+        self._materialize()
+        return self.__dict__
+
+    def _materialize(self):
+        """Convert columns being appended to into numpy arrays
+        """
+        if self._builders is None:
+            return
+
+        num_rows = len(self._builders['rank'])
+        self._arrays = {}
+        for name, column in self._builders.iteritems():
+            self._arrays[name] = numpy.frombuffer(column, dtype=column.typecode).copy()
+
+        self._counter_arrays = {}
+        for name, column in self._counter_builders.iteritems():
+            values = numpy.zeros(num_rows, dtype=column.typecode)
+            values[:len(column)] = numpy.frombuffer(column, dtype=column.typecode)
+            self._counter_arrays[name] = values
+
+        self._builders = None
+        self._counter_builders = None
+
+    def _thaw(self):
+        """Convert numpy arrays back into columns that can be appended to
+        """
+        self._builders = {}
+        for name, values in self._arrays.iteritems():
+            self._builders[name] = array.array(values.dtype.char, values.tostring())
+
+        self._counter_builders = {}
+        for name, values in self._counter_arrays.iteritems():
+            self._counter_builders[name] = array.array(values.dtype.char, values.tostring())
+
+        self._arrays = None
+        self._counter_arrays = None
+
+    @property
+    def num_records(self):
+        """Number of (file name, rank) records stored"""
+        return len(self._row_ids)
+
+    @property
+    def file_ids(self):
+        """numpy.ndarray of indices into self.file_names for each record"""
+        self._materialize()
+        return self._arrays['file_id']
+
+    @property
+    def ranks(self):
+        """numpy.ndarray of the rank of each record"""
+        self._materialize()
+        return self._arrays['rank']
+
+    @property
+    def mount_ids(self):
+        """numpy.ndarray of indices into self.mount_pts for each record"""
+        self._materialize()
+        return self._arrays['mount_id']
+
+    @property
+    def counters(self):
+        """dict of numpy.ndarray keyed by counter name"""
+        self._materialize()
+        return self._counter_arrays
+
+    def to_dataframe(self):
+        """Present records as a DataFrame
+
+        Returns:
+            pandas.DataFrame: one row per record with file_name, rank, and
+            mount_pt columns followed by one column per counter
+        """
+        counters = self.counters
+        dataframe = pandas.DataFrame(counters, columns=sorted(counters.keys()))
+        dataframe.insert(0, 'file_name',
+                         pandas.Categorical.from_codes(self.file_ids, self.file_names))
+        dataframe.insert(1, 'rank', self.ranks)
+        dataframe.insert(2, 'mount_pt',
+                         pandas.Categorical.from_codes(self.mount_ids, self.mount_pts))
+        return dataframe
+
+    def _get_ranks(self, rows):
+        """Build the nested {rank: {counter: value}} dict for a set of rows
+        """
+        counters = self.counters
+        ranks = self.ranks
+        result = {}
+        for row in rows:
+            result[str(ranks[row])] = dict((name, values[row].item())
+                                           for name, values in counters.iteritems())
+        return result
+
+    def __getitem__(self, file_name):
+        file_id = self._file_ids[file_name]
+        return self._get_ranks(numpy.flatnonzero(self.file_ids == file_id))
+
+    def __iter__(self):
+        return iter(self.file_names)
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def __contains__(self, file_name):
+        return file_name in self._file_ids
+
+    def iteritems(self):
+        """Iterate over (file_name, {rank: {counter: value}}) pairs
+
+        Groups all records in a single pass rather than searching for each
+        file name's records separately.
+        """
+        file_ids = self.file_ids
+        order = numpy.argsort(file_ids, kind='mergesort')
+        bounds = numpy.flatnonzero(numpy.diff(file_ids[order])) + 1
+        for rows in numpy.split(order, bounds):
+            if len(rows):
+                yield self.file_names[file_ids[rows[0]]], self._get_ranks(rows)
+
+    def itervalues(self):
+        for _, value in self.iteritems():
+            yield value
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def to_dict(self):
+        """Convert records into the nested dicts used by Darshan['counters']
+
+        Returns:
+            dict: keyed by file name, then rank (as a str), then counter name
+        """
+        return dict(self.iteritems())
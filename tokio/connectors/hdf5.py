@@ -6,11 +6,18 @@ schemas.  Also supports dynamically mapping static HDF5 datasets into new
 derived datasets dynamically.
 """
 
-import math
+import os
+import re
 import datetime
 import h5py
 import numpy
 import pandas
+import tokio.instrument
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 from tokio.connectors._hdf5 import convert_counts_rates, map_dataset, demux_column
 
 SCHEMA = {
@@ -550,6 +557,13 @@ H5LMT_COLUMN_ATTRS = {
     'OSSCPUGroup/OSSCPUDataSet': 'OSSNames',
 }
 
+# Per-column statistics maintained by TimeSeries.commit_dataset() in dataset.attrs
+STATS_KEYS = ('sum', 'min', 'max', 'count', 'missing')
+STATS_ATTR_FMT = 'stats_%s'
+
+# Number of elements to convert into each Arrow record batch by default
+ARROW_BATCH_ELEMENTS = 2**20
+
 TIMESTAMP_KEY = 'timestamps'
 DEFAULT_TIMESTAMP_DATASET = 'timestamps' # this CANNOT be an absolute location
 COLUMN_NAME_KEY = 'columns'
@@ -734,6 +748,77 @@ class Hdf5(h5py.File):
         else:
             return result
 
+    def get_stats(self, dataset_name):
+        """Get summary statistics for each column and the whole dataset
+
+        Returns the statistics that TimeSeries.commit_dataset() stores in each
+        dataset's attributes without reading the dataset itself.  Datasets
+        without stored statistics (or whose values are derived from another
+        dataset on read) are scanned instead.
+
+        Args:
+            dataset_name (str): name of dataset whose statistics should be returned
+
+        Returns:
+            dict with keys columns, sum, min, max, count, and missing.  All but
+            columns are numpy.ndarray with one element per column, where count
+            is the number of valid (non-missing) elements and min/max are NaN
+            for columns without valid elements.  The 'total' key contains a
+            dict with the same statistics reduced over the whole dataset.
+        """
+        dataset = self.__getitem__(dataset_name)
+        if COLUMN_NAME_KEY in dataset.attrs:
+            columns = dataset.attrs[COLUMN_NAME_KEY]
+        else:
+            columns = self.get_columns(dataset_name)
+        if isinstance(dataset, h5py.Dataset) \
+        and getattr(dataset, 'map_function', None) is None \
+        and not getattr(dataset, 'transpose', False) \
+        and all([STATS_ATTR_FMT % key in dataset.attrs for key in STATS_KEYS]):
+            stats = {}
+            for key in STATS_KEYS:
+                stats[key] = dataset.attrs[STATS_ATTR_FMT % key]
+        else:
+            values = dataset[:]
+            if len(values.shape) == 1:
+                values = values.reshape((values.shape[0], 1))
+            stats = column_stats(values)
+
+        stats['columns'] = columns
+        stats['total'] = {
+            'sum': stats['sum'].sum(),
+            'min': numpy.nanmin(stats['min']) if stats['count'].sum() else numpy.nan,
+            'max': numpy.nanmax(stats['max']) if stats['count'].sum() else numpy.nan,
+            'count': stats['count'].sum(),
+            'missing': stats['missing'].sum(),
+        }
+        return stats
+
+    def to_record_batches(self, dataset_name, batch_rows=None):
+        """Convert a dataset into a stream of Arrow record batches
+
+        Args:
+            dataset_name (str): dataset name to convert
+            batch_rows (int): number of rows per record batch
+
+        Returns:
+            Generator that yields pyarrow.RecordBatch objects
+        """
+        return to_record_batches(self, dataset_name, batch_rows=batch_rows)
+
+    def to_parquet(self, dataset_name, output_dir, **kwargs):
+        """Write a dataset out as Parquet files partitioned by day
+
+        Args:
+            dataset_name (str): dataset name to export
+            output_dir (str): directory under which partitions will be created
+            kwargs: arguments passed to connectors.hdf5.to_parquet
+
+        Returns:
+            list of Parquet files that were written
+        """
+        return to_parquet(self, dataset_name, output_dir, **kwargs)
+
     def to_dataframe(self, dataset_name):
         """Convert a dataset into a dataframe
 
@@ -745,9 +830,13 @@ class Hdf5(h5py.File):
             timestamps, columns labeled appropriately, and values from the
             dataset
         """
-        if self.version is None:
-            return self._to_dataframe_h5lmt(dataset_name)
-        return self._to_dataframe(dataset_name)
+        with tokio.instrument.span('hdf5.to_dataframe'):
+            if self.version is None:
+                dataframe = self._to_dataframe_h5lmt(dataset_name)
+            else:
+                dataframe = self._to_dataframe(dataset_name)
+        tokio.instrument.count('hdf5.bytes_read', int(dataframe.memory_usage(index=False).sum()))
+        return dataframe
 
     def _to_dataframe(self, dataset_name):
         """Convert a dataset into a dataframe via TOKIO HDF5 schema
@@ -849,12 +938,192 @@ def missing_values(dataset, inverse=False):
         numpy.ndarray of numpy.int8 of 1 and 0 to indicate the presence or
             absence of specific elements
     """
-    zero = numpy.int8(0)
-    one = numpy.int8(1)
+    values = numpy.asarray(dataset)
+    missing = (values == 0.0) & numpy.signbit(values)
     if inverse:
-        converter = numpy.vectorize(lambda x:
-                                    zero if (x == 0.0 and math.copysign(1, x) < 0.0) else one)
-    else:
-        converter = numpy.vectorize(lambda x:
-                                    one if (x == 0.0 and math.copysign(1, x) < 0.0) else zero)
-    return converter(dataset)
+        missing = ~missing
+    return missing.astype(numpy.int8)
+
+def column_stats(values):
+    """Calculate the summary statistics of each column of a 2d array
+
+    Missing values (-0.0) are excluded from min and max.
+
+    Args:
+        values (numpy.ndarray): 2d array of values
+
+    Returns:
+        dict keyed by each element of STATS_KEYS whose values are
+        numpy.ndarray with one element per column
+    """
+    missing = missing_values(values).astype(bool)
+    count = (~missing).sum(axis=0)
+    with numpy.errstate(invalid='ignore'):
+        mins = numpy.where(missing, numpy.inf, values).min(axis=0)
+        maxes = numpy.where(missing, -numpy.inf, values).max(axis=0)
+    mins[count == 0] = numpy.nan
+    maxes[count == 0] = numpy.nan
+    return {
+        'sum': values.sum(axis=0),
+        'min': mins,
+        'max': maxes,
+        'count': count,
+        'missing': missing.sum(axis=0),
+    }
+
+def get_arrow_schema(hdf5_file, dataset_name):
+    """Build the Arrow schema corresponding to a dataset
+
+    The schema contains a timestamp field followed by one float64 field per
+    dataset column.  Missing values are encoded as nulls, and the dataset's
+    name, source file, timestep, and attributes are stored as schema metadata.
+
+    Args:
+        hdf5_file (Hdf5): file containing the dataset
+        dataset_name (str): name of dataset
+
+    Returns:
+        pyarrow.Schema describing the record batches generated by
+        to_record_batches
+    """
+    if pyarrow is None:
+        raise ImportError("pyarrow is required to export to Arrow or Parquet")
+
+    dataset = hdf5_file[dataset_name]
+    num_columns = 1 if len(dataset[0:1].shape) == 1 else dataset[0:1].shape[1]
+    columns = [str(column) for column in hdf5_file.get_columns(dataset_name)]
+    if len(columns) < num_columns:
+        columns += ['_unknown%04d' % index for index in range(len(columns), num_columns)]
+
+    metadata = {
+        'dataset_name': dataset_name,
+        'file_name': os.path.basename(hdf5_file.filename),
+        'version': str(hdf5_file.version),
+        'timestep': str(hdf5_file.get_timestep(dataset_name)),
+    }
+    for key, value in dataset.attrs.iteritems():
+        if key != COLUMN_NAME_KEY and isinstance(value, (basestring, int, long, float)):
+            metadata['attr_%s' % key] = str(value)
+
+    fields = [pyarrow.field('timestamp', pyarrow.timestamp('s'), nullable=False)]
+    fields += [pyarrow.field(column, pyarrow.float64()) for column in columns[:num_columns]]
+    return pyarrow.schema(fields, metadata=metadata)
+
+def to_record_batches(hdf5_file, dataset_name, batch_rows=None):
+    """Convert a dataset into a stream of Arrow record batches
+
+    Reads the dataset one block of rows at a time.  Each block is transposed
+    once so that every column is contiguous, which lets Arrow wrap column
+    values without copying them again; missing values (-0.0) become nulls.
+
+    Args:
+        hdf5_file (Hdf5): file containing the dataset
+        dataset_name (str): name of dataset to convert
+        batch_rows (int): number of rows per record batch.  Defaults to a whole
+            number of HDF5 chunks containing about ARROW_BATCH_ELEMENTS values.
+
+    Yields:
+        pyarrow.RecordBatch objects conforming to get_arrow_schema()
+    """
+    for _, batch in _iterate_record_batches(hdf5_file, dataset_name, batch_rows):
+        yield batch
+
+def _iterate_record_batches(hdf5_file, dataset_name, batch_rows=None):
+    """
+    Generator that yields tuples of (timestamps, pyarrow.RecordBatch) where
+    timestamps are the epoch seconds of the rows in the record batch
+    """
+    schema = get_arrow_schema(hdf5_file, dataset_name)
+    dataset = hdf5_file[dataset_name]
+    timestamps = hdf5_file.get_timestamps(dataset_name)
+    num_columns = len(schema) - 1
+    num_rows = timestamps.shape[0]
+
+    if getattr(dataset, 'transpose', False) or getattr(dataset, 'force2d', False):
+        # these MappedDatasets load the whole dataset on every slice anyway
+        batch_rows = num_rows
+    elif batch_rows is None:
+        chunks = getattr(dataset, 'chunks', None)
+        chunk_rows = chunks[0] if chunks else 1
+        batch_rows = max(1, ARROW_BATCH_ELEMENTS // num_columns)
+        batch_rows = max(chunk_rows, (batch_rows // chunk_rows) * chunk_rows)
+
+    for index0 in range(0, num_rows, batch_rows):
+        values = dataset[index0:index0 + batch_rows]
+        if len(values.shape) == 1:
+            values = values.reshape((values.shape[0], 1))
+        values = numpy.ascontiguousarray(values.T, dtype='f8')
+        missing = numpy.ascontiguousarray(missing_values(values).astype(bool))
+        epochs = timestamps[index0:index0 + values.shape[1]].astype('i8')
+
+        arrays = [pyarrow.array(epochs.astype('datetime64[s]'), type=pyarrow.timestamp('s'))]
+        for column in range(num_columns):
+            arrays.append(pyarrow.array(values[column], mask=missing[column],
+                                        type=pyarrow.float64()))
+        yield epochs, pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _local_dates(epochs):
+    """
+    Convert an array of epoch seconds into an array of YYYY-MM-DD strings in
+    local time.  Only converts each distinct quarter hour once since every time
+    zone offset is a multiple of fifteen minutes.
+    """
+    quarters, inverse = numpy.unique(epochs // 900, return_inverse=True)
+    dates = [datetime.datetime.fromtimestamp(quarter * 900).strftime("%Y-%m-%d")
+             for quarter in quarters]
+    return numpy.array(dates)[inverse]
+
+def to_parquet(hdf5_file, dataset_name, output_dir, batch_rows=None, partition=True,
+               compression='snappy'):
+    """Write a dataset out as Parquet
+
+    Streams record batches from to_record_batches into Parquet files, one row
+    group per batch.  When partitioned, output files are laid out as
+    output_dir/date=YYYY-MM-DD/<dataset>.parquet so that query engines can
+    prune by date.
+
+    Args:
+        hdf5_file (Hdf5): file containing the dataset
+        dataset_name (str): name of dataset to export
+        output_dir (str): directory in which Parquet files should be written
+        batch_rows (int): number of rows per record batch/row group
+        partition (bool): partition output files by the day of each timestamp
+        compression (str): Parquet compression codec
+
+    Returns:
+        list of Parquet files that were written
+    """
+    schema = get_arrow_schema(hdf5_file, dataset_name)
+    base_name = re.sub(r'[^A-Za-z0-9_.-]', '_', dataset_name.strip('/')) + '.parquet'
+    writers = {}
+    output_files = []
+    try:
+        for epochs, batch in _iterate_record_batches(hdf5_file, dataset_name, batch_rows):
+            table = pyarrow.Table.from_batches([batch])
+            if partition:
+                # split the batch wherever the day changes
+                days = _local_dates(epochs)
+                boundaries = [0] + list(numpy.flatnonzero(days[1:] != days[:-1]) + 1) \
+                             + [len(days)]
+                pieces = [(days[start], table.slice(start, end - start))
+                          for start, end in zip(boundaries[:-1], boundaries[1:])]
+            else:
+                pieces = [(None, table)]
+
+            for day, piece in pieces:
+                if day not in writers:
+                    if day is None:
+                        output_file = os.path.join(output_dir, base_name)
+                    else:
+                        output_file = os.path.join(output_dir, 'date=%s' % day, base_name)
+                    if not os.path.isdir(os.path.dirname(output_file)):
+                        os.makedirs(os.path.dirname(output_file))
+                    writers[day] = pyarrow.parquet.ParquetWriter(output_file, schema,
+                                                                 compression=compression)
+                    output_files.append(output_file)
+                writers[day].write_table(piece)
+    finally:
+        for writer in writers.itervalues():
+            writer.close()
+
+    return output_files
@@ -136,13 +136,21 @@ LMTDB_TABLES = {
     },
 }
 
+### Data newer than this is neither recorded as cached in hybrid mode nor
+### memoized since LMT may still be inserting it into the remote database
+SETTLE_TIME = datetime.timedelta(minutes=1)
+
 class LmtDb(cachingdb.CachingDb):
     """
     Class to wrap the connection to an LMT MySQL database or SQLite database
     """
-    def __init__(self, dbhost=None, dbuser=None, dbpassword=None, dbname=None, cache_file=None):
+    def __init__(self, dbhost=None, dbuser=None, dbpassword=None, dbname=None, cache_file=None,
+                 hybrid=False):
         """
-        Initialize LmtDb with either a MySQL or SQLite backend
+        Initialize LmtDb with either a MySQL or SQLite backend.  If hybrid is
+        True and both are given, timeseries queries are answered by the SQLite
+        database and only the time ranges it does not yet contain are copied
+        into it from the MySQL database.
         """
         # Get database parameters
         if dbhost is None:
@@ -159,7 +167,28 @@ class LmtDb(cachingdb.CachingDb):
             dbuser=dbuser,
             dbpassword=dbpassword,
             dbname=dbname,
-            cache_file=cache_file)
+            cache_file=cache_file,
+            hybrid=hybrid)
+
+        # Rows of timeseries tables never change once they are inserted, so
+        # the results of timeseries queries over past time ranges can be
+        # memoized and persisted.  iterate_timeseries_data() never memoizes
+        # time ranges newer than SETTLE_TIME.
+        for lmtdb_table, table_schema in LMTDB_TABLES.iteritems():
+            if 'TS_ID' in table_schema['columns']:
+                self.memoized_tables.add(lmtdb_table)
+                self.persisted_tables.add(lmtdb_table)
+
+        # Refresh the time-independent tables so that the queries below and any
+        # JOINs against them can be answered by the cache db
+        if self.is_hybrid():
+            for lmtdb_table, table_schema in LMTDB_TABLES.iteritems():
+                if 'TS_ID' not in table_schema['columns']:
+                    self.fill_cache('SELECT %s FROM %s' % (', '.join(table_schema['columns']),
+                                                          lmtdb_table),
+                                    table=lmtdb_table,
+                                    table_schema=table_schema,
+                                    columns=table_schema['columns'])
 
         # The list of OST names is an immutable property of a database, so
         # fetch and cache it here.  Also maintain a mapping of OST_ID to
@@ -219,19 +248,59 @@ class LmtDb(cachingdb.CachingDb):
         This is an optimization to avoid the O(N*M) scaling of the JOINs in the
         underlying SQL query.
         """
+        result_columns = get_timeseries_columns(table)
+        results = []
+        for rows in self.iterate_timeseries_data(table, datetime_start, datetime_end,
+                                                 timechunk=timechunk,
+                                                 save_results=True,
+                                                 memoize=True):
+            results += rows
+
+        return results, result_columns
+
+    def iterate_timeseries_data(self, table, datetime_start, datetime_end,
+                                timechunk=datetime.timedelta(hours=1),
+                                batch_size=cachingdb.QUERY_BATCH_SIZE,
+                                save_results=False, memoize=False):
+        """Retrieve timeseries data a batch of rows at a time
+
+        Performs the same queries as get_timeseries_data() but yields rows as
+        they are fetched so that they can be processed and discarded without
+        ever holding the whole time range in memory.  In hybrid mode, any parts
+        of the time range not already in the cache db are first copied into it
+        from the remote database.
+
+        Args:
+            table (str): name of the LMT table to query
+            datetime_start (datetime.datetime): lower bound on time series data
+                to retrieve, inclusive
+            datetime_end (datetime.datetime): upper bound on time series data
+                to retrieve, exclusive
+            timechunk (datetime.timedelta): divide time range query into
+                sub-ranges of this width to work around N*N scaling of JOINs
+            batch_size (int): maximum number of rows to yield at once
+            save_results (bool): also retain rows in saved_results
+            memoize (bool): serve and keep the results of each time chunk that
+                ended more than SETTLE_TIME ago in the query result cache
+
+        Yields:
+            list: tuples of rows whose columns are given by
+            get_timeseries_columns(table)
+        """
         table_schema = LMTDB_TABLES.get(table.upper())
         if table_schema is None:
             raise KeyError("Table '%s' is not valid" % table)
-        else:
-            result_columns = ['TIMESTAMP'] + table_schema['columns']
         format_dict = {
-            'schema': ', '.join(result_columns).replace("TS_ID,", "TIMESTAMP_INFO.TS_ID,"),
+            'schema': ', '.join(get_timeseries_columns(table)).replace("TS_ID,", "TIMESTAMP_INFO.TS_ID,"),
             'table': table,
         }
 
-        index0 = len(self.saved_results.get(table, {'rows': []})['rows'])
+        if self.is_hybrid():
+            self.fill_timeseries_gaps(table, datetime_start, datetime_end, timechunk=timechunk,
+                                      batch_size=batch_size)
+
+        settled = datetime.datetime.now() - SETTLE_TIME
         chunk_start = datetime_start
-        ts_id_start, ts_id_end = self.get_ts_ids(datetime_start, datetime_end)
         while chunk_start < datetime_end:
             if timechunk is None:
                 chunk_end = datetime_end
@@ -251,11 +320,94 @@ class LmtDb(cachingdb.CachingDb):
                                TIMESTAMP_INFO.TIMESTAMP >= %%(ps)s
                                AND TIMESTAMP_INFO.TIMESTAMP < %%(ps)s
                            """ % format_dict
-            self.query(query_str, (start_stamp, end_stamp), table=table, table_schema=table_schema)
-            if timechunk is not None:
-                chunk_start += timechunk
+            for rows in self.iterate_query(query_str, (start_stamp, end_stamp),
+                                           table=table,
+                                           table_schema=table_schema,
+                                           batch_size=batch_size,
+                                           save_results=save_results,
+                                           memoize=memoize and chunk_end <= settled):
+                yield rows
+            if timechunk is None:
+                break
+            chunk_start += timechunk
 
-        return self.saved_results[table]['rows'][index0:], result_columns
+    def fill_timeseries_gaps(self, table, datetime_start, datetime_end,
+                             timechunk=datetime.timedelta(hours=1),
+                             batch_size=cachingdb.QUERY_BATCH_SIZE):
+        """Copy the parts of a time range missing from the cache db into it
+
+        The rows of table and TIMESTAMP_INFO in each time range the cache db
+        does not cover are copied from the remote database, and the time range
+        is then recorded as covered.  Time ranges newer than SETTLE_TIME
+        ago are copied but not recorded so that they are retrieved again once
+        the remote database is complete.
+
+        Args:
+            table (str): name of the LMT table to fill
+            datetime_start (datetime.datetime): lower bound of the time range,
+                inclusive
+            datetime_end (datetime.datetime): upper bound of the time range,
+                exclusive
+            timechunk (datetime.timedelta): divide each missing time range into
+                sub-ranges of this width to work around N*N scaling of JOINs
+            batch_size (int): maximum number of rows to copy at once
+
+        Returns:
+            int: number of rows of table copied into the cache db
+        """
+        table = table.upper()
+        table_schema = LMTDB_TABLES.get(table)
+        if table_schema is None:
+            raise KeyError("Table '%s' is not valid" % table)
+
+        columns = ['%s.%s' % (table, column) for column in table_schema['columns']]
+        data_query = """SELECT
+                            %s
+                        FROM
+                            %s
+                        INNER JOIN TIMESTAMP_INFO ON TIMESTAMP_INFO.TS_ID = %s.TS_ID
+                        WHERE
+                            TIMESTAMP_INFO.TIMESTAMP >= %%(ps)s
+                            AND TIMESTAMP_INFO.TIMESTAMP < %%(ps)s
+                        """ % (', '.join(columns), table, table)
+        timestamp_query = """SELECT
+                                 TS_ID, TIMESTAMP
+                             FROM
+                                 TIMESTAMP_INFO
+                             WHERE
+                                 TIMESTAMP >= %(ps)s
+                                 AND TIMESTAMP < %(ps)s
+                             """
+        settled = (datetime.datetime.now() - SETTLE_TIME).strftime("%Y-%m-%d %H:%M:%S")
+
+        num_rows = 0
+        for gap_start, gap_end in self.get_coverage_gaps(
+                table,
+                datetime_start.strftime("%Y-%m-%d %H:%M:%S"),
+                datetime_end.strftime("%Y-%m-%d %H:%M:%S")):
+            chunk_start = datetime.datetime.strptime(gap_start, "%Y-%m-%d %H:%M:%S")
+            gap_end = datetime.datetime.strptime(gap_end, "%Y-%m-%d %H:%M:%S")
+            while chunk_start < gap_end:
+                if timechunk is None or chunk_start + timechunk > gap_end:
+                    chunk_end = gap_end
+                else:
+                    chunk_end = chunk_start + timechunk
+                query_variables = (chunk_start.strftime("%Y-%m-%d %H:%M:%S"),
+                                   chunk_end.strftime("%Y-%m-%d %H:%M:%S"))
+                self.fill_cache(timestamp_query, query_variables,
+                                table='TIMESTAMP_INFO',
+                                table_schema=LMTDB_TABLES['TIMESTAMP_INFO'],
+                                columns=LMTDB_TABLES['TIMESTAMP_INFO']['columns'],
+                                batch_size=batch_size)
+                num_rows += self.fill_cache(data_query, query_variables,
+                                            table=table,
+                                            table_schema=table_schema,
+                                            columns=table_schema['columns'],
+                                            batch_size=batch_size)
+                self.add_coverage(table, query_variables[0], min(query_variables[1], settled))
+                chunk_start = chunk_end
+
+        return num_rows
 
     def get_mds_data(self, datetime_start, datetime_end, timechunk=datetime.timedelta(hours=1)):
         """Schema-agnostic method for retrieving MDS load data.
@@ -352,3 +504,18 @@ class LmtDb(cachingdb.CachingDb):
                                         datetime_start,
                                         datetime_end,
                                         timechunk=timechunk)
+
+def get_timeseries_columns(table):
+    """Return the columns of the rows returned by timeseries queries
+
+    Args:
+        table (str): name of the LMT table being queried
+
+    Returns:
+        list of str: column names of each row returned by
+        LmtDb.get_timeseries_data() and LmtDb.iterate_timeseries_data()
+    """
+    table_schema = LMTDB_TABLES.get(table.upper())
+    if table_schema is None:
+        raise KeyError("Table '%s' is not valid" % table)
+    return ['TIMESTAMP'] + table_schema['columns']
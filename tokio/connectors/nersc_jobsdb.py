@@ -53,12 +53,11 @@ class NerscJobsDb(cachingdb.CachingDb):
 
     The in-memory query caching is possible because the job data in the NERSC
     jobs database is immutable and can be cached indefinitely once it appears
-    there.  At any time the memory cache can be committed to a cache database to
-    be used or transported later.
+    there.  The query cache is the size-bounded result_cache provided by
+    CachingDb.  At any time the saved results can be committed to a cache
+    database to be used or transported later.
     """
     def __init__(self, dbhost=None, dbuser=None, dbpassword=None, dbname=None, cache_file=None):
-        # in-memory query cache
-        self.cached_queries = {}
         self.last_results = None # for debugging
 
         if dbhost is None:
@@ -77,12 +76,16 @@ class NerscJobsDb(cachingdb.CachingDb):
             dbname=dbname,
             cache_file=cache_file)
 
-    def drop_cache(self):
-        """
-        Clear the query cache
+        # in-memory query cache.  Queries over recent time windows still gain
+        # rows as running jobs complete, so results are not persisted to disk
+        # for use by later processes.
+        self.memoized_tables.add('summary')
+
+    @property
+    def cached_queries(self):
+        """Results held by the in-memory query cache, keyed by query
         """
-        super(NerscJobsDb, self).drop_cache()
-        self.cached_queries = {}
+        return self.result_cache.entries
 
     def get_concurrent_jobs(self, start_timestamp, end_timestamp, nersc_host):
         """
@@ -132,32 +135,15 @@ class NerscJobsDb(cachingdb.CachingDb):
     def query(self, query_str, query_variables=(), nocache=False):
         """
         Pass a query through all layers of cache and return on the first hit.
+        We can get away with caching query results in memory because the NERSC
+        Jobs DB is append-only.
         """
-
-        ### Collapse query string to remove extraneous whitespace
-        query_str = ' '.join(query_str.split())
-        cache_key = query_str % {'ps': '%s'} % query_variables
-
-        ### FIRST: check cache for the results of this query--we can get away
-        ### with this because the NERSC Jobs DB is append-only
-        if cache_key in self.cached_queries and not nocache:
-            index_start, index_end = self.cached_queries[cache_key]
-            results = self.saved_results['summary']['rows'][index_start:index_end]
-            self.cached_queries[cache_key]
-            self.last_hit = HIT_MEMORY
-        else:
-            if 'summary' not in self.saved_results:
-                index_start = 0
-            else:
-                index_start = len(self.saved_results['summary']['rows'])
-            results = super(NerscJobsDb, self).query(
-                query_str,
-                query_variables,
-                table='summary',
-                table_schema=NERSC_JOBSDB_SCHEMA)
-            index_end = len(self.saved_results['summary']['rows'])
-            if not nocache:
-                self.cached_queries[cache_key] = (index_start, index_end)
+        results = super(NerscJobsDb, self).query(
+            query_str,
+            query_variables,
+            table='summary',
+            table_schema=NERSC_JOBSDB_SCHEMA,
+            memoize=not nocache)
 
         self.last_results = results # for debugging
         return results
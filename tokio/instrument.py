@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""
+Lightweight instrumentation to measure where pytokio spends its time.
+
+Timers accumulate the number of times a named stage ran and the wall-clock
+time spent in it, and counters accumulate named quantities such as bytes
+parsed or rows fetched.  Nothing is recorded until enable() is called, so
+instrumented code costs next to nothing unless profiling was requested, e.g.,
+via the --profile option of the bin scripts.
+
+Measurements are kept per process; stages that run inside multiprocessing
+workers are not reported by the parent process.
+"""
+
+import sys
+import json
+import time
+import argparse
+import functools
+import contextlib
+import threading
+
+ENABLED = False
+
+# Formats in which profile reports can be written
+PROFILE_FORMATS = ['table', 'json']
+
+_LOCK = threading.Lock()
+_TIMERS = {}
+_COUNTERS = {}
+_PROFILE_FORMAT = None
+
+def enable(enabled=True):
+    """Start or stop recording timers and counters
+
+    Args:
+        enabled (bool): record measurements if True; ignore them if False
+    """
+    global ENABLED
+    ENABLED = enabled
+
+def reset():
+    """Discard all recorded timers and counters
+    """
+    with _LOCK:
+        _TIMERS.clear()
+        _COUNTERS.clear()
+
+def count(name, value=1):
+    """Add to a counter
+
+    Args:
+        name (str): name of the counter, e.g., ``cachingdb.rows_fetched``
+        value (int or float): amount to add to the counter
+    """
+    if not ENABLED:
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+def add_time(name, seconds):
+    """Record one run of a timed stage
+
+    Args:
+        name (str): name of the timer, e.g., ``hdf5.commit_dataset``
+        seconds (float): wall-clock time spent in the stage
+    """
+    if not ENABLED:
+        return
+    with _LOCK:
+        timer = _TIMERS.get(name)
+        if timer is None:
+            _TIMERS[name] = [1, seconds, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds < timer[2]:
+                timer[2] = seconds
+            if seconds > timer[3]:
+                timer[3] = seconds
+
+class Timer(object):
+    """Measure a stage that cannot be wrapped in a single with block
+
+    The elapsed time is always measured so that callers may report it
+    themselves, but it is only added to the named timer if instrumentation is
+    enabled.
+    """
+    def __init__(self, name):
+        """Start the timer
+
+        Args:
+            name (str): name of the timer to which the elapsed time is added
+        """
+        self.name = name
+        self.elapsed = None
+        self._start = time.time()
+
+    def stop(self):
+        """Stop the timer and record the time elapsed since it was started
+
+        Returns:
+            float: seconds elapsed since the timer was started
+        """
+        if self.elapsed is None:
+            self.elapsed = time.time() - self._start
+            add_time(self.name, self.elapsed)
+        return self.elapsed
+
+@contextlib.contextmanager
+def span(name):
+    """Context manager that times the block it encloses
+
+    For example::
+
+        with tokio.instrument.span('darshan.parse') as timer:
+            ...
+        print "parsed in %f seconds" % timer.elapsed
+
+    Args:
+        name (str): name of the timer to which the block's time is added
+
+    Yields:
+        Timer: timer whose elapsed attribute is set once the block exits
+    """
+    timer = Timer(name)
+    try:
+        yield timer
+    finally:
+        timer.stop()
+
+def timed(name):
+    """Decorator that times every call to a function
+
+    Args:
+        name (str): name of the timer to which each call's time is added
+    """
+    def decorator(func):
+        """Wrap func in a span"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            """Call func in a span"""
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_stats():
+    """Return a snapshot of all timers and counters
+
+    Returns:
+        dict: ``timers`` keyed by name, each with the number of ``calls`` and
+        the ``total``, ``min``, and ``max`` seconds per call, and ``counters``
+        keyed by name
+    """
+    with _LOCK:
+        timers = {}
+        for name, (calls, total, min_time, max_time) in _TIMERS.iteritems():
+            timers[name] = {
+                'calls': calls,
+                'total': total,
+                'min': min_time,
+                'max': max_time,
+            }
+        return {
+            'timers': timers,
+            'counters': dict(_COUNTERS),
+        }
+
+def to_json(indent=4):
+    """Serialize all timers and counters as json
+
+    Args:
+        indent (int): indentation passed to json.dumps
+
+    Returns:
+        str: json-encoded output of get_stats()
+    """
+    return json.dumps(get_stats(), indent=indent, sort_keys=True)
+
+def to_table():
+    """Summarize all timers and counters as a human-readable table
+
+    Returns:
+        str: one line per timer, sorted by total time, followed by one line
+        per counter
+    """
+    stats = get_stats()
+    width = max([len(name) for name in stats['timers'].keys() + stats['counters'].keys()]
+                + [len('counter')])
+    lines = []
+    if stats['timers']:
+        lines.append("%-*s %8s %12s %12s %12s" % (width, 'timer', 'calls', 'total (s)',
+                                                  'mean (s)', 'max (s)'))
+        for name, timer in sorted(stats['timers'].iteritems(),
+                                  key=lambda x: (-x[1]['total'], x[0])):
+            lines.append("%-*s %8d %12.4f %12.4f %12.4f" % (width, name,
+                                                            timer['calls'],
+                                                            timer['total'],
+                                                            timer['total'] / timer['calls'],
+                                                            timer['max']))
+    if stats['counters']:
+        if lines:
+            lines.append("")
+        lines.append("%-*s %12s" % (width, 'counter', 'value'))
+        for name, value in sorted(stats['counters'].iteritems()):
+            lines.append("%-*s %12s" % (width, name, value))
+    return "\n".join(lines)
+
+class _ProfileAction(argparse.Action):
+    """Enable instrumentation as soon as --profile is parsed
+    """
+    def __call__(self, parser, namespace, values, option_string=None):
+        global _PROFILE_FORMAT
+        _PROFILE_FORMAT = values
+        reset()
+        enable()
+        setattr(namespace, self.dest, values)
+
+def add_profile_argument(parser):
+    """Add the --profile option to a bin script's argument parser
+
+    The script's main function must also be wrapped with profile_main() for
+    the profile to be reported.
+
+    Args:
+        parser (argparse.ArgumentParser): parser to which --profile is added
+    """
+    parser.add_argument('--profile', type=str, default=None, choices=PROFILE_FORMATS,
+                        action=_ProfileAction,
+                        help="report time spent in each stage to stderr as %s"
+                        % ' or '.join(PROFILE_FORMATS))
+
+def profile_main(main):
+    """Decorator that reports the profile of a bin script's main function
+
+    If --profile was given, the recorded timers and counters are written to
+    stderr once main returns or raises, and instrumentation is disabled again.
+    """
+    @functools.wraps(main)
+    def wrapper(*args, **kwargs):
+        """Call main and report its profile if requested"""
+        global _PROFILE_FORMAT
+        timer = Timer('main')
+        try:
+            return main(*args, **kwargs)
+        finally:
+            if _PROFILE_FORMAT is not None:
+                timer.stop()
+                if _PROFILE_FORMAT == 'json':
+                    sys.stderr.write(to_json() + "\n")
+                else:
+                    sys.stderr.write(to_table() + "\n")
+                _PROFILE_FORMAT = None
+                enable(False)
+    return wrapper
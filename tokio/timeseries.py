@@ -10,6 +10,7 @@ import time
 import datetime
 import warnings
 import numpy
+import tokio.instrument
 import tokio.connectors.hdf5
 
 class TimeSeries(object):
@@ -142,6 +143,8 @@ class TimeSeries(object):
         self.timestamp_key = tokio.connectors.hdf5.get_timestamps_key(hdf5_file, dataset_name)
         self.timestamps = hdf5_file[self.timestamp_key]
         self.timestamps = self.timestamps if light else self.timestamps[:]
+        if not light:
+            tokio.instrument.count('hdf5.bytes_read', self.dataset.nbytes + self.timestamps.nbytes)
 
         self.timestep = self.timestamps[1] - self.timestamps[0]
         return True
@@ -150,6 +153,7 @@ class TimeSeries(object):
         """
         Write contents of this object into an HDF5 file group
         """
+        timer = tokio.instrument.Timer('hdf5.commit_dataset')
         extra_dataset_args = {
             'dtype': 'f8',
             'chunks': True,
@@ -160,7 +164,9 @@ class TimeSeries(object):
         # Create the dataset in the HDF5 file (if necessary)
         if self.dataset_name in hdf5_file:
             dataset_hdf5 = hdf5_file[self.dataset_name]
+            prior_stats = get_stored_stats(dataset_hdf5)
         else:
+            prior_stats = None
             dataset_hdf5 = hdf5_file.create_dataset(name=self.dataset_name,
                                                     shape=self.dataset.shape,
                                                     **extra_dataset_args)
@@ -173,6 +179,7 @@ class TimeSeries(object):
                                                        dtype='i8')
             # Copy the in-memory timestamp dataset into the HDF5 file
             timestamps_hdf5[:] = self.timestamps[:]
+            tokio.instrument.count('hdf5.bytes_written', self.timestamps.nbytes)
             t_start = 0
             t_end = self.timestamps.shape[0]
             start_timestamp = self.timestamps[0]
@@ -210,8 +217,29 @@ class TimeSeries(object):
         else:
             self.sort_columns()
 
+        # Update the column statistics using only the rows being overwritten
+        if t_start == 0 and t_end == dataset_hdf5.shape[0]:
+            stats = tokio.connectors.hdf5.column_stats(self.dataset)
+            stale_columns = []
+        elif prior_stats is not None:
+            stats, stale_columns = update_stats(prior_stats,
+                                                dataset_hdf5[t_start:t_end, :],
+                                                self.dataset)
+        else:
+            stats = None
+
         # Copy the in-memory dataset into the HDF5 file
         dataset_hdf5[t_start:t_end, :] = self.dataset[:, :]
+        tokio.instrument.count('hdf5.bytes_written', self.dataset.nbytes)
+
+        # Columns whose min or max may have been overwritten must be rescanned,
+        # as must datasets that were committed without statistics
+        if stats is None:
+            stats = tokio.connectors.hdf5.column_stats(dataset_hdf5[:, :])
+        elif stale_columns:
+            rescanned = tokio.connectors.hdf5.column_stats(dataset_hdf5[:, stale_columns])
+            stats['min'][stale_columns] = rescanned['min']
+            stats['max'][stale_columns] = rescanned['max']
 
         # Copy column names into metadata before committing metadata
         self.dataset_metadata[tokio.connectors.hdf5.COLUMN_NAME_KEY] = self.columns
@@ -226,6 +254,13 @@ class TimeSeries(object):
         for key, value in self.group_metadata.iteritems():
             dataset_hdf5.parent.attrs[key] = value
 
+        # Insert/update statistics after metadata, which may contain stale
+        # statistics copied from the dataset this object was attached to
+        for key in tokio.connectors.hdf5.STATS_KEYS:
+            dataset_hdf5.attrs[tokio.connectors.hdf5.STATS_ATTR_FMT % key] = stats[key]
+
+        timer.stop()
+
     def update_column_map(self):
         """
         Create the mapping of column names to column indices
@@ -397,6 +432,55 @@ class TimeSeries(object):
         self.dataset = numpy.vstack((self.dataset, new_dataset_rows))
         self.timestamps = numpy.hstack((self.timestamps, new_timestamp_rows))
 
+def get_stored_stats(dataset):
+    """Retrieve the column statistics stored in a dataset's attributes
+
+    Args:
+        dataset (h5py.Dataset): dataset previously written by commit_dataset
+
+    Returns:
+        dict keyed by tokio.connectors.hdf5.STATS_KEYS or None if the dataset
+        does not have a complete set of statistics
+    """
+    stats = {}
+    for key in tokio.connectors.hdf5.STATS_KEYS:
+        value = dataset.attrs.get(tokio.connectors.hdf5.STATS_ATTR_FMT % key)
+        if value is None or len(value) != dataset.shape[1]:
+            return None
+        stats[key] = numpy.array(value)
+    return stats
+
+def update_stats(prior_stats, old_values, new_values):
+    """Update column statistics when a block of rows is overwritten
+
+    Sums and counts are updated by removing the contributions of old_values
+    and adding those of new_values.  Minima and maxima can only be updated
+    this way if old_values did not contain them.
+
+    Args:
+        prior_stats (dict): column statistics of the dataset before the update
+        old_values (numpy.ndarray): rows that are being overwritten
+        new_values (numpy.ndarray): rows that will replace old_values
+
+    Returns:
+        Tuple of (stats, stale_columns) where stats is the updated dict of
+        column statistics and stale_columns is a list of column indices whose
+        min and max must be recalculated from the updated dataset
+    """
+    old_stats = tokio.connectors.hdf5.column_stats(old_values)
+    new_stats = tokio.connectors.hdf5.column_stats(new_values)
+
+    stats = {}
+    for key in 'sum', 'count', 'missing':
+        stats[key] = prior_stats[key] - old_stats[key] + new_stats[key]
+    stats['min'] = numpy.fmin(prior_stats['min'], new_stats['min'])
+    stats['max'] = numpy.fmax(prior_stats['max'], new_stats['max'])
+
+    with numpy.errstate(invalid='ignore'):
+        stale = (old_stats['min'] <= prior_stats['min']) \
+                | (old_stats['max'] >= prior_stats['max'])
+    return stats, [int(index) for index in numpy.flatnonzero(stale)]
+
 def sorted_nodenames(nodenames, sort_hex=False):
     """
     Gnarly routine to sort nodenames naturally.  Required for nodes named things
@@ -3,7 +3,15 @@ Tools to find Darshan logs within a system-wide repository
 """
 
 import os
+import re
 import glob
+import time
+import signal
+import sqlite3
+import datetime
+import functools
+import itertools
+import multiprocessing
 import tokio.tools.common
 import tokio.connectors.darshan
 import tokio.connectors.slurm
@@ -18,9 +26,17 @@ DARSHAN_LOG_GLOB_FIELDS = {
     "seconds": "*",
     "logmod": "*",
 }
+# SQLITE_MAX_VARIABLE_NUMBER is 999 by default
+SQLITE_MAX_VARIABLES = 999
+SQLITE_MAGIC = "SQLite format 3\x00"
+
+DARSHAN_LOG_NAME_REX = re.compile(r'^(?P<username>[^_]+)_(?P<exe>.*)_id(?P<jobid>[^_]+)_'
+                                  r'(?P<month>[^-]+)-(?P<day>[^-]+)-(?P<seconds>[^-]+)-'
+                                  r'(?P<logmod>.+)\.darshan$')
 
 def load_darshanlogs(datetime_start=None, datetime_end=None, username=None,
-                     jobid=None, darshan_log_dir=None, which=None, **kwargs):
+                     jobid=None, darshan_log_dir=None, which=None,
+                     min_nprocs=None, max_nprocs=None, index_file=None, **kwargs):
     """Return parsed Darshan logs matching a set of criteria
 
     Finds Darshan logs that match the input criteria, loads them, and returns a
@@ -34,8 +50,15 @@ def load_darshanlogs(datetime_start=None, datetime_end=None, username=None,
         jobid (int): jobid corresponding to Darshan log
         darshan_log_dir (str): path to Darshan log directory base
         which (str): 'base', 'total', and/or 'perf' as a comma-delimited string
+        min_nprocs (int): only load logs from jobs with at least this many
+            processes
+        max_nprocs (int): only load logs from jobs with at most this many
+            processes
+        index_file (str): path to a DarshanLogIndex database to use to find
+            logs instead of searching darshan_log_dir directly
         kwargs: arguments to pass to the connectors.darshanDarshan object
-            initializer
+            initializer, such as ``modules`` and ``counters`` to restrict
+            which counters are parsed and retained
 
     Returns:
         dict: keyed by log file name whose values are connectors.darshan.Darshan
@@ -44,39 +67,186 @@ def load_darshanlogs(datetime_start=None, datetime_end=None, username=None,
     Todo:
         * Use a default `darshan_log_dir` from `tokio.config`
     """
-    if which is None:
-        raise TypeError("which must be base, total, and/or perf")
-
-    which_list = [x.lower() for x in which.split(',')]
-    if 'base' not in which_list \
-    and 'total' not in which_list \
-    and 'perf' not in which_list:
-        raise TypeError("which must be base, total, and/or perf")
+    which_list = _get_which_list(which)
 
     matching_logfiles = find_darshanlogs(datetime_start=datetime_start,
                                          datetime_end=datetime_end,
                                          username=username,
                                          jobid=jobid,
-                                         darshan_log_dir=darshan_log_dir)
+                                         darshan_log_dir=darshan_log_dir,
+                                         min_nprocs=min_nprocs,
+                                         max_nprocs=max_nprocs,
+                                         index_file=index_file)
 
     results = {}
     for matching_logfile in matching_logfiles:
         results[matching_logfile] = tokio.connectors.darshan.Darshan(log_file=matching_logfile,
                                                                      **kwargs)
-        if 'base' in which_list:
-            results[matching_logfile].darshan_parser_base()
-        if 'total' in which_list:
-            results[matching_logfile].darshan_parser_total()
-        if 'perf' in which_list:
-            results[matching_logfile].darshan_parser_perf()
+        _parse_darshanlog(results[matching_logfile], which_list)
 
     return results
 
+def bulk_load_darshanlogs(darshan_logs, which='base', processes=None, timeout=None,
+                          reduce_function=None, **kwargs):
+    """Load many Darshan logs in parallel and capture any failures
+
+    Args:
+        darshan_logs (list of str): paths to Darshan logs to load
+        which (str): 'base', 'total', and/or 'perf' as a comma-delimited string
+        processes (int): number of worker processes; defaults to the number
+            of CPUs
+        timeout (float): abandon any log that takes longer than this many
+            seconds to load and reduce
+        reduce_function (function): function that takes a
+            connectors.darshan.Darshan object and returns the value to retain
+            for that log.  It is called by the worker process so that only its
+            return value is sent back.  Must be defined at module level.
+        kwargs: arguments to pass to the connectors.darshan.Darshan object
+            initializer
+
+    Returns:
+        tuple: (results, errors) where results is a dict keyed by log file
+        name whose values are connectors.darshan.Darshan objects (or the
+        return values of reduce_function) and errors is a dict keyed by log
+        file name whose values are descriptions of why those logs could not be
+        loaded
+    """
+    results = {}
+    errors = {}
+    for darshan_log, result, error in iterate_darshanlogs(darshan_logs,
+                                                          which=which,
+                                                          processes=processes,
+                                                          timeout=timeout,
+                                                          reduce_function=reduce_function,
+                                                          **kwargs):
+        if error is None:
+            results[darshan_log] = result
+        else:
+            errors[darshan_log] = error
+    return results, errors
+
+def iterate_darshanlogs(darshan_logs, which='base', processes=None, timeout=None,
+                        reduce_function=None, **kwargs):
+    """Load many Darshan logs in parallel and yield each as it is loaded
+
+    Logs are yielded in the order in which they finish loading rather than
+    the order in which they were given.  A log that fails to load does not
+    affect the loading of any other logs.  See bulk_load_darshanlogs for a
+    description of the arguments.
+
+    Yields:
+        tuple: (log file name, result, error) where result is None if the log
+        could not be loaded and error is None if it could
+    """
+    which_list = _get_which_list(which)
+    load_function = functools.partial(_load_darshanlog_parallel,
+                                      which_list=which_list,
+                                      timeout=timeout,
+                                      reduce_function=reduce_function,
+                                      kwargs=kwargs)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for item in pool.imap_unordered(load_function, darshan_logs):
+            yield item
+        pool.close()
+    finally:
+        # also stops any workers still running if the caller stopped early
+        pool.terminate()
+        pool.join()
+
+class _DarshanLogTimeout(Exception):
+    """Raised within a worker when a log takes too long to load
+    """
+    pass
+
+def _raise_timeout(signum, frame):
+    """Signal handler that interrupts the loading of a log
+    """
+    raise _DarshanLogTimeout()
+
+def _load_darshanlog_parallel(darshan_log, which_list, timeout, reduce_function, kwargs):
+    """
+    Return a tuple containing the Darshan log name, its loaded (and optionally
+    reduced) contents, and an error message to the parallel orchestrator.
+    """
+    if timeout:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        darshan_data = tokio.connectors.darshan.Darshan(log_file=darshan_log, **kwargs)
+        _parse_darshanlog(darshan_data, which_list)
+        if darshan_data.subprocess_returncode:
+            raise RuntimeError("%s returned nonzero exit code (%d)"
+                               % (darshan_data.subprocess_cmd[0],
+                                  darshan_data.subprocess_returncode))
+        elif 'header' not in darshan_data:
+            raise RuntimeError("no Darshan header found in %s" % darshan_log)
+        if reduce_function is None:
+            result = darshan_data
+        else:
+            result = reduce_function(darshan_data)
+    except _DarshanLogTimeout:
+        return darshan_log, None, "timed out after %s seconds" % timeout
+    except Exception as error:
+        return darshan_log, None, "%s: %s" % (type(error).__name__, error)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return darshan_log, result, None
+
+def _get_which_list(which):
+    """Validate and split a comma-delimited list of darshan-parser modes
+    """
+    if which is None:
+        raise TypeError("which must be base, total, and/or perf")
+
+    which_list = [x.lower() for x in which.split(',')]
+    if 'base' not in which_list \
+    and 'total' not in which_list \
+    and 'perf' not in which_list:
+        raise TypeError("which must be base, total, and/or perf")
+    return which_list
+
+def _parse_darshanlog(darshan_data, which_list):
+    """Populate a Darshan object using the requested darshan-parser modes
+
+    Args:
+        darshan_data (tokio.connectors.darshan.Darshan): object to populate
+        which_list (list of str): 'base', 'total', and/or 'perf'
+    """
+    # derive total and perf from a single base parse unless only one was asked for
+    if 'base' in which_list \
+    or ('total' in which_list and 'perf' in which_list):
+        darshan_data.darshan_parser_base(total='total' in which_list,
+                                         perf='perf' in which_list)
+        if 'base' not in which_list:
+            _drop_base_records(darshan_data)
+    elif 'total' in which_list:
+        darshan_data.darshan_parser_total()
+    elif 'perf' in which_list:
+        darshan_data.darshan_parser_perf()
+
+def _drop_base_records(darshan_data):
+    """Remove per-file records from a Darshan object
+
+    Args:
+        darshan_data (tokio.connectors.darshan.Darshan): object from which
+            everything but the _total and _perf records should be removed
+    """
+    darshan_data.records = {}
+    for module_data in darshan_data.get('counters', {}).itervalues():
+        for file_name in module_data.keys():
+            if not file_name.startswith('_'):
+                del module_data[file_name]
+
 def find_darshanlogs(datetime_start=None, datetime_end=None, username=None, jobid=None,
-                     darshan_log_dir=None):
+                     darshan_log_dir=None, min_nprocs=None, max_nprocs=None, index_file=None):
     """Return darshan log file paths matching a set of criteria
 
-    Attempts to find Darshan logs that match the input criteria.
+    Attempts to find Darshan logs that match the input criteria.  Criteria that
+    cannot be determined from a log's file name are checked against the log's
+    header.
 
     Args:
         datetime_start (datetime.datetime): date to begin looking for Darshan logs
@@ -84,6 +254,14 @@ def find_darshanlogs(datetime_start=None, datetime_end=None, username=None, jobi
         username (str): username of user who generated the log
         jobid (int): jobid corresponding to Darshan log
         darshan_log_dir (str): path to Darshan log directory base
+        min_nprocs (int): only return logs from jobs with at least this many
+            processes
+        max_nprocs (int): only return logs from jobs with at most this many
+            processes
+        index_file (str): path to a DarshanLogIndex database.  If given, the
+            index is brought up to date for the days being searched and then
+            queried instead of searching darshan_log_dir directly.  This also
+            allows logs to be found by jobid alone without consulting Slurm.
 
     Returns:
         list: paths of matching Darshan logs as strings
@@ -97,25 +275,442 @@ def find_darshanlogs(datetime_start=None, datetime_end=None, username=None, jobi
     if datetime_start is None:
         if jobid is None:
             raise TypeError("datetime_start must be defined if jobid is not")
-        else:
+        elif index_file is None:
             job_data = tokio.connectors.slurm.Slurm(jobid=jobid)
             datetime_start, _ = job_data.get_job_startend()
 
-    # the following will not work on Windows!
-    darshan_dated_dir = os.path.join(darshan_log_dir, "%-Y", "%-m", "%-d")
+    if index_file is not None:
+        index = DarshanLogIndex(index_file, darshan_log_dir)
+        try:
+            index.update(datetime_start=datetime_start, datetime_end=datetime_end)
+            results = index.find(datetime_start=datetime_start,
+                                 datetime_end=datetime_end,
+                                 username=username,
+                                 jobid=jobid)
+        finally:
+            index.close()
+    else:
+        # the following will not work on Windows!
+        darshan_dated_dir = os.path.join(darshan_log_dir, "%-Y", "%-m", "%-d")
+
+        search_dirs = tokio.tools.common.enumerate_dated_dir(darshan_dated_dir,
+                                                             datetime_start,
+                                                             datetime_end)
+
+        glob_fields = DARSHAN_LOG_GLOB_FIELDS.copy()
+        if jobid is not None:
+            glob_fields['jobid'] = jobid
+        if username:
+            glob_fields['username'] = username
+
+        results = []
+        for search_dir in search_dirs:
+            results += glob.glob(os.path.join(search_dir, DARHSAN_LOG_NAME_STR % glob_fields))
+
+    if min_nprocs is not None or max_nprocs is not None:
+        results = filter_darshanlogs(results, min_nprocs=min_nprocs, max_nprocs=max_nprocs)
+
+    return results
+
+def filter_darshanlogs(darshan_logs, datetime_start=None, datetime_end=None, uid=None,
+                       exe=None, min_nprocs=None, max_nprocs=None, **kwargs):
+    """Return the Darshan logs whose headers match a set of criteria
 
-    search_dirs = tokio.tools.common.enumerate_dated_dir(darshan_dated_dir,
-                                                         datetime_start,
-                                                         datetime_end)
+    Only the header of each log is loaded, so this is an inexpensive way to
+    discard logs before parsing their counters.  Logs whose headers cannot be
+    loaded never match.
 
-    glob_fields = DARSHAN_LOG_GLOB_FIELDS.copy()
-    if jobid is not None:
-        glob_fields['jobid'] = jobid
-    if username:
-        glob_fields['username'] = username
+    Args:
+        darshan_logs (list of str): paths to Darshan logs
+        datetime_start (datetime.datetime): only keep logs from jobs that
+            were still running at or after this time
+        datetime_end (datetime.datetime): only keep logs from jobs that
+            started before this time
+        uid (int): only keep logs generated by this user id
+        exe (str): only keep logs whose executable has this file name
+        min_nprocs (int): only keep logs from jobs with at least this many
+            processes
+        max_nprocs (int): only keep logs from jobs with at most this many
+            processes
+        kwargs: arguments to pass to the connectors.darshan.Darshan object
+            initializer
+
+    Returns:
+        list: paths of the Darshan logs that matched as strings
+    """
+    if datetime_start is not None:
+        datetime_start = time.mktime(datetime_start.timetuple())
+    if datetime_end is not None:
+        datetime_end = time.mktime(datetime_end.timetuple())
 
     results = []
-    for search_dir in search_dirs:
-        results += glob.glob(os.path.join(search_dir, DARHSAN_LOG_NAME_STR % glob_fields))
+    for darshan_log in darshan_logs:
+        darshan_data = tokio.connectors.darshan.Darshan(log_file=darshan_log, **kwargs)
+        darshan_data.load_header()
+        header = darshan_data.get('header')
+        if not header:
+            continue
+        try:
+            if (datetime_start is not None and header['end_time'] < datetime_start) \
+            or (datetime_end is not None and header['start_time'] >= datetime_end) \
+            or (uid is not None and header['uid'] != uid) \
+            or (exe is not None and os.path.basename(header['exe'][0]) != exe) \
+            or (min_nprocs is not None and header['nprocs'] < min_nprocs) \
+            or (max_nprocs is not None and header['nprocs'] > max_nprocs):
+                continue
+        except (KeyError, IndexError):
+            # header lacks a field required to apply the criteria
+            continue
+        results.append(darshan_log)
 
     return results
+
+class DarshanLogIndex(object):
+    """Index of the Darshan logs within a system-wide repository
+
+    Records the username, executable name, jobid, and date encoded in the file
+    name of every Darshan log in a repository organized into dated
+    subdirectories (``YYYY/M/D``) in a SQLite database so that logs can be
+    found without listing the contents of every directory that may contain
+    them.  Each day's directory is only rescanned when its modification time
+    changes.
+    """
+    def __init__(self, index_file, darshan_log_dir):
+        """Open (and create, if necessary) a Darshan log index
+
+        Args:
+            index_file (str): path to the SQLite database containing the index
+            darshan_log_dir (str): path to Darshan log directory base
+        """
+        self.index_file = index_file
+        self.darshan_log_dir = os.path.abspath(darshan_log_dir)
+        self.index_db = sqlite3.connect(index_file)
+        self.index_db.executescript("""
+            CREATE TABLE IF NOT EXISTS day_dirs (
+                day_dir TEXT PRIMARY KEY,
+                date TEXT,
+                mtime REAL
+            );
+            CREATE TABLE IF NOT EXISTS logs (
+                path TEXT PRIMARY KEY,
+                day_dir TEXT,
+                date TEXT,
+                username TEXT,
+                exe TEXT,
+                jobid TEXT
+            );
+            CREATE INDEX IF NOT EXISTS logs_by_date ON logs (date);
+            CREATE INDEX IF NOT EXISTS logs_by_jobid ON logs (jobid);
+            CREATE INDEX IF NOT EXISTS logs_by_username ON logs (username, date);
+            CREATE INDEX IF NOT EXISTS logs_by_day_dir ON logs (day_dir);
+        """)
+        self.index_db.commit()
+
+    def close(self):
+        """Close the index database
+        """
+        if self.index_db is not None:
+            self.index_db.close()
+            self.index_db = None
+
+    def update(self, datetime_start=None, datetime_end=None):
+        """Bring the index up to date with the contents of the repository
+
+        Args:
+            datetime_start (datetime.datetime): first day to update; if None,
+                the entire repository is updated
+            datetime_end (datetime.datetime): last day to update (inclusive);
+                defaults to datetime_start
+
+        Returns:
+            int: number of day directories whose contents were rescanned
+        """
+        scan_time = time.time()
+        date_clause, date_variables = _date_condition(datetime_start, datetime_end)
+        indexed = dict(self.index_db.execute(
+            "SELECT day_dir, mtime FROM day_dirs WHERE %s" % date_clause,
+            date_variables).fetchall())
+
+        num_scanned = 0
+        for date, day_dir in self._enumerate_day_dirs(datetime_start, datetime_end):
+            try:
+                mtime = os.stat(day_dir).st_mtime
+            except OSError:
+                continue
+            if day_dir in indexed and indexed.pop(day_dir) == mtime:
+                continue
+            self._index_day_dir(date, day_dir, mtime, scan_time)
+            num_scanned += 1
+
+        # forget about directories that have disappeared
+        for day_dir in indexed:
+            self.index_db.execute("DELETE FROM logs WHERE day_dir = ?", (day_dir,))
+            self.index_db.execute("DELETE FROM day_dirs WHERE day_dir = ?", (day_dir,))
+        self.index_db.commit()
+
+        return num_scanned
+
+    def find(self, datetime_start=None, datetime_end=None, username=None, jobid=None,
+             exe=None):
+        """Return indexed Darshan logs matching a set of criteria
+
+        Args:
+            datetime_start (datetime.datetime): date to begin looking for Darshan logs
+            datetime_end (datetime.datetime): date to stop looking for Darshan
+                logs (inclusive); defaults to datetime_start
+            username (str): username of user who generated the log
+            jobid (int): jobid corresponding to Darshan log
+            exe (str): executable name as encoded in the log's file name
+
+        Returns:
+            list: paths of matching Darshan logs as strings
+        """
+        date_clause, query_variables = _date_condition(datetime_start, datetime_end)
+        query_str = "SELECT path FROM logs WHERE %s" % date_clause
+        for column, value in ('username', username), ('jobid', jobid), ('exe', exe):
+            if value:
+                query_str += " AND %s = ?" % column
+                query_variables += (str(value),)
+        query_str += " ORDER BY date, path"
+        return [str(row[0]) for row in self.index_db.execute(query_str, query_variables)]
+
+    def _index_day_dir(self, date, day_dir, mtime, scan_time):
+        """Replace the indexed contents of a single day's directory
+        """
+        rows = []
+        for file_name in os.listdir(day_dir):
+            match = DARSHAN_LOG_NAME_REX.match(file_name)
+            if match is not None:
+                rows.append((os.path.join(day_dir, file_name),
+                             day_dir,
+                             date,
+                             match.group('username'),
+                             match.group('exe'),
+                             match.group('jobid')))
+
+        # a directory modified within the last second may still be changing
+        # without its mtime changing, so make sure it gets rescanned next time
+        if mtime >= scan_time - 1.0:
+            mtime = None
+
+        self.index_db.execute("DELETE FROM logs WHERE day_dir = ?", (day_dir,))
+        self.index_db.executemany("INSERT OR REPLACE INTO logs VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.index_db.execute("INSERT OR REPLACE INTO day_dirs VALUES (?, ?, ?)",
+                              (day_dir, date, mtime))
+        self.index_db.commit()
+
+    def _enumerate_day_dirs(self, datetime_start, datetime_end):
+        """Yield (date, path) of each day's directory that exists in a range
+
+        If datetime_start is None, every day's directory in the repository is
+        returned.
+        """
+        if datetime_start is not None:
+            if datetime_end is None:
+                datetime_end = datetime_start
+            day = datetime_start.date()
+            while day <= datetime_end.date():
+                day_dir = os.path.join(self.darshan_log_dir,
+                                       str(day.year), str(day.month), str(day.day))
+                if os.path.isdir(day_dir):
+                    yield day.isoformat(), day_dir
+                day += datetime.timedelta(days=1)
+            return
+
+        for year_dir, month_dir, day_dir_name in _walk_dated_dirs(self.darshan_log_dir):
+            try:
+                day = datetime.date(int(year_dir), int(month_dir), int(day_dir_name))
+            except ValueError:
+                continue
+            yield day.isoformat(), os.path.join(self.darshan_log_dir,
+                                                year_dir, month_dir, day_dir_name)
+
+class DarshanSummaryStore(object):
+    """Store of the bytes read and written to each mount point by Darshan logs
+
+    Holds the per-log, per-mount summaries generated by
+    bin/summarize_darshanlogs.py in a SQLite database indexed by log path so
+    that logs which have already been summarized can be skipped without
+    loading every previous summary into memory.  New summaries are buffered
+    and committed in batches; each batch is a single transaction, so an
+    interrupted run loses at most the summaries that were not yet committed.
+    """
+    def __init__(self, store_file, batch_size=1000):
+        """Open (and create, if necessary) a summary store
+
+        Args:
+            store_file (str): path to the SQLite database containing summaries
+            batch_size (int): number of logs to buffer before committing them
+        """
+        self.store_file = store_file
+        self.batch_size = batch_size
+        self._pending = []
+        self.store_db = sqlite3.connect(store_file)
+        self.store_db.executescript("""
+            CREATE TABLE IF NOT EXISTS logs (
+                log_id INTEGER PRIMARY KEY,
+                log_path TEXT UNIQUE NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS mounts (
+                log_id INTEGER NOT NULL,
+                mount TEXT NOT NULL,
+                read_bytes INTEGER,
+                write_bytes INTEGER,
+                PRIMARY KEY (log_id, mount)
+            );
+        """)
+        self.store_db.commit()
+
+    def close(self):
+        """Commit any buffered summaries and close the store
+        """
+        if self.store_db is not None:
+            self.flush()
+            self.store_db.close()
+            self.store_db = None
+
+    def __len__(self):
+        return self.store_db.execute("SELECT COUNT(*) FROM logs").fetchone()[0] + len(self._pending)
+
+    def __contains__(self, log_path):
+        if any(log_path == pending[0] for pending in self._pending):
+            return True
+        return self.store_db.execute("SELECT 1 FROM logs WHERE log_path = ?",
+                                     (log_path,)).fetchone() is not None
+
+    def filter_new(self, log_paths):
+        """Return the logs that have not yet been summarized
+
+        Args:
+            log_paths (list of str): paths to Darshan logs
+
+        Returns:
+            list of str: members of log_paths that are not in the store, in
+            their original order
+        """
+        known = set(pending[0] for pending in self._pending)
+        log_paths = list(log_paths)
+        for index in range(0, len(log_paths), SQLITE_MAX_VARIABLES):
+            chunk = log_paths[index:index + SQLITE_MAX_VARIABLES]
+            query = "SELECT log_path FROM logs WHERE log_path IN (%s)" % ", ".join("?" * len(chunk))
+            known.update(row[0] for row in self.store_db.execute(query, chunk))
+        return [log_path for log_path in log_paths if log_path not in known]
+
+    def add(self, log_path, summary):
+        """Add the summary of a single Darshan log
+
+        Replaces any existing summary of the same log.
+
+        Args:
+            log_path (str): path to the Darshan log
+            summary (dict): keyed by mount point and whose values are dicts
+                with read_bytes and write_bytes keys, as generated by
+                bin/summarize_darshanlogs.py
+        """
+        self._pending.append((log_path, summary))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def update(self, summaries):
+        """Add the summaries of many Darshan logs
+
+        Args:
+            summaries (dict): keyed by log path and whose values are summary
+                dicts as accepted by add()
+        """
+        for log_path, summary in summaries.iteritems():
+            self.add(log_path, summary)
+
+    def flush(self):
+        """Commit all buffered summaries in a single transaction
+        """
+        if not self._pending:
+            return
+        with self.store_db:
+            for log_path, summary in self._pending:
+                row = self.store_db.execute("SELECT log_id FROM logs WHERE log_path = ?",
+                                            (log_path,)).fetchone()
+                if row is None:
+                    log_id = self.store_db.execute("INSERT INTO logs (log_path) VALUES (?)",
+                                                   (log_path,)).lastrowid
+                else:
+                    log_id = row[0]
+                    self.store_db.execute("DELETE FROM mounts WHERE log_id = ?", (log_id,))
+                self.store_db.executemany(
+                    "INSERT INTO mounts VALUES (?, ?, ?, ?)",
+                    [(log_id, mount, counters.get('read_bytes', 0), counters.get('write_bytes', 0))
+                     for mount, counters in summary.iteritems()])
+        self._pending = []
+
+    def iterrows(self):
+        """Iterate over the per-mount rows of all logs in the store
+
+        Rows are read from the database as they are consumed, and all rows
+        belonging to the same log are adjacent.
+
+        Yields:
+            tuple: log path, mount point, bytes read, and bytes written
+        """
+        self.flush()
+        cursor = self.store_db.execute("""
+            SELECT logs.log_path, mounts.mount, mounts.read_bytes, mounts.write_bytes
+            FROM logs JOIN mounts ON logs.log_id = mounts.log_id
+            ORDER BY logs.log_id""")
+        for row in cursor:
+            yield row
+
+    def iteritems(self):
+        """Iterate over the summaries of all logs in the store
+
+        Yields:
+            tuple: log path and its summary dict as accepted by add()
+        """
+        for log_path, rows in itertools.groupby(self.iterrows(), key=lambda row: row[0]):
+            yield log_path, dict((row[1], {'read_bytes': row[2], 'write_bytes': row[3]})
+                                 for row in rows)
+
+    def to_dict(self):
+        """Return the contents of the store in the form generated by
+        bin/summarize_darshanlogs.py
+
+        Returns:
+            dict: keyed by log path, then by mount point
+        """
+        return dict(self.iteritems())
+
+def is_summary_store(file_name):
+    """Determine if a file is a DarshanSummaryStore rather than a json summary
+
+    Args:
+        file_name (str): path to a summary file
+
+    Returns:
+        bool: True if file_name is a SQLite database
+    """
+    with open(file_name, 'rb') as summary_file:
+        return summary_file.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+def _date_condition(datetime_start, datetime_end):
+    """Return the SQL condition and query variables that select a date range
+    """
+    if datetime_start is None:
+        return "1", ()
+    if datetime_end is None:
+        datetime_end = datetime_start
+    return "date >= ? AND date <= ?", (datetime_start.date().isoformat(),
+                                       datetime_end.date().isoformat())
+
+def _walk_dated_dirs(base_dir):
+    """Yield (year, month, day) names of the dated directories under base_dir
+    """
+    for year_dir in sorted(os.listdir(base_dir)):
+        year_path = os.path.join(base_dir, year_dir)
+        if not year_dir.isdigit() or not os.path.isdir(year_path):
+            continue
+        for month_dir in sorted(os.listdir(year_path)):
+            month_path = os.path.join(year_path, month_dir)
+            if not month_dir.isdigit() or not os.path.isdir(month_path):
+                continue
+            for day_dir in sorted(os.listdir(month_path)):
+                if day_dir.isdigit() and os.path.isdir(os.path.join(month_path, day_dir)):
+                    yield year_dir, month_dir, day_dir
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Tools to aggregate the counters of Darshan logs that were parsed into columnar
+ModuleRecords (i.e., using ``connectors.darshan.Darshan(columnar=True)``).
+Every statistic is computed over whole counter arrays at once rather than by
+walking each file, rank, and counter of the nested Darshan['counters'] dicts.
+"""
+
+import numpy
+import tokio.tools.mounts
+
+def summarize_counters(module_records, counters, suffix=''):
+    """Calculate statistics of counters over all of a module's records
+
+    Args:
+        module_records (connectors.darshan.ModuleRecords): records of a single
+            Darshan module
+        counters (list of str): names of counters to summarize, without their
+            module prefix (e.g., ``BYTES_READ``).  Counters not present in
+            module_records are skipped.
+        suffix (str): string to append to each result key (e.g., ``_posix``)
+
+    Returns:
+        dict: the total, mean, number of records, minimum, and maximum of each
+        counter keyed by ``tot_``, ``ave_``, ``num_``, ``min_``, and ``max_``
+        followed by the lowercased counter name and suffix
+    """
+    results = {}
+    num_records = module_records.num_records
+    if not num_records:
+        return results
+
+    counter_arrays = module_records.counters
+    for counter in counters:
+        values = counter_arrays.get(counter)
+        if values is None:
+            continue
+        key = counter.lower() + suffix
+        total = values.sum().item()
+        results['tot_%s' % key] = total
+        results['ave_%s' % key] = float(total) / num_records
+        results['num_%s' % key] = num_records
+        results['min_%s' % key] = values.min().item()
+        results['max_%s' % key] = values.max().item()
+
+    return results
+
+def get_api_bytes(records):
+    """Calculate the bytes read and written through each Darshan module
+
+    Args:
+        records (dict): connectors.darshan.ModuleRecords keyed by module name,
+            e.g., Darshan.records
+
+    Returns:
+        dict: keyed by module name, each containing the ``read`` and ``write``
+        bytes and the number of records that read (``read_files``) or wrote
+        (``write_files``) any bytes
+    """
+    api_bytes = {}
+    for api_name, module_records in records.iteritems():
+        api_bytes[api_name] = {}
+        for readwrite, counter in ('read', 'BYTES_READ'), ('write', 'BYTES_WRITTEN'):
+            values = module_records.counters.get(counter) if module_records.num_records else None
+            if values is None:
+                api_bytes[api_name][readwrite] = 0
+                api_bytes[api_name][readwrite + '_files'] = 0
+            else:
+                api_bytes[api_name][readwrite] = values.sum().item()
+                api_bytes[api_name][readwrite + '_files'] = int(numpy.count_nonzero(values))
+    return api_bytes
+
+def get_fs_bytes(records, mounts, apis=None):
+    """Calculate the bytes read and written to each mounted file system
+
+    Each file is assigned to the deepest of mounts that contains it, and files
+    not contained by any of mounts (e.g., STDIO streams) are assigned to
+    ``_unknown``.
+
+    Args:
+        records (dict): connectors.darshan.ModuleRecords keyed by module name,
+            e.g., Darshan.records
+        mounts (list of str): mount points, e.g., Darshan['mounts'].keys()
+        apis (list of str): only count bytes from these modules.  If None,
+            count bytes from all modules.
+
+    Returns:
+        dict: keyed by mount point, each containing the ``read`` and ``write``
+        bytes of files on that mount point
+    """
+    mount_matcher = tokio.tools.mounts.MountMatcher(mounts)
+    fs_bytes = {}
+    for api_name in sorted(set(records.keys() if apis is None else apis)):
+        module_records = records[api_name]
+        if not module_records.num_records:
+            continue
+
+        # match each file name once, then assign its mount to every record
+        fs_names = []
+        fs_ids = {}
+        file_fs_ids = numpy.empty(len(module_records.file_names), dtype=int)
+        for file_id, file_name in enumerate(module_records.file_names):
+            fs_name = mount_matcher.match(file_name)
+            if fs_name is None:
+                fs_name = '_unknown'
+            fs_id = fs_ids.get(fs_name)
+            if fs_id is None:
+                fs_id = len(fs_names)
+                fs_ids[fs_name] = fs_id
+                fs_names.append(fs_name)
+            file_fs_ids[file_id] = fs_id
+        record_fs_ids = file_fs_ids[module_records.file_ids]
+
+        totals = {}
+        for readwrite, counter in ('read', 'BYTES_READ'), ('write', 'BYTES_WRITTEN'):
+            values = module_records.counters.get(counter)
+            if values is None:
+                totals[readwrite] = [0] * len(fs_names)
+            elif values.dtype.kind == 'f':
+                totals[readwrite] = numpy.bincount(record_fs_ids,
+                                                   weights=values,
+                                                   minlength=len(fs_names)).tolist()
+            else:
+                # bincount weights are floats; sum integers exactly instead
+                sums = numpy.zeros(len(fs_names), dtype=values.dtype)
+                numpy.add.at(sums, record_fs_ids, values)
+                totals[readwrite] = sums.tolist()
+
+        for fs_id, fs_name in enumerate(fs_names):
+            if fs_name not in fs_bytes:
+                fs_bytes[fs_name] = {'read': 0, 'write': 0}
+            fs_bytes[fs_name]['read'] += totals['read'][fs_id]
+            fs_bytes[fs_name]['write'] += totals['write'][fs_id]
+
+    return fs_bytes
+
+def get_biggest_api(records):
+    """Determine the modules through which the most bytes were read and written
+
+    Args:
+        records (dict): connectors.darshan.ModuleRecords keyed by module name,
+            e.g., Darshan.records
+
+    Returns:
+        dict: ``biggest_read_api`` and ``biggest_write_api`` along with the
+        bytes (``_bytes``) and number of records (``_files``) that each read
+        or wrote.  Empty if records is empty.
+    """
+    api_bytes = get_api_bytes(records)
+    results = {}
+    if not api_bytes:
+        return results
+
+    for readwrite in 'read', 'write':
+        key = 'biggest_%s_api' % readwrite
+        results[key] = max(api_bytes, key=lambda k, rw=readwrite: api_bytes[k][rw])
+        results['%s_bytes' % key] = api_bytes[results[key]][readwrite]
+        results['%s_files' % key] = api_bytes[results[key]][readwrite + "_files"]
+
+    return results
+
+def get_biggest_fs(records, mounts, apis=None):
+    """Determine the file systems to which the most bytes were read and written
+
+    Args:
+        records (dict): connectors.darshan.ModuleRecords keyed by module name,
+            e.g., Darshan.records
+        mounts (list of str): mount points, e.g., Darshan['mounts'].keys()
+        apis (list of str): only count bytes from these modules.  If None, use
+            the modules through which the most bytes were read and written.
+
+    Returns:
+        dict: ``biggest_read_fs`` and ``biggest_write_fs`` along with the bytes
+        (``_bytes``) that each read or wrote.  Empty if no records were found.
+    """
+    if apis is None:
+        biggest_api = get_biggest_api(records)
+        if not biggest_api:
+            return {}
+        apis = [biggest_api['biggest_read_api'], biggest_api['biggest_write_api']]
+
+    fs_bytes = get_fs_bytes(records, mounts, apis)
+    results = {}
+    if not fs_bytes:
+        return results
+
+    for readwrite in 'read', 'write':
+        key = 'biggest_%s_fs' % readwrite
+        results[key] = max(fs_bytes, key=lambda k, rw=readwrite: fs_bytes[k][rw])
+        results['%s_bytes' % key] = fs_bytes[results[key]][readwrite]
+
+    return results
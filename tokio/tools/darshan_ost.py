@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+"""
+Tools to correlate the performance that files saw with the Lustre OSTs over
+which they were striped using the POSIX and Lustre modules of Darshan logs.
+"""
+
+import warnings
+import numpy
+import pandas
+import scipy.sparse
+import scipy.special
+import tokio.connectors.darshan
+
+# OST_NAME_FMT = "OST%05x"
+OST_NAME_FMT = "OST#%d"
+
+# POSIX and Lustre counters needed to estimate performance and find stripes
+DARSHAN_COUNTERS = [
+    'BYTES_READ',
+    'BYTES_WRITTEN',
+    'F_READ_TIME',
+    'F_WRITE_TIME',
+    'F_META_TIME',
+    'STRIPE_WIDTH',
+    'OST_ID_*',
+]
+
+class OstStripeMatrix(object):
+    """Sparse matrix of the fraction of each file striped on each OST
+
+    Each row corresponds to a file and each column to an OST.  Files are
+    identified as ``darshan_log@file_path`` so that identical file paths from
+    different Darshan logs remain distinct; a file that appears more than once
+    under the same identifier is assigned its best performance and the union
+    of its OSTs.
+    """
+    def __init__(self):
+        self.file_names = []
+        self._file_rows = {}
+        self._performance = []
+        self._row_ids = []
+        self._ost_ids = []
+        self._matrix = None
+        self._osts = None
+
+    @classmethod
+    def from_darshan_logs(cls, darshan_logs):
+        """Build a matrix from a list of Darshan logs
+
+        Args:
+            darshan_logs (list of str): paths to Darshan logs containing both
+                POSIX and Lustre module data
+
+        Returns:
+            OstStripeMatrix: matrix describing all files found in darshan_logs
+        """
+        stripe_matrix = cls()
+        for darshan_log in darshan_logs:
+            stripe_matrix.add_darshan_log(darshan_log)
+        return stripe_matrix
+
+    def add_darshan_log(self, darshan_log):
+        """Parse a Darshan log and add its files to the matrix
+
+        Args:
+            darshan_log (str): path to a Darshan log
+
+        Returns:
+            int: number of files added or updated
+        """
+        darshan_data = tokio.connectors.darshan.Darshan(darshan_log,
+                                                        columnar=True,
+                                                        modules=['posix', 'lustre'],
+                                                        counters=DARSHAN_COUNTERS)
+        darshan_data.darshan_parser_base()
+        records = darshan_data.records
+        if not records:
+            warnings.warn("Invalid Darshan log %s" % darshan_log)
+            return 0
+        elif 'posix' not in records:
+            warnings.warn("Darshan log %s does not contain POSIX module data" % darshan_log)
+            return 0
+        elif 'lustre' not in records:
+            warnings.warn("Darshan log %s does not contain Lustre module data" % darshan_log)
+            return 0
+        return self.add_records(darshan_log, records['posix'], records['lustre'])
+
+    def add_records(self, darshan_log, posix_records, lustre_records):
+        """Add the files described by POSIX and Lustre module records
+
+        Only files with both POSIX and Lustre records and nonzero I/O time are
+        added.
+
+        Args:
+            darshan_log (str): name of the Darshan log from which the records
+                came
+            posix_records (connectors.darshan.ModuleRecords): POSIX module
+                records
+            lustre_records (connectors.darshan.ModuleRecords): Lustre module
+                records
+
+        Returns:
+            int: number of files added or updated
+        """
+        num_posix_files = len(posix_records.file_names)
+        if not num_posix_files or not lustre_records.num_records:
+            return 0
+
+        performance = estimate_darshan_perf(posix_records)
+
+        # map each Lustre record onto the POSIX file it describes
+        posix_file_ids = dict((name, index) for index, name in enumerate(posix_records.file_names))
+        lustre_to_posix = numpy.array([posix_file_ids.get(name, -1)
+                                       for name in lustre_records.file_names], dtype=int)
+        record_files = lustre_to_posix[lustre_records.file_ids]
+        record_valid = record_files >= 0
+        record_valid[record_valid] = numpy.isfinite(performance[record_files[record_valid]])
+
+        # assign each file a row in the matrix
+        local_rows = numpy.full(num_posix_files, -1, dtype=int)
+        for posix_file_id in numpy.unique(record_files[record_valid]).tolist():
+            file_name = "%s@%s" % (darshan_log, posix_records.file_names[posix_file_id])
+            row = self._file_rows.get(file_name)
+            if row is None:
+                row = len(self.file_names)
+                self._file_rows[file_name] = row
+                self.file_names.append(file_name)
+                self._performance.append(performance[posix_file_id])
+            elif self._performance[row] < performance[posix_file_id]:
+                self._performance[row] = performance[posix_file_id]
+            local_rows[posix_file_id] = row
+
+        # find the OSTs of each record; OST_ID_n is only valid for n < STRIPE_WIDTH
+        counters = lustre_records.counters
+        ost_columns = sorted((int(name[len('OST_ID_'):]), name)
+                             for name in counters if name.startswith('OST_ID_'))
+        if ost_columns:
+            ost_ids = numpy.column_stack([counters[name] for _, name in ost_columns])
+            stripe_width = counters.get('STRIPE_WIDTH', numpy.zeros(len(ost_ids), dtype=int))
+            in_stripe = numpy.array([index for index, _ in ost_columns]) < stripe_width[:, None]
+            in_stripe &= record_valid[:, None]
+            rows = numpy.broadcast_to(local_rows[record_files][:, None], ost_ids.shape)
+            self._row_ids.append(rows[in_stripe])
+            self._ost_ids.append(ost_ids[in_stripe])
+
+        self._matrix = None
+        return int(numpy.count_nonzero(local_rows >= 0))
+
+    @property
+    def performance(self):
+        """numpy.ndarray of the estimated performance of each file (bytes/sec)"""
+        return numpy.array(self._performance, dtype=float)
+
+    @property
+    def osts(self):
+        """numpy.ndarray of the OST index of each column"""
+        self._build()
+        return self._osts
+
+    @property
+    def ost_names(self):
+        """list of the OST name of each column"""
+        return [OST_NAME_FMT % ost_id for ost_id in self.osts.tolist()]
+
+    @property
+    def matrix(self):
+        """scipy.sparse.csc_matrix of the fraction of each file on each OST"""
+        self._build()
+        return self._matrix
+
+    def _build(self):
+        """Assemble the sparse matrix from the (file, OST) pairs collected
+        """
+        if self._matrix is not None:
+            return
+
+        num_files = len(self.file_names)
+        if self._row_ids:
+            rows = numpy.concatenate(self._row_ids).astype(numpy.int64)
+            ost_ids = numpy.concatenate(self._ost_ids).astype(numpy.int64)
+        else:
+            rows = numpy.zeros(0, dtype=numpy.int64)
+            ost_ids = numpy.zeros(0, dtype=numpy.int64)
+
+        # a file only counts once per OST no matter how many records list it
+        if len(ost_ids):
+            offset = ost_ids.min()
+            pair_keys = numpy.unique(rows * (ost_ids.max() - offset + 1) + (ost_ids - offset))
+            rows, ost_ids = numpy.divmod(pair_keys, ost_ids.max() - offset + 1)
+            ost_ids += offset
+
+        self._osts, columns = numpy.unique(ost_ids, return_inverse=True)
+        osts_per_file = numpy.bincount(rows, minlength=num_files)
+        self._matrix = scipy.sparse.csc_matrix(
+            (1.0 / osts_per_file[rows], (rows, columns)),
+            shape=(num_files, len(self._osts)))
+
+    def to_dataframe(self):
+        """Present the matrix as a dense DataFrame
+
+        Returns:
+            pandas.DataFrame: one row per file with file_paths and performance
+            columns followed by one column per OST
+        """
+        dataframe = pandas.DataFrame(self.matrix.toarray(), columns=self.ost_names)
+        dataframe.insert(0, 'file_paths', self.file_names)
+        dataframe.insert(1, 'performance', self.performance)
+        return dataframe
+
+    def correlate(self):
+        """Correlate file performance with the fraction of each file on each OST
+
+        Calculates the Pearson correlation coefficient and its two-tailed
+        p-value for every OST at once.  OSTs on which every file has the same
+        stripe fraction cannot be correlated and are omitted.
+
+        Returns:
+            list of dict: one dict per OST with ost_name, coefficient, and
+            p-value keys
+        """
+        performance = self.performance
+        num_files = len(performance)
+
+        # in the unlikely event that all performance measurements are the same
+        # (or there is only one), we simply cannot perform correlation analysis
+        if num_files < 2 or len(numpy.unique(performance)) == 1:
+            return []
+
+        matrix = self.matrix
+        centered_perf = performance - performance.mean()
+        perf_sumsq = centered_perf.dot(centered_perf)
+
+        ost_sum = numpy.asarray(matrix.sum(axis=0)).ravel()
+        ost_sumsq = numpy.asarray(matrix.multiply(matrix).sum(axis=0)).ravel() \
+                    - ost_sum**2 / num_files
+        covariance = matrix.T.dot(centered_perf)
+
+        # an OST column is constant if every file is striped on it equally
+        constant = (matrix.getnnz(axis=0) == num_files) \
+                   & (matrix.max(axis=0).toarray().ravel() == matrix.min(axis=0).toarray().ravel())
+        valid = ~constant & (ost_sumsq > 0.0)
+
+        coeffs = numpy.clip(covariance[valid] / numpy.sqrt(ost_sumsq[valid] * perf_sumsq), -1.0, 1.0)
+        pvals = _pearson_pvalues(coeffs, num_files)
+
+        results = []
+        ost_names = [name for name, keep in zip(self.ost_names, valid.tolist()) if keep]
+        for ost_name, coeff, pval in zip(ost_names, coeffs.tolist(), pvals.tolist()):
+            results.append({
+                'ost_name': ost_name,
+                'coefficient': coeff,
+                'p-value': pval})
+        return results
+
+def estimate_darshan_perf(posix_records):
+    """Estimate the performance each file saw
+
+    Calculate performance in a sideways fashion: find the longest I/O time
+    across any rank for each file, then divide the sum of all bytes read and
+    written by this longest I/O time.
+
+    Args:
+        posix_records (connectors.darshan.ModuleRecords): POSIX module records
+
+    Returns:
+        numpy.ndarray: performance (bytes/sec) of each file in
+        posix_records.file_names; NaN for files that spent no time in I/O
+    """
+    counters = posix_records.counters
+    file_ids = posix_records.file_ids
+    num_files = len(posix_records.file_names)
+    zeros = numpy.zeros(len(file_ids))
+
+    io_time = counters.get('F_WRITE_TIME', zeros) \
+              + counters.get('F_READ_TIME', zeros) \
+              + counters.get('F_META_TIME', zeros)
+    num_bytes = counters.get('BYTES_READ', zeros) + counters.get('BYTES_WRITTEN', zeros)
+
+    max_io_time = numpy.zeros(num_files)
+    numpy.maximum.at(max_io_time, file_ids, io_time)
+    sum_bytes = numpy.bincount(file_ids, weights=num_bytes, minlength=num_files)
+
+    performance = numpy.full(num_files, numpy.nan)
+    nonzero = max_io_time > 0.0
+    performance[nonzero] = sum_bytes[nonzero] / max_io_time[nonzero]
+    return performance
+
+def correlate_ost_performance(darshan_logs):
+    """Correlate file performance with OSTs across a set of Darshan logs
+
+    Args:
+        darshan_logs (list of str): paths to Darshan logs containing both
+            POSIX and Lustre module data
+
+    Returns:
+        list of dict: one dict per OST with ost_name, coefficient, and p-value
+        keys
+    """
+    return OstStripeMatrix.from_darshan_logs(darshan_logs).correlate()
+
+def _pearson_pvalues(coeffs, num_samples):
+    """Calculate two-tailed p-values for Pearson correlation coefficients
+
+    Args:
+        coeffs (numpy.ndarray): correlation coefficients
+        num_samples (int): number of samples from which coeffs were calculated
+
+    Returns:
+        numpy.ndarray: p-value of each coefficient, calculated as in
+        scipy.stats.pearsonr
+    """
+    if num_samples == 2:
+        return numpy.ones(len(coeffs))
+    dof = num_samples - 2.0
+    pvals = numpy.zeros(len(coeffs))
+    partial = numpy.abs(coeffs) < 1.0
+    t_squared = coeffs[partial]**2 * (dof / ((1.0 - coeffs[partial]) * (1.0 + coeffs[partial])))
+    pvals[partial] = scipy.special.betainc(0.5 * dof, 0.5, dof / (dof + t_squared))
+    return pvals
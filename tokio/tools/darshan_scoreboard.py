@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+"""
+Tools to reduce the per-log file system summaries generated by
+bin/summarize_darshanlogs.py into a scoreboard of the top sources of I/O by
+user, application, and file system.
+
+Summaries are streamed in columnar batches rather than loaded in their
+entirety, so the memory required depends on the number of distinct users,
+applications, and file systems rather than the number of logs.
+"""
+
+import os
+import re
+import gzip
+import json
+import struct
+import hashlib
+import mimetypes
+import functools
+import itertools
+import multiprocessing
+import numpy
+import pandas
+import tokio.tools.darshan
+
+### Number of (log, mount) records to reduce at once
+DEFAULT_BATCH_SIZE = 100000
+
+### Number of bytes to read from a json summary at once
+JSON_CHUNK_SIZE = 2**20
+
+### Number of log names whose parsed fields are remembered
+MAX_CACHED_LOG_NAMES = 100000
+
+SUMMARY_COLUMNS = ['log_path', 'mount', 'read_bytes', 'write_bytes']
+VALUE_COLUMNS = ['read_bytes', 'write_bytes', 'num_jobs']
+
+# scoreboard category and the summary column by which it is reduced
+CATEGORIES = [
+    ('per_user', 'username'),
+    ('per_fs', 'mount'),
+    ('per_exe', 'exe'),
+]
+
+LOG_NAME_REX = re.compile(r'^([^_]+)_(.*?)_id(\d+)_.*.darshan')
+
+_WHITESPACE_REX = re.compile(r'\s*')
+_LOG_NAME_CACHE = {}
+
+def build_scoreboard(summary_files, processes=1, batch_size=DEFAULT_BATCH_SIZE, **kwargs):
+    """Reduce Darshan summaries into bytes read/written per user, exe, and fs
+
+    Summary files are reduced independently and may be processed in parallel.
+    If a log appears in more than one summary file, only the summary from the
+    last file in which it appears is counted.
+
+    Args:
+        summary_files (list of str): paths to json (optionally gzipped)
+            summaries or summary stores generated by
+            bin/summarize_darshanlogs.py
+        processes (int): number of summary files to reduce concurrently
+        batch_size (int): number of (log, mount) records to reduce at once
+        kwargs: filters to apply to records; see reduce_summary()
+
+    Returns:
+        dict: keyed by category (per_user, per_fs, and per_exe), then by the
+        name of the user, file system, or executable, then by read_bytes,
+        write_bytes, and num_jobs
+    """
+    # process files from last to first so that the last summary of a log wins
+    summary_files = list(reversed(summary_files))
+    kwargs['track_logs'] = len(summary_files) > 1
+
+    pool = None
+    if processes > 1 and len(summary_files) > 1:
+        pool = multiprocessing.Pool(processes)
+        reduced = pool.imap(functools.partial(_reduce_summary_parallel,
+                                              batch_size=batch_size,
+                                              kwargs=kwargs),
+                            summary_files)
+
+    seen_logs = numpy.zeros(0, dtype=numpy.uint64)
+    partials = dict((category, []) for category, _ in CATEGORIES)
+    try:
+        for summary_file in summary_files:
+            if pool is None:
+                file_partials, log_hashes = reduce_summary(summary_file,
+                                                           exclude_logs=seen_logs,
+                                                           batch_size=batch_size,
+                                                           **kwargs)
+            else:
+                file_partials, log_hashes = next(reduced)
+                # rarely, summary files overlap and must be reduced again
+                if numpy.in1d(log_hashes, seen_logs).any():
+                    file_partials, log_hashes = reduce_summary(summary_file,
+                                                               exclude_logs=seen_logs,
+                                                               batch_size=batch_size,
+                                                               **kwargs)
+            seen_logs = numpy.union1d(seen_logs, log_hashes)
+            for category, _ in CATEGORIES:
+                partials[category].append(file_partials[category])
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    results = {}
+    for category, _ in CATEGORIES:
+        results[category] = _partial_to_dict(_combine_partials(partials[category]))
+    return results
+
+def reduce_summary(summary_file, exclude_logs=None, track_logs=True,
+                   batch_size=DEFAULT_BATCH_SIZE, limit_fs=None, limit_user=None, limit_exe=None,
+                   exclude_fs=None, exclude_user=None, exclude_exe=None,
+                   min_nprocs=None, max_nprocs=None):
+    """Reduce a single summary file into bytes read/written per user, exe, and fs
+
+    Records for the root file system (``/``) are never counted.
+
+    Args:
+        summary_file (str): path to a json (optionally gzipped) summary or
+            summary store generated by bin/summarize_darshanlogs.py
+        exclude_logs (numpy.ndarray): hashes (see hash_log_path()) of logs to
+            skip
+        track_logs (bool): return the hashes of the logs in summary_file
+        batch_size (int): number of (log, mount) records to reduce at once
+        limit_fs (list of str): only count records from these mount points
+        limit_user (list of str): only count logs from these users
+        limit_exe (list of str): only count logs from these executables
+        exclude_fs (list of str): do not count records from these mount points
+        exclude_user (list of str): do not count logs from these users
+        exclude_exe (list of str): do not count logs from these executables
+        min_nprocs (int): only count logs that can still be found and whose
+            jobs had at least this many processes
+        max_nprocs (int): only count logs that can still be found and whose
+            jobs had at most this many processes
+
+    Returns:
+        tuple: dict of pandas.DataFrame keyed by category, each indexed by
+        name and containing read_bytes, write_bytes, and num_jobs columns,
+        and a numpy.ndarray of the hashes of all logs in summary_file (empty
+        if track_logs is False)
+    """
+    filters = {
+        'username': (limit_user, exclude_user),
+        'exe': (limit_exe, exclude_exe),
+        'mount': (limit_fs, exclude_fs),
+    }
+    partials = dict((category, []) for category, _ in CATEGORIES)
+    log_hashes = []
+
+    rows = iterate_summary_rows(summary_file)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        frame = pandas.DataFrame.from_records(batch, columns=SUMMARY_COLUMNS)
+        del batch
+
+        # parse each log's name and apply per-log filters once per log
+        log_codes, log_paths = pandas.factorize(frame['log_path'].values)
+        if track_logs or exclude_logs is not None and len(exclude_logs):
+            batch_hashes = numpy.array([hash_log_path(x) for x in log_paths], dtype=numpy.uint64)
+            log_hashes.append(batch_hashes)
+
+        log_names = [parse_log_name(x) for x in log_paths]
+        log_fields = {
+            'username': pandas.Series([x[0] for x in log_names], dtype=object),
+            'exe': pandas.Series([x[1] for x in log_names], dtype=object),
+        }
+        keep_log = numpy.ones(len(log_paths), dtype=bool)
+        if exclude_logs is not None and len(exclude_logs):
+            keep_log &= ~numpy.in1d(batch_hashes, exclude_logs)
+        for field, values in log_fields.iteritems():
+            keep_log &= _filter_mask(values, *filters[field])
+        if min_nprocs is not None or max_nprocs is not None:
+            matching_logs = set(tokio.tools.darshan.filter_darshanlogs(
+                log_paths[keep_log],
+                min_nprocs=min_nprocs,
+                max_nprocs=max_nprocs,
+                silent_errors=True))
+            keep_log &= numpy.array([x in matching_logs for x in log_paths], dtype=bool)
+
+        # then apply per-record filters
+        keep = keep_log[log_codes] \
+               & (frame['mount'] != '/').values \
+               & _filter_mask(frame['mount'], *filters['mount'])
+        log_codes = log_codes[keep]
+        frame = frame[keep].assign(username=log_fields['username'].values[log_codes],
+                                   exe=log_fields['exe'].values[log_codes],
+                                   num_jobs=1)
+
+        for category, column in CATEGORIES:
+            partials[category].append(frame.groupby(column)[VALUE_COLUMNS].sum())
+
+    for category, _ in CATEGORIES:
+        partials[category] = _combine_partials(partials[category])
+
+    if log_hashes:
+        log_hashes = numpy.unique(numpy.concatenate(log_hashes))
+    else:
+        log_hashes = numpy.zeros(0, dtype=numpy.uint64)
+
+    return partials, log_hashes
+
+def iterate_summary_rows(summary_file):
+    """Iterate over the records in a summary without loading it in its entirety
+
+    Args:
+        summary_file (str): path to a json (optionally gzipped) summary or
+            summary store generated by bin/summarize_darshanlogs.py
+
+    Yields:
+        tuple: log path, mount point, bytes read, and bytes written
+    """
+    _, encoding = mimetypes.guess_type(summary_file)
+    if encoding != 'gzip' and tokio.tools.darshan.is_summary_store(summary_file):
+        store = tokio.tools.darshan.DarshanSummaryStore(summary_file)
+        try:
+            for row in store.iterrows():
+                yield row
+        finally:
+            store.close()
+        return
+
+    if encoding == 'gzip':
+        summary_json = gzip.open(summary_file, 'r')
+    else:
+        summary_json = open(summary_file, 'r')
+    try:
+        for log_path, counters in _JsonObjectStream(summary_json):
+            for mount, mount_counters in counters.iteritems():
+                yield (log_path,
+                       mount,
+                       mount_counters.get('read_bytes', 0),
+                       mount_counters.get('write_bytes', 0))
+    finally:
+        summary_json.close()
+
+def parse_log_name(log_path):
+    """Determine the user and executable that generated a Darshan log
+
+    Args:
+        log_path (str): path to a Darshan log
+
+    Returns:
+        tuple: username and executable name, either of which may be
+        ``<unknown>`` if it cannot be determined from the log's file name
+    """
+    result = _LOG_NAME_CACHE.get(log_path)
+    if result is not None:
+        return result
+
+    darshan_log_bn = os.path.basename(log_path)
+    regex_match = LOG_NAME_REX.search(darshan_log_bn)
+    if regex_match:
+        result = (regex_match.group(1), regex_match.group(2))
+    elif '_' in darshan_log_bn:
+        result = (darshan_log_bn.split('_', 1)[0], "<unknown>")
+    else:
+        result = ("<unknown>", "<unknown>")
+
+    if len(_LOG_NAME_CACHE) >= MAX_CACHED_LOG_NAMES:
+        _LOG_NAME_CACHE.clear()
+    _LOG_NAME_CACHE[log_path] = result
+    return result
+
+def hash_log_path(log_path):
+    """Return a compact identifier for a log path
+
+    Args:
+        log_path (str): path to a Darshan log
+
+    Returns:
+        long: 64-bit hash of log_path
+    """
+    if isinstance(log_path, unicode):
+        log_path = log_path.encode('utf-8')
+    return struct.unpack('<Q', hashlib.md5(log_path).digest()[:8])[0]
+
+def _reduce_summary_parallel(summary_file, batch_size, kwargs):
+    """Call reduce_summary() from a multiprocessing worker
+    """
+    return reduce_summary(summary_file, batch_size=batch_size, **kwargs)
+
+def _filter_mask(values, limit, exclude):
+    """Return a boolean array indicating which values pass limit and exclude
+    """
+    mask = numpy.ones(len(values), dtype=bool)
+    if limit:
+        mask &= values.isin(limit).values
+    if exclude:
+        mask &= ~values.isin(exclude).values
+    return mask
+
+def _combine_partials(partials):
+    """Sum a list of partially reduced DataFrames indexed by name
+    """
+    partials = [x for x in partials if len(x)]
+    if not partials:
+        return pandas.DataFrame(columns=VALUE_COLUMNS)
+    elif len(partials) == 1:
+        return partials[0]
+    return pandas.concat(partials).groupby(level=0).sum()
+
+def _partial_to_dict(partial):
+    """Convert a reduced DataFrame into nested dicts of ints
+    """
+    results = {}
+    for name, row in zip(partial.index, partial[VALUE_COLUMNS].values.tolist()):
+        results[name] = dict(zip(VALUE_COLUMNS, [int(x) for x in row]))
+    return results
+
+class _JsonObjectStream(object):
+    """Iterate over the members of a json object without decoding it all at once
+
+    Decodes one key and one value at a time from a file containing a single
+    json object so that only the member being decoded must be held in memory.
+    """
+    def __init__(self, json_file, chunk_size=JSON_CHUNK_SIZE):
+        self.json_file = json_file
+        self.name = getattr(json_file, 'name', repr(json_file))
+        self.chunk_size = chunk_size
+        self.scan_once = json.JSONDecoder().scan_once
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+
+        scan_once = self.scan_once
+        skip_whitespace = _WHITESPACE_REX.match
+        while True:
+            # decode "key": value and the , or } that follows it.  If the
+            # buffer ends before all of that, read more and try again.
+            buf = self.buf
+            try:
+                key, pos = scan_once(buf, skip_whitespace(buf, self.pos).end())
+                pos = skip_whitespace(buf, pos).end()
+                if buf[pos] != ':':
+                    raise ValueError("Expected : at position %d of %s" % (pos, self.name))
+                value, pos = scan_once(buf, skip_whitespace(buf, pos + 1).end())
+                pos = skip_whitespace(buf, pos).end()
+                char = buf[pos]
+            except (StopIteration, IndexError, ValueError):
+                if self._read():
+                    continue
+                raise ValueError("Malformed json object member at position %d of %s"
+                                 % (self.pos, self.name))
+
+            yield key, value
+            if char == '}':
+                return
+            elif char != ',':
+                raise ValueError("Expected , or } at position %d of %s" % (pos, self.name))
+            self.pos = pos + 1
+
+    def _read(self):
+        """Append the next chunk of the file to the buffer
+        """
+        chunk = self.json_file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """Skip whitespace and return the next character, or '' at end of file
+        """
+        while True:
+            self.pos = _WHITESPACE_REX.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read():
+                return ''
+
+    def _expect(self, char):
+        """Consume the next character, which must be char
+        """
+        if self._peek() != char:
+            raise ValueError("Expected %s at position %d of %s" % (char, self.pos, self.name))
+        self.pos += 1
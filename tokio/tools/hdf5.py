@@ -1,14 +1,22 @@
 #!/usr/bin/env python
 
 import os
+import sys
+import Queue
 import datetime
+import threading
 import tempfile
 import subprocess
+import functools
+import multiprocessing
 import numpy as np
 import common
 from .. import connectors, config
 from ..debug import debug_print as _debug_print
 
+# Target number of elements to load into memory at once when binning datasets
+BIN_BLOCK_ELEMENTS = 2**22
+
 def enumerate_h5lmts(file_name, datetime_start, datetime_end):
     """
     Given a starting datetime and (optionally) an ending datetime, return all
@@ -21,63 +29,401 @@ def enumerate_h5lmts(file_name, datetime_start, datetime_end):
                                              file_name=file_name)
     return h5lmt_files
 
+def _iterate_files_and_indices(file_name, dataset_name, datetime_start, datetime_end,
+                               reader=None):
+    """
+    Generator that opens each relevant HDF5 file in turn and yields the tuples
+    returned by get_files_and_indices().  If reader is given, each tuple also
+    contains the result of calling reader(hdf5_file, dataset_name, i_0, i_f)
+    before the file is closed.
+    """
+    h5lmt_files = enumerate_h5lmts(file_name, datetime_start, datetime_end)
+
+    for h5lmt_file in h5lmt_files:
+        with connectors.hdf5.Hdf5(h5lmt_file, mode="r") as hdf5:
+            i_0 = 0
+            timestamps = hdf5.get_timestamps(dataset_name)
+            if datetime.datetime.fromtimestamp(timestamps[0]) <= datetime_start:
+                i_0 = hdf5.get_index(dataset_name, datetime_start) # This is the first day's hdf5
+
+            i_f = -1
+            if datetime.datetime.fromtimestamp(timestamps[-1]) >= datetime_end:
+                # This is the last day's hdf5
+                i_f = hdf5.get_index(dataset_name, datetime_end) - 1
+                # -1 because datetime_end should be exclusive
+                #
+                # If the last timestamp is on the first datapoint of a new day,
+                # just drop the whole day to maintain exclusivity of the last
+                # timestamp
+                if i_f < 0:
+                    continue
+
+            if reader is None:
+                yield (h5lmt_file, i_0, i_f)
+            else:
+                yield (h5lmt_file, i_0, i_f, reader(hdf5, dataset_name, i_0, i_f))
+
 def get_files_and_indices(file_name, dataset_name, datetime_start, datetime_end):
     """
     Given the name of an Hdf5 file and a start/end date+time, returns a list of
     tuples containing
     """
-    if datetime_end is None:
-        datetime_end_local = datetime_start
-    else:
-        datetime_end_local = datetime_end
-    h5lmt_files = enumerate_h5lmts(file_name, datetime_start, datetime_end)
-    output = []
+    return list(_iterate_files_and_indices(file_name, dataset_name, datetime_start, datetime_end))
 
-    for h5lmt_file in h5lmt_files:
-        hdf5 = connectors.hdf5.Hdf5(h5lmt_file, mode="r")
-
-        i_0 = 0
-        timestamps = hdf5.get_timestamps(dataset_name)
-        if datetime.datetime.fromtimestamp(timestamps[0]) <= datetime_start:
-            i_0 = hdf5.get_index(dataset_name, datetime_start) # This is the first day's hdf5
-
-        i_f = -1
-        if datetime.datetime.fromtimestamp(timestamps[-1]) >= datetime_end:
-            # This is the last day's hdf5
-            i_f = hdf5.get_index(dataset_name, datetime_end) - 1  
-            # -1 because datetime_end should be exclusive
-            #
-            # If the last timestamp is on the first datapoint of a new day,
-            # just drop the whole day to maintain exclusivity of the last
-            # timestamp
-            if i_f < 0:
-                continue
-
-        hdf5.close()
-        output.append((h5lmt_file, i_0, i_f))
-    return output
-
-def get_dataframe_from_time_range(file_name, dataset_name, datetime_start, datetime_end):
+def read_window(hdf5_file, dataset_name, i_0, i_f):
+    """Read the timestamps and values of a dataset between two indices
+
+    Args:
+        hdf5_file (connectors.hdf5.Hdf5): file containing the dataset
+        dataset_name (str): name of dataset to read
+        i_0 (int): index of first row to read
+        i_f (int): index of last row to read (inclusive), or -1 to read
+            through the end of the dataset
+
+    Returns:
+        Tuple of (timestamps, values) as numpy.ndarray
+    """
+    i_end = None if i_f < 0 else i_f + 1
+    return (hdf5_file.get_timestamps(dataset_name)[i_0:i_end],
+            hdf5_file[dataset_name][i_0:i_end])
+
+class _PrefetchError(object):
+    """
+    Wrapper to pass an exception raised by the prefetch thread to the consumer
+    """
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+_PREFETCH_DONE = object()
+
+def iterate_windows(file_name, dataset_name, datetime_start, datetime_end,
+                    reader=read_window, prefetch=1):
+    """Iterate over the data in each HDF5 file that spans a time range
+
+    Opens and reads the window of each HDF5 file that intersects the time range
+    in a background thread so that reading the next file overlaps with
+    processing the current one.  Exceptions raised while reading are re-raised
+    when the corresponding window would have been yielded.
+
+    Args:
+        file_name (str): basename of HDF5 files to search for
+        dataset_name (str): name of dataset to read
+        datetime_start (datetime.datetime): start of time range (inclusive)
+        datetime_end (datetime.datetime): end of time range (exclusive)
+        reader (function): called as reader(hdf5_file, dataset_name, i_0, i_f)
+            to read each window; defaults to read_window
+        prefetch (int): maximum number of windows to read ahead of the one
+            being processed.  0 disables the background thread.
+
+    Yields:
+        Tuples of (file name, i_0, i_f, result of reader)
+    """
+    if prefetch < 1:
+        for window in _iterate_files_and_indices(file_name, dataset_name,
+                                                 datetime_start, datetime_end,
+                                                 reader=reader):
+            yield window
+        return
+
+    windows = Queue.Queue()
+    # each token in free_slots permits the reader thread to read one window
+    free_slots = Queue.Queue()
+    for _ in range(prefetch):
+        free_slots.put(True)
+    stop = threading.Event()
+
+    def prefetch_windows():
+        """
+        Read windows into the queue until they run out or the consumer goes away
+        """
+        try:
+            iterator = _iterate_files_and_indices(file_name, dataset_name,
+                                                  datetime_start, datetime_end,
+                                                  reader=reader)
+            while True:
+                while not stop.is_set():
+                    try:
+                        free_slots.get(timeout=0.1)
+                        break
+                    except Queue.Empty:
+                        pass
+                if stop.is_set():
+                    return
+                try:
+                    windows.put(next(iterator))
+                except StopIteration:
+                    break
+        except Exception: # pylint: disable=broad-except
+            windows.put(_PrefetchError(sys.exc_info()))
+            return
+        windows.put(_PREFETCH_DONE)
+
+    thread = threading.Thread(target=prefetch_windows)
+    thread.daemon = True
+    thread.start()
+
+    try:
+        while True:
+            window = windows.get()
+            if window is _PREFETCH_DONE:
+                break
+            elif isinstance(window, _PrefetchError):
+                raise window.exc_info[0], window.exc_info[1], window.exc_info[2]
+            free_slots.put(True)
+            yield window
+    finally:
+        # wait for any in-flight read to finish so that its file gets closed
+        stop.set()
+        thread.join()
+
+def _read_dataframe(hdf5_file, dataset_name, i_0, i_f): # pylint: disable=unused-argument
+    """
+    iterate_windows reader that returns the whole dataset as a DataFrame
+    """
+    return hdf5_file.to_dataframe(dataset_name)
+
+def get_dataframe_from_time_range(file_name, dataset_name, datetime_start, datetime_end,
+                                  prefetch=1):
     """
     Returns the same content as get_group_data_from_time_range into a dataframe
     """
-    files_and_indices = get_files_and_indices(file_name, dataset_name, datetime_start, datetime_end)
-    if not files_and_indices:
-        raise IOError("No relevant hdf5 files found in %s" % config.H5LMT_BASE_DIR)
     result = None
 
-    for h5file in enumerate_h5lmts(file_name, datetime_start, datetime_end):
-        with connectors.hdf5.Hdf5(h5file, mode='r') as f:
-            df_slice = f.to_dataframe(dataset_name)
-            df_slice = df_slice[(df_slice.index >= datetime_start) 
-                                & (df_slice.index < datetime_end)]
-            if result is None:
-                result = df_slice
-            else:
-                ### append a copy--I think this is memory-inefficient
-                # result = result.append(df_slice)
-                # concat ?
-                ### append in place--maybe more efficient than .append??
-                result = result.reindex(result.index.union(df_slice.index))
-                result.loc[df_slice.index] = df_slice
+    for _, _, _, df_slice in iterate_windows(file_name, dataset_name, datetime_start,
+                                             datetime_end, reader=_read_dataframe,
+                                             prefetch=prefetch):
+        df_slice = df_slice[(df_slice.index >= datetime_start)
+                            & (df_slice.index < datetime_end)]
+        if result is None:
+            result = df_slice
+        else:
+            ### append a copy--I think this is memory-inefficient
+            # result = result.append(df_slice)
+            # concat ?
+            ### append in place--maybe more efficient than .append??
+            result = result.reindex(result.index.union(df_slice.index))
+            result.loc[df_slice.index] = df_slice
+
+    if result is None:
+        raise IOError("No relevant hdf5 files found in %s" % config.H5LMT_BASE_DIR)
     return result.sort_index()
+
+def get_bin_edges(num_rows, num_bins):
+    """Calculate the row indices that delimit a series of time bins
+
+    Divides num_rows into num_bins contiguous bins.  If num_bins does not
+    evenly divide num_rows, the bins differ in size by at most one row so that
+    every row is assigned to exactly one bin.
+
+    Args:
+        num_rows (int): number of rows (timesteps) to divide
+        num_bins (int): number of bins to generate
+
+    Returns:
+        numpy.ndarray of num_bins + 1 indices.  Bin i spans rows
+        edges[i] (inclusive) through edges[i + 1] (exclusive).
+    """
+    if num_bins < 1 or num_bins > num_rows:
+        raise ValueError("Cannot divide %d timesteps into %d bins" % (num_rows, num_bins))
+    return np.arange(num_bins + 1, dtype='i8') * num_rows // num_bins
+
+def _get_block_rows(dataset, num_cols):
+    """Number of rows to read at once when scanning a dataset
+
+    Rounds BIN_BLOCK_ELEMENTS down to a whole number of HDF5 chunks so that
+    each block read decompresses every chunk it touches exactly once.
+    """
+    chunks = getattr(dataset, 'chunks', None)
+    chunk_rows = chunks[0] if chunks else 1
+    block_rows = max(1, BIN_BLOCK_ELEMENTS // max(1, num_cols))
+    return max(chunk_rows, (block_rows // chunk_rows) * chunk_rows)
+
+def _is_preloaded(dataset):
+    """Determine if slicing a dataset will load the entire dataset anyway
+
+    MappedDatasets that transpose or reshape H5LMT data must read the whole
+    dataset before they can be sliced, so reading them in blocks only
+    multiplies the amount of I/O.
+    """
+    return getattr(dataset, 'transpose', False) or getattr(dataset, 'force2d', False)
+
+def iterate_blocks(dataset):
+    """Iterate over a 2d dataset in blocks of whole rows
+
+    Each block spans a whole number of HDF5 chunks so that a full scan of the
+    dataset decompresses every chunk exactly once while only holding roughly
+    BIN_BLOCK_ELEMENTS elements in memory at a time.
+
+    Args:
+        dataset (h5py.Dataset or numpy.ndarray): 2d dataset to iterate over
+
+    Yields:
+        Tuples of (index0, block) where index0 is the row offset of the first
+        row in block and block is a 2d numpy.ndarray
+    """
+    if _is_preloaded(dataset):
+        yield 0, dataset[:]
+        return
+
+    num_rows = dataset.shape[0]
+    block_rows = _get_block_rows(dataset, dataset.shape[1])
+    for index0 in range(0, num_rows, block_rows):
+        yield index0, dataset[index0:index0 + block_rows, :]
+
+def _reduce_bins(values, missing, offsets):
+    """Calculate aggregate values for consecutive bins of a 2d array
+
+    Args:
+        values (numpy.ndarray): 2d array of values to be reduced along both axes
+        missing (numpy.ndarray): boolean array of the same shape as values
+            indicating which elements are missing
+        offsets (numpy.ndarray): row indices delimiting each bin, relative to
+            the first row of values
+
+    Returns:
+        Tuple of (max, min, sum, missing) where each element is a 1d array with
+        one value per bin
+    """
+    sizes = np.diff(offsets)
+    if (sizes == sizes[0]).all():
+        # all bins are the same size, so we can reduce along a new axis
+        shape = (len(sizes), sizes[0], values.shape[1])
+        values = values[:offsets[-1]].reshape(shape)
+        missing = missing[:offsets[-1]].reshape(shape)
+        return (values.max(axis=(1, 2)),
+                values.min(axis=(1, 2)),
+                values.sum(axis=(1, 2)),
+                missing.sum(axis=(1, 2)))
+
+    starts = offsets[:-1]
+    return (np.maximum.reduceat(values, starts, axis=0).max(axis=1),
+            np.minimum.reduceat(values, starts, axis=0).min(axis=1),
+            np.add.reduceat(values, starts, axis=0).sum(axis=1),
+            np.add.reduceat(missing.astype('i8'), starts, axis=0).sum(axis=1))
+
+def bin_dataset(hdf5_file, dataset_name, num_bins):
+    """Reduce a timeseries dataset into a fixed number of time bins
+
+    Reads the dataset in blocks containing whole bins and whole HDF5 chunks and
+    calculates the max, min, sum, and number of missing elements of every bin
+    in a single pass.  H5LMT datasets, which must be transposed on read, are
+    loaded once in their entirety.
+
+    Args:
+        hdf5_file (connectors.hdf5.Hdf5): file containing the dataset
+        dataset_name (str): name of dataset to bin
+        num_bins (int): number of bins to divide the dataset into.  If this
+            does not evenly divide the number of timesteps, bins will differ in
+            size by one timestep.
+
+    Returns:
+        dict of numpy.ndarray, each with one element per bin, keyed by index0,
+        indexf, tstart, tend, max, min, sum, ave, missing, and num.  Returns
+        None if dataset_name does not exist in hdf5_file.
+    """
+    dataset = hdf5_file.get(dataset_name)
+    if dataset is None:
+        return None
+
+    timestamps = hdf5_file.get_timestamps(dataset_name)[:]
+    if hdf5_file.schema:
+        num_rows = timestamps.shape[0]
+    else:
+        # no schema means h5lmt file, which has + 1 extra timestep
+        num_rows = timestamps.shape[0] - 1
+
+    edges = get_bin_edges(num_rows, num_bins)
+    maxes = np.empty(num_bins)
+    mins = np.empty(num_bins)
+    sums = np.empty(num_bins)
+    missings = np.empty(num_bins, dtype='i8')
+
+    if _is_preloaded(dataset):
+        values = dataset[:][:num_rows]
+        if hdf5_file.version is None:
+            missing = hdf5_file.get_missing(dataset_name)[:num_rows].astype(bool)
+        else:
+            missing = (values == 0.0) & np.signbit(values)
+        maxes[:], mins[:], sums[:], missings[:] = _reduce_bins(values, missing, edges)
+        num_cols = values.shape[1]
+    else:
+        num_cols = dataset.shape[1]
+        block_rows = _get_block_rows(dataset, num_cols)
+        bin0 = 0
+        while bin0 < num_bins:
+            # find the last bin that still fits inside of a single block
+            binf = np.searchsorted(edges, edges[bin0] + block_rows, side='right') - 1
+            binf = min(max(binf, bin0 + 1), num_bins)
+            values = dataset[edges[bin0]:edges[binf], :]
+            missing = (values == 0.0) & np.signbit(values)
+            results = _reduce_bins(values, missing, edges[bin0:binf + 1] - edges[bin0])
+            maxes[bin0:binf], mins[bin0:binf], sums[bin0:binf], missings[bin0:binf] = results
+            bin0 = binf
+
+    nums = np.diff(edges) * num_cols
+    return {
+        'index0': edges[:-1],
+        'indexf': edges[1:],
+        'tstart': timestamps[edges[:-1]],
+        'tend': timestamps[edges[1:] - 1],
+        'max': maxes,
+        'min': mins,
+        'sum': sums,
+        'ave': sums / nums,
+        'missing': missings,
+        'num': nums,
+    }
+
+def bin_hdf5_file(file_name, dataset_names, num_bins):
+    """Bin several datasets contained in a single HDF5 file
+
+    Args:
+        file_name (str): path to an HDF5 file
+        dataset_names (list of str): datasets to bin
+        num_bins (int): number of bins to divide each dataset into
+
+    Returns:
+        dict keyed by dataset name whose values are the output of bin_dataset.
+        Datasets that do not exist in the file are omitted.
+    """
+    results = {}
+    with connectors.hdf5.Hdf5(file_name, mode='r') as hdf5_file:
+        for dataset_name in dataset_names:
+            binned = bin_dataset(hdf5_file, dataset_name, num_bins)
+            if binned is not None:
+                results[dataset_name] = binned
+    return results
+
+def _bin_hdf5_file_parallel(file_name, dataset_names, num_bins):
+    """
+    Return a tuple containing the file name and the results of bin_hdf5_file()
+    to the parallel orchestrator.
+    """
+    return (file_name, bin_hdf5_file(file_name, dataset_names, num_bins))
+
+def bin_hdf5_files(file_names, dataset_names, num_bins, num_procs=1):
+    """Bin datasets from many HDF5 files, optionally in parallel
+
+    Args:
+        file_names (list of str): paths to HDF5 files
+        dataset_names (list of str): datasets to bin in each file
+        num_bins (int): number of bins to divide each dataset into
+        num_procs (int): number of worker processes to use
+
+    Yields:
+        Tuples of (file_name, results of bin_hdf5_file) in the same order as
+        file_names
+    """
+    if num_procs > 1 and len(file_names) > 1:
+        pool = multiprocessing.Pool(num_procs)
+        try:
+            for result in pool.imap(functools.partial(_bin_hdf5_file_parallel,
+                                                      dataset_names=dataset_names,
+                                                      num_bins=num_bins),
+                                    file_names):
+                yield result
+        finally:
+            pool.terminate()
+    else:
+        for file_name in file_names:
+            yield _bin_hdf5_file_parallel(file_name, dataset_names, num_bins)
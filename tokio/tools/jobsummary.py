@@ -0,0 +1,820 @@
+#!/usr/bin/env python
+"""
+Summarize the I/O behavior of jobs by combining the performance data recorded
+in their Darshan logs with file system, topology, and scheduler data retrieved
+from other connectors over each job's time window.
+
+Summarizing a job loads H5LMT files, OST health snapshots, the Cray SDB proc
+table, and the NERSC jobs database.  `JobSummarizer` keeps all of these
+between jobs, and `summarize_jobs` uses one JobSummarizer per worker process to
+summarize many jobs in chronological order so that jobs which ran close
+together share the same data.
+"""
+
+import os
+import sys
+import time
+import datetime
+import warnings
+import threading
+import functools
+import collections
+import multiprocessing
+import tokio.config
+import tokio.instrument
+import tokio.tools.hdf5
+import tokio.tools.mounts
+import tokio.tools.darshan_counters
+import tokio.tools.lfsstatus
+import tokio.tools.topology
+import tokio.connectors.hdf5
+import tokio.connectors.slurm
+import tokio.connectors.craysdb
+import tokio.connectors.darshan
+import tokio.connectors.nersc_jobsdb
+
+# These Darshan POSIX counters are explicitly over into summary
+USEFUL_DARSHAN_COUNTERS = [
+        'BYTES_READ',
+        'BYTES_WRITTEN',
+        'READS',
+        'WRITES',
+        'F_META_TIME',
+        'F_READ_TIME',
+        'F_WRITE_TIME',
+        'OPENS',
+        'SEQ_READS',
+        'SEQ_WRITES',
+        'STATS',
+        'FILE_NOT_ALIGNED',
+        'MEM_NOT_ALIGNED',
+    ]
+
+# Maximum number of H5LMT files each JobSummarizer keeps open at once
+MAX_CACHED_H5LMT_FILES = 4
+
+# Connectors that JobSummarizer runs once a job's time range and file system
+# are known, in the order in which their results are merged
+CONNECTORS = ['lmt', 'topology', 'ost', 'concurrent_jobs']
+
+def summarize_darshan_posix(darshan_data):
+    """
+    Extract key metrics from the POSIX module in a Darshan log that was parsed
+    with columnar=True
+    """
+    # Extract POSIX performance counters if present
+    if 'posix' not in darshan_data.records:
+        return {}
+
+    results = {}
+    perf_data = darshan_data.get('counters', {}).get('posix', {}).get('_perf')
+    if perf_data is not None:
+        results['total_gibs_posix'] = perf_data.get('total_bytes')
+        if results['total_gibs_posix']:
+            results['total_gibs_posix'] /= 2.0**30
+            results['agg_perf_by_slowest_posix'] = perf_data.get('agg_perf_by_slowest')
+            results['io_time'] = perf_data.get('slowest_rank_io_time_unique_files')
+            if results['io_time']:
+                results['io_time'] += perf_data.get('time_by_slowest_shared_files')
+
+    # Generate statistics for each useful counter
+    results.update(tokio.tools.darshan_counters.summarize_counters(darshan_data.records['posix'],
+                                                                   USEFUL_DARSHAN_COUNTERS,
+                                                                   suffix='_posix'))
+
+    return results
+
+def get_biggest_api(darshan_data):
+    """
+    Determine the most-used API based on a Darshan log that was parsed with
+    columnar=True
+    """
+    return tokio.tools.darshan_counters.get_biggest_api(darshan_data.records)
+
+def get_biggest_fs(darshan_data, biggest_api=None):
+    """
+    Determine the most-used file system based on a Darshan log that was parsed
+    with columnar=True.  Only the most-used APIs, as reported by
+    get_biggest_api(), are considered.
+    """
+    if biggest_api is None:
+        biggest_api = get_biggest_api(darshan_data)
+    if not biggest_api:
+        return {}
+
+    return tokio.tools.darshan_counters.get_biggest_fs(
+        darshan_data.records,
+        darshan_data.get('mounts', {}).keys(),
+        apis=[biggest_api['biggest_read_api'], biggest_api['biggest_write_api']])
+
+def summarize_darshan(darshan_data):
+    """
+    Synthesize new Darshan summary metrics based on the contents of a
+    connectors.darshan.Darshan object that is partially or fully populated
+
+    """
+
+    results = {}
+
+    if 'header' in darshan_data:
+        d_header = darshan_data['header']
+        for key in 'walltime', 'end_time', 'start_time', 'jobid', 'nprocs':
+            results[key] = d_header.get(key)
+        if 'exe' in d_header:
+            results['app'] = d_header['exe'][0]
+        else:
+            results['app'] = None
+
+    results.update(summarize_darshan_posix(darshan_data))
+    biggest_api = get_biggest_api(darshan_data)
+    results.update(biggest_api)
+    results.update(get_biggest_fs(darshan_data, biggest_api))
+
+    return results
+
+def summarize_byterate_df(dataframe, readwrite, timestep=None):
+    """
+    Calculate some interesting statistics from a dataframe containing byte rate
+    data.
+
+    """
+    assert readwrite in ['read', 'written']
+    if timestep is None:
+        if dataframe.shape[0] < 2:
+            warnings.warn("given single-row dataframe without timestep")
+            return {}
+        timestep = (dataframe.index[1].to_pydatetime() \
+                    - dataframe.index[0].to_pydatetime()).total_seconds()
+    results = {}
+    results['tot_bytes_%s' % readwrite] = dataframe.sum().sum() * timestep
+    results['tot_gibs_%s' % readwrite] = results['tot_bytes_%s' % readwrite] / 2.0**30
+    results['ave_bytes_%s_per_sec' % readwrite] = (dataframe.sum(axis=1)).mean()
+    results['ave_gibs_%s_per_sec' % readwrite] = results['ave_bytes_%s_per_sec' % readwrite] / 2.0**30
+    results['max_bytes_%s_per_sec' % readwrite] = (dataframe.sum(axis=1)).max()
+    results['max_gibs_%s_per_sec' % readwrite] = results['max_bytes_%s_per_sec' % readwrite] / 2.0**30
+    results['min_bytes_%s_per_sec' % readwrite] = (dataframe.sum(axis=1)).min()
+    results['min_gibs_%s_per_sec' % readwrite] = results['min_bytes_%s_per_sec' % readwrite] / 2.0**30
+
+    results['frac_zero_%s' % readwrite] = \
+        float((dataframe == 0.0).sum().sum()) / float((dataframe.shape[0]*dataframe.shape[1]))
+    return results
+
+def summarize_cpu_df(dataframe, servertype):
+    """
+    Calculate some interesting statistics from a dataframe containing CPU load
+    data.
+
+    """
+    assert servertype in ['oss', 'mds']
+    results = {}
+    # df content depends on the servertype
+    results['ave_%s_cpu' % servertype] = dataframe.mean().mean()
+    results['max_%s_cpu' % servertype] = dataframe.max().max()
+    return results
+
+def summarize_missing_df(dataframe):
+    """
+    Populate the fraction missing counter from a given DataFrame
+
+    """
+    results = {
+        'frac_missing': float((dataframe != 0.0).sum().sum()) \
+                        / float((dataframe.shape[0]*dataframe.shape[1]))
+    }
+    return results
+
+def summarize_mds_ops_df(dataframe, opname, timestep=None):
+    """
+    Summarize various metadata op counts over a time range
+    """
+    if timestep is None:
+        if dataframe.shape[0] < 2:
+            raise Exception("must specify timestep for single-row dataframe")
+        timestep = (dataframe.index[1].to_pydatetime() \
+                    - dataframe.index[0].to_pydatetime()).total_seconds()
+    results = {}
+    results['tot_%s_ops' % opname] = dataframe.sum().sum() * timestep
+    results['ave_%s_ops_per_sec' % opname] = dataframe.mean().mean()
+    results['max_%s_ops_per_sec' % opname] = dataframe.max().max()
+    results['min_%s_ops_per_sec' % opname] = dataframe.min().min()
+    return results
+
+# H5LMT datasets to summarize, the function that summarizes each, and the
+# arguments to pass to that function after the dataset's DataFrame
+LMT_DATASETS = [
+    ('/datatargets/readrates', summarize_byterate_df, ('read',)),
+    ('/datatargets/writerates', summarize_byterate_df, ('written',)),
+    ('/dataservers/cpuload', summarize_cpu_df, ('oss',)),
+    ('/mdservers/cpuload', summarize_cpu_df, ('mds',)),
+    ('/mdtargets/openrates', summarize_mds_ops_df, ('open',)),
+    ('/mdtargets/closerates', summarize_mds_ops_df, ('close',)),
+    ('/mdtargets/mknodrates', summarize_mds_ops_df, ('mknod',)),
+    ('/mdtargets/linkrates', summarize_mds_ops_df, ('link',)),
+    ('/mdtargets/unlinkrates', summarize_mds_ops_df, ('unlink',)),
+    ('/mdtargets/mkdirrates', summarize_mds_ops_df, ('mkdir',)),
+    ('/mdtargets/rmdirrates', summarize_mds_ops_df, ('rmdir',)),
+    ('/mdtargets/renamerates', summarize_mds_ops_df, ('rename',)),
+    ('/mdtargets/getxattrrates', summarize_mds_ops_df, ('getxattr',)),
+    ('/mdtargets/statfsrates', summarize_mds_ops_df, ('statfs',)),
+    ('/mdtargets/setattrrates', summarize_mds_ops_df, ('setattr',)),
+    ('/mdtargets/getattrrates', summarize_mds_ops_df, ('getattr',)),
+    ('/FSMissingGroup/FSMissingDataSet', summarize_missing_df, ()),
+]
+
+def merge_dicts(dict1, dict2, assertion=True, prefix=None):
+    """
+    Take two dictionaries and merge their keys.  Optionally raise an exception
+    if a duplicate key is found, and optionally merge the new dict into the old
+    after adding a prefix to every key.
+
+    """
+    for key, value in dict2.iteritems():
+        if prefix is not None:
+            new_key = prefix + key
+        else:
+            new_key = key
+        if assertion:
+            if new_key in dict1:
+                raise Exception("duplicate key %s found" % new_key)
+        dict1[new_key] = value
+
+def retrieve_darshan_data(results, darshan_log_file, silent_errors=False):
+    """
+    Extract the performance data from the Darshan log
+    """
+    # get_biggest_api needs BYTES_READ/BYTES_WRITTEN from every module, and
+    # F_SLOWEST_RANK_TIME is needed to derive perf
+    darshan_data = tokio.connectors.darshan.Darshan(darshan_log_file,
+                                                    columnar=True,
+                                                    counters=USEFUL_DARSHAN_COUNTERS
+                                                    + ['F_SLOWEST_RANK_TIME'],
+                                                    silent_errors=silent_errors)
+
+    # don't bother parsing the counters of something that isn't a darshan log
+    darshan_data.load_header()
+    if 'header' not in darshan_data:
+        warnings.warn("%s is not a valid darshan log" % darshan_log_file)
+        return results
+
+    darshan_data.darshan_parser_base(perf=True)
+
+    # Define start/end time from darshan log.  Add an extra LMT_TIMESTEP on
+    # based on empirical observation that LMT is still flushing data for this
+    # long after the job concludes.
+    results['_datetime_start'] = datetime.datetime.fromtimestamp(
+        int(darshan_data['header']['start_time']))
+    results['_datetime_end'] = datetime.datetime.fromtimestamp(
+        int(darshan_data['header']['end_time']) + tokio.config.LMT_TIMESTEP)
+
+    if '_jobid' not in results:
+        results['_jobid'] = darshan_data['header']['jobid']
+
+    # Get the summary of the Darshan log
+    module_results = summarize_darshan(darshan_data)
+    merge_dicts(results, module_results, prefix='darshan_')
+    return results
+
+def retrieve_file_system(results, file_system):
+    """
+    Set the file system of this run from either the CLI argument or the file
+    system to which the Darshan log shows the job did the most I/O
+    """
+    if file_system is None:
+        if 'darshan_biggest_write_fs_bytes' not in results.keys() \
+        or 'darshan_biggest_read_fs_bytes' not in results.keys():
+            return results
+
+        # Attempt to divine file system from Darshan log
+        if results['darshan_biggest_write_fs_bytes'] > results['darshan_biggest_read_fs_bytes']:
+            fs_key = 'darshan_biggest_write_fs'
+        else:
+            fs_key = 'darshan_biggest_read_fs'
+        results['_file_system'] = tokio.tools.mounts.identify_fsname(results[fs_key])
+    else:
+        results['_file_system'] = file_system
+    return results
+
+def retrieve_lmt_data(results, file_system, get_dataframe=None):
+    """
+    Figure out the H5LMT file corresponding to this run
+
+    get_dataframe is called in place of
+    tools.hdf5.get_dataframe_from_time_range if given.
+    """
+    results = retrieve_file_system(results, file_system)
+    if '_file_system' not in results:
+        return results
+    h5lmt_file = tokio.config.FSNAME_TO_H5LMT_FILE.get(results['_file_system'])
+    if h5lmt_file is None:
+        return results
+
+    if get_dataframe is None:
+        get_dataframe = tokio.tools.hdf5.get_dataframe_from_time_range
+
+    module_results = {}
+    try:
+        for dataset_name, summarize_func, summarize_args in LMT_DATASETS:
+            module_results.update(summarize_func(
+                get_dataframe(h5lmt_file,
+                              dataset_name,
+                              results['_datetime_start'],
+                              results['_datetime_end']),
+                *summarize_args))
+    except IOError as error:
+        warnings.warn(str(error))
+
+    merge_dicts(results, module_results, prefix='fs_')
+    return results
+
+def retrieve_topology_data(results, slurm_cache_file, craysdb_cache_file, proc_table=None):
+    """
+    Get the diameter of the job (Cray XC)
+    """
+    if craysdb_cache_file is not None:
+        if '_jobid' not in results:
+            # bail out
+            return results
+
+        # verify craysdb cache file
+        if craysdb_cache_file == "":
+            craysdb_cache_file = None
+        else:
+            craysdb_cache_file = craysdb_cache_file
+
+        # verify slurm cache file
+        if slurm_cache_file == "" \
+        or slurm_cache_file is None \
+        or not os.path.isfile(slurm_cache_file):
+            slurm_cache_file = None
+
+        module_results = tokio.tools.topology.get_job_diameter(
+            results['_jobid'],
+            slurm_cache_file=slurm_cache_file,
+            craysdb_cache_file=craysdb_cache_file,
+            proc_table=proc_table)
+        merge_dicts(results, module_results, prefix='topology_')
+    return results
+
+def retrieve_jobid(results, jobid, file_count):
+    """
+    Get JobId from either Slurm or the CLI argument
+    """
+    if jobid is not None:
+        if file_count > 1:
+            raise Exception("Behavior of --jobid when files > 1 is undefined")
+        if os.path.isfile(jobid):
+            slurm_data = tokio.connectors.slurm.Slurm(cache_file=jobid)
+            results['_jobid'] = slurm_data.get_job_ids()[0]
+        else:
+            results['_jobid'] = jobid
+    return results
+
+def retrieve_ost_data(results, ost, ost_fullness=None, ost_map=None, ost_health_cache=None):
+    """
+    Get Lustre server status via lfsstatus tool
+    """
+    if ost:
+        # Divine the sonexion name from the file system map
+        fs_key = results.get('_file_system')
+        if fs_key is None or fs_key not in tokio.config.FSNAME_TO_H5LMT_FILE:
+            return results
+        snx_name = tokio.config.FSNAME_TO_H5LMT_FILE[fs_key].split('_')[-1].split('.')[0]
+
+        # Get the OST fullness summary
+        try:
+            module_results = tokio.tools.lfsstatus.get_fullness_at_datetime(
+                snx_name,
+                results['_datetime_start'],
+                cache_file=ost_fullness,
+                ost_health_cache=ost_health_cache)
+        except KeyError as error:
+            warnings.warn("KeyError: %s for %s" % (str(error), results['_datetime_start']))
+            module_results = {}
+        merge_dicts(results, module_results, prefix='fshealth_')
+
+        # Get the OST failure status
+        # Note that get_failures_at_datetime will clobber the
+        # ost_timestamp_* keys from get_fullness_at_datetime above;
+        # these aren't used for correlation analysis and should be
+        # pretty close anyway.
+        try:
+            module_results = tokio.tools.lfsstatus.get_failures_at_datetime(
+                snx_name,
+                results['_datetime_start'],
+                cache_file=ost_map,
+                ost_health_cache=ost_health_cache)
+        except KeyError as error:
+            warnings.warn("KeyError: %s for %s" % (str(error), results['_datetime_start']))
+            module_results = {}
+        merge_dicts(results, module_results, False, prefix='fshealth_')
+
+        # A measure, in sec, expressing how far before the job our OST fullness data was measured
+        if 'fshealth_ost_actual_timestamp' in results:
+            results['fshealth_ost_fullness_lead_secs'] = \
+                (results['_datetime_start'] \
+                - datetime.datetime.fromtimestamp(
+                    results['fshealth_ost_actual_timestamp'])).total_seconds()
+
+        # Ost_overloaded_pct becomes the percent of OSTs in file system which are
+        # in an abnormal state
+        if 'fshealth_ost_overloaded_ost_count' in results and 'fshealth_ost_count' in results:
+            results["fshealth_ost_overloaded_pct"] = \
+                100.0 * float(results["fshealth_ost_overloaded_ost_count"]) \
+                / float(results["fshealth_ost_count"])
+
+        # A measure, in sec, expressing how far before the job our OST failure data was measured
+        if 'fshealth_ost_actual_timestamp' in results:
+            results['fshealth_ost_failures_lead_secs'] = \
+                (results['_datetime_start'] \
+                - datetime.datetime.fromtimestamp(
+                    results['fshealth_ost_actual_timestamp'])).total_seconds()
+
+    return results
+
+def retrieve_concurrent_job_data(results, jobhost, concurrentjobs, nerscjobsdb=None):
+    """
+    Get information about all jobs that were running during a time period.  If
+    nerscjobsdb is given, it is queried instead of a new NerscJobsDb.
+    """
+
+    if concurrentjobs is not None \
+    and results.get('_datetime_start') is not None \
+    and results.get('_datetime_end') is not None \
+    and jobhost is not None:
+        if concurrentjobs == "":
+            cache_file = None
+        else:
+            cache_file = concurrentjobs
+
+        start_stamp = long(time.mktime(results['_datetime_start'].timetuple()))
+        end_stamp = long(time.mktime(results['_datetime_end'].timetuple()))
+        if nerscjobsdb is None:
+            nerscjobsdb = tokio.connectors.nersc_jobsdb.NerscJobsDb(cache_file=cache_file)
+        concurrent_job_info = nerscjobsdb.get_concurrent_jobs(start_stamp, end_stamp, jobhost)
+        results['jobsdb_concurrent_jobs'] = concurrent_job_info['numjobs']
+        results['jobsdb_concurrent_nodes'] = concurrent_job_info['numnodes']
+        results['jobsdb_concurrent_nodehrs'] = concurrent_job_info['nodehrs']
+    return results
+
+class JobSummarizer(object):
+    """Summarize jobs while sharing connector state between them
+
+    H5LMT files and the DataFrames read from them, OST health data, the Cray
+    SDB proc table, and the NERSC jobs database connection are loaded when the
+    first job needs them and reused for all subsequent jobs.  Only the most
+    recently used H5LMT files are kept open, so jobs should be summarized in
+    chronological order.
+
+    Once a job's time range and file system are known, the remaining
+    connectors (see CONNECTORS) are independent of each other and are run
+    concurrently in separate threads.  Each connector works on its own copy of
+    the job summary, and their results are merged in the order given by
+    CONNECTORS so that the summary does not depend on which finishes first.
+
+    Args:
+        file_system (str): file system name (e.g., cscratch); if None, it is
+            determined from each job's Darshan log
+        slurm_cache_file (str): path to a Slurm cache file used to find the
+            nodes of each job
+        topology (str): include job diameter; either the path to a cached
+            xtdb2proc output or an empty string to run xtdb2proc.  None
+            disables topology data.
+        ost (bool): include OST fullness and failover data
+        ost_fullness (str): path to an OST fullness (lfs df) file
+        ost_map (str): path to an OST map (lctl dl -t) file
+        jobhost (str): host on which jobs ran, used with concurrentjobs
+        concurrentjobs (str): include concurrently running jobs; either the
+            path to a NERSC jobs cache database or an empty string to query
+            the jobs database.  None disables concurrent job data.
+        silent_errors (bool): suppress error messages from darshan-parser
+        max_cached_files (int): maximum number of H5LMT files to keep open
+        parallel (bool): run connectors concurrently
+        report_latency (bool): add the seconds spent retrieving data from
+            the Darshan log and each connector to job summaries as
+            _latency_darshan and _latency_<connector> keys
+    """
+    def __init__(self, file_system=None, slurm_cache_file=None, topology=None,
+                 ost=False, ost_fullness=None, ost_map=None, jobhost=None,
+                 concurrentjobs=None, silent_errors=False,
+                 max_cached_files=MAX_CACHED_H5LMT_FILES, parallel=True,
+                 report_latency=False):
+        self.file_system = file_system
+        self.slurm_cache_file = slurm_cache_file
+        self.topology = topology
+        self.ost = ost
+        self.ost_fullness = ost_fullness
+        self.ost_map = ost_map
+        self.jobhost = jobhost
+        self.concurrentjobs = concurrentjobs
+        self.silent_errors = silent_errors
+        self.max_cached_files = max_cached_files
+        self.parallel = parallel
+        self.report_latency = report_latency
+
+        self.ost_health_cache = {}
+        self._h5lmt_files = collections.OrderedDict()
+        self._proc_table = None
+        self._nerscjobsdb = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close all open H5LMT files and database connections
+        """
+        while self._h5lmt_files:
+            _, (hdf5_file, _) = self._h5lmt_files.popitem()
+            hdf5_file.close()
+        if self._nerscjobsdb is not None:
+            self._nerscjobsdb.close()
+            self._nerscjobsdb.close_cache()
+            self._nerscjobsdb = None
+
+    def summarize(self, darshan_log=None, results=None):
+        """Summarize a single job
+
+        Args:
+            darshan_log (str): path to the job's Darshan log.  If None, results
+                must contain the job's _datetime_start and _datetime_end.
+            results (dict): values with which to initialize the summary, such
+                as _jobid
+
+        Returns:
+            dict: summary of the job
+        """
+        results = {} if results is None else dict(results)
+        if darshan_log is not None:
+            results = self.retrieve_darshan_data(results, darshan_log)
+        return self.retrieve_connector_data(results)
+
+    def retrieve_darshan_data(self, results, darshan_log):
+        """Add the summary of a job's Darshan log to its summary
+
+        Args:
+            results (dict): summary of a job
+            darshan_log (str): path to the job's Darshan log
+
+        Returns:
+            dict: results updated with the contents of the Darshan log
+        """
+        with tokio.instrument.span('jobsummary.darshan') as timer:
+            results = retrieve_darshan_data(results, darshan_log, silent_errors=self.silent_errors)
+        if self.report_latency and results:
+            results['_latency_darshan'] = timer.elapsed
+        return results
+
+    def retrieve_connector_data(self, results):
+        """Add file system, topology, and scheduler data to a job summary
+
+        Args:
+            results (dict): summary of a job containing either the output of
+                retrieve_darshan_data() or the job's _datetime_start and
+                _datetime_end
+
+        Returns:
+            dict: results updated with data from all enabled connectors
+        """
+        # every connector but lmt needs the file system or nothing at all
+        results = retrieve_file_system(results, self.file_system)
+
+        connectors = [name for name in CONNECTORS if self._connector_enabled(name)]
+        outputs = {}
+        latencies = {}
+        if self.parallel and len(connectors) > 1:
+            threads = []
+            for name in connectors:
+                thread = threading.Thread(target=self._run_connector,
+                                          args=(name, results, outputs, latencies))
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        else:
+            for name in connectors:
+                self._run_connector(name, results, outputs, latencies)
+
+        # merge in a fixed order regardless of which connector finished first
+        for name in connectors:
+            output, exc_info = outputs[name]
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            for key, value in output.iteritems():
+                if key not in results or results[key] is not value:
+                    results[key] = value
+
+        if self.report_latency and results:
+            for name in connectors:
+                results['_latency_%s' % name] = latencies[name]
+        return results
+
+    def _connector_enabled(self, name):
+        """Determine whether a connector should be run for each job
+        """
+        if name == 'topology':
+            return self.topology is not None
+        elif name == 'ost':
+            return bool(self.ost)
+        elif name == 'concurrent_jobs':
+            return self.concurrentjobs is not None and self.jobhost is not None
+        return True
+
+    def _run_connector(self, name, results, outputs, latencies):
+        """Run a connector on a copy of results
+
+        Records the connector's output, or the exception it raised, in
+        outputs[name] and the time it took in latencies[name].
+        """
+        timer = tokio.instrument.Timer('jobsummary.%s' % name)
+        try:
+            output = getattr(self, '_retrieve_%s' % name)(dict(results))
+            outputs[name] = (output, None)
+        except Exception: # pylint: disable=broad-except
+            outputs[name] = (None, sys.exc_info())
+        latencies[name] = timer.stop()
+
+    def _retrieve_lmt(self, results):
+        """Retrieve file system data for a job
+        """
+        return retrieve_lmt_data(results, self.file_system, get_dataframe=self.get_lmt_dataframe)
+
+    def _retrieve_topology(self, results):
+        """Retrieve the diameter of a job
+        """
+        proc_table = None
+        if '_jobid' in results:
+            proc_table = self._get_proc_table()
+        return retrieve_topology_data(results,
+                                      slurm_cache_file=self.slurm_cache_file,
+                                      craysdb_cache_file=self.topology,
+                                      proc_table=proc_table)
+
+    def _retrieve_ost(self, results):
+        """Retrieve the OST health of a job's file system
+        """
+        return retrieve_ost_data(results, self.ost, self.ost_fullness, self.ost_map,
+                                 ost_health_cache=self.ost_health_cache)
+
+    def _retrieve_concurrent_jobs(self, results):
+        """Retrieve the jobs that were running alongside a job
+        """
+        return retrieve_concurrent_job_data(results, self.jobhost, self.concurrentjobs,
+                                            nerscjobsdb=self._get_nerscjobsdb())
+
+    def get_lmt_dataframe(self, file_name, dataset_name, datetime_start, datetime_end):
+        """Retrieve the data from a time range of an H5LMT dataset
+
+        Behaves like tools.hdf5.get_dataframe_from_time_range, but each
+        dataset is read from each H5LMT file only once.
+
+        Args:
+            file_name (str): basename of H5LMT files to search for
+            dataset_name (str): name of dataset to read
+            datetime_start (datetime.datetime): start of time range (inclusive)
+            datetime_end (datetime.datetime): end of time range (exclusive)
+
+        Returns:
+            pandas.DataFrame: data from the time range, indexed by timestamp
+        """
+        result = None
+        for h5lmt_file in tokio.tools.hdf5.enumerate_h5lmts(file_name, datetime_start, datetime_end):
+            dataframe = self._read_lmt_dataset(h5lmt_file, dataset_name)
+            df_slice = dataframe[(dataframe.index >= datetime_start)
+                                 & (dataframe.index < datetime_end)]
+            if not len(df_slice):
+                continue
+            if result is None:
+                result = df_slice
+            else:
+                result = result.reindex(result.index.union(df_slice.index))
+                result.loc[df_slice.index] = df_slice
+
+        if result is None:
+            raise IOError("No relevant hdf5 files found in %s" % tokio.config.H5LMT_BASE_DIR)
+        return result.sort_index()
+
+    def _read_lmt_dataset(self, h5lmt_file, dataset_name):
+        """Read a whole dataset from an H5LMT file or return it from cache
+        """
+        entry = self._h5lmt_files.pop(h5lmt_file, None)
+        if entry is None:
+            while self._h5lmt_files and len(self._h5lmt_files) >= self.max_cached_files:
+                _, (hdf5_file, _) = self._h5lmt_files.popitem(last=False)
+                hdf5_file.close()
+            entry = (tokio.connectors.hdf5.Hdf5(h5lmt_file, mode='r'), {})
+        # keep the most recently used file at the end
+        self._h5lmt_files[h5lmt_file] = entry
+
+        hdf5_file, dataframes = entry
+        if dataset_name in dataframes:
+            tokio.instrument.count('jobsummary.lmt_cache.hits')
+        else:
+            tokio.instrument.count('jobsummary.lmt_cache.misses')
+            dataframes[dataset_name] = hdf5_file.to_dataframe(dataset_name)
+        return dataframes[dataset_name]
+
+    def _get_proc_table(self):
+        """Load the Cray SDB proc table on first use
+        """
+        if self._proc_table is None:
+            self._proc_table = tokio.connectors.craysdb.CraySdbProc(
+                cache_file=self.topology if self.topology else None)
+        return self._proc_table
+
+    def _get_nerscjobsdb(self):
+        """Connect to the NERSC jobs database on first use
+        """
+        if self._nerscjobsdb is None:
+            self._nerscjobsdb = tokio.connectors.nersc_jobsdb.NerscJobsDb(
+                cache_file=self.concurrentjobs if self.concurrentjobs else None)
+        return self._nerscjobsdb
+
+def summarize_jobs(darshan_logs, processes=1, results=None, **kwargs):
+    """Summarize many jobs
+
+    Darshan logs are parsed first.  Jobs are then sorted by start time and
+    divided into one contiguous block per process, and each block is
+    summarized by its own JobSummarizer so that jobs that ran close together
+    share the same H5LMT files, OST health data, and database connections.
+
+    Args:
+        darshan_logs (list of str): paths to the Darshan log of each job.  An
+            element may be None if results defines the job's time range.
+        processes (int): number of processes to use
+        results (dict): values with which to initialize each job's summary
+        kwargs: arguments to pass to JobSummarizer
+
+    Returns:
+        list of dict: the summary of each job in the same order as darshan_logs
+    """
+    if results is None:
+        results = {}
+    processes = max(1, min(processes, len(darshan_logs)))
+
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+
+    try:
+        # parse Darshan logs
+        retrieve_darshan = functools.partial(_retrieve_darshan_parallel,
+                                             results=results,
+                                             kwargs=kwargs)
+        if pool is None:
+            summaries = [retrieve_darshan(darshan_log) for darshan_log in darshan_logs]
+        else:
+            summaries = pool.map(retrieve_darshan, darshan_logs)
+
+        # order jobs by start time, then give each process a contiguous block
+        order = sorted(range(len(summaries)), key=lambda index: (
+            summaries[index].get('_datetime_start') is not None,
+            summaries[index].get('_datetime_start'),
+            index))
+        block_size = max(1, -(-len(order) // processes))
+        blocks = [[(index, summaries[index]) for index in order[start:start + block_size]]
+                  for start in range(0, len(order), block_size)]
+
+        summarize_block = functools.partial(_summarize_block_parallel, kwargs=kwargs)
+        if pool is None:
+            summarized_blocks = [summarize_block(block) for block in blocks]
+        else:
+            summarized_blocks = pool.map(summarize_block, blocks)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    for block in summarized_blocks:
+        for index, summary in block:
+            summaries[index] = summary
+    return summaries
+
+def _retrieve_darshan_parallel(darshan_log, results, kwargs):
+    """Call JobSummarizer.retrieve_darshan_data() from a multiprocessing worker
+    """
+    results = dict(results)
+    if darshan_log is None:
+        return results
+    try:
+        with JobSummarizer(**kwargs) as summarizer:
+            return summarizer.retrieve_darshan_data(results, darshan_log)
+    except:
+        # print out file name to aid debugging when processing multiple logs
+        warnings.warn("Unhandled exception while processing %s" % darshan_log)
+        raise
+
+def _summarize_block_parallel(block, kwargs):
+    """Add connector data to a list of (index, summary) tuples using a single
+    JobSummarizer
+    """
+    summarized = []
+    with JobSummarizer(**kwargs) as summarizer:
+        for index, results in block:
+            try:
+                summarized.append((index, summarizer.retrieve_connector_data(results)))
+            except:
+                warnings.warn("Unhandled exception while processing job %s"
+                              % results.get('_jobid', index))
+                raise
+    return summarized
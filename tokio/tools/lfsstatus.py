@@ -10,7 +10,8 @@ import tokio.tools.common
 import tokio.config
 import tokio.connectors.nersc_lfsstate as nersc_lfsstate
 
-def get_fullness_at_datetime(file_system, datetime_target, cache_file=None):
+def get_fullness_at_datetime(file_system, datetime_target, cache_file=None,
+                             ost_health_cache=None):
     """Get file system fullness
 
     Is a convenience wrapper for `get_summary_at_datetime`.
@@ -21,13 +22,17 @@ def get_fullness_at_datetime(file_system, datetime_target, cache_file=None):
         datetime_target (datetime.datetime): Time at which requested data
             should be retrieved
         cache_file (str): Basename of file to search for the requested data
+        ost_health_cache (dict): OST health data previously loaded by this
+            function; see `get_summary_at_datetime`
 
     Returns:
         dict: various statistics about the file system fullness
     """
-    return get_summary_at_datetime(file_system, datetime_target, "fullness", cache_file)
+    return get_summary_at_datetime(file_system, datetime_target, "fullness", cache_file,
+                                   ost_health_cache=ost_health_cache)
 
-def get_failures_at_datetime(file_system, datetime_target, cache_file=None):
+def get_failures_at_datetime(file_system, datetime_target, cache_file=None,
+                             ost_health_cache=None):
     """Get file system failures
 
     Is a convenience wrapper for `get_summary_at_datetime`.
@@ -38,13 +43,17 @@ def get_failures_at_datetime(file_system, datetime_target, cache_file=None):
         datetime_target (datetime.datetime): Time at which requested data
             should be retrieved
         cache_file (str): Basename of file to search for the requested data
+        ost_health_cache (dict): OST health data previously loaded by this
+            function; see `get_summary_at_datetime`
 
     Returns:
         dict: various statistics about the file system fullness
     """
-    return get_summary_at_datetime(file_system, datetime_target, "failures", cache_file)
+    return get_summary_at_datetime(file_system, datetime_target, "failures", cache_file,
+                                   ost_health_cache=ost_health_cache)
 
-def get_summary_at_datetime(file_system, datetime_target, metric, cache_file):
+def get_summary_at_datetime(file_system, datetime_target, metric, cache_file,
+                            ost_health_cache=None):
     """Get file system fullness or failures
 
     Given a file system name (e.g., snx11168) and a datetime object
@@ -60,6 +69,10 @@ def get_summary_at_datetime(file_system, datetime_target, metric, cache_file):
             should be retrieved
         metric (str): either "fullness" or "failures"
         cache_file (str): Basename of file to search for the requested data
+        ost_health_cache (dict): if provided, OST health data loaded from the
+            same set of files by a previous call is taken from this dict
+            rather than being parsed again, and newly loaded data is added
+            to it.  Used to share parsed data across many calls.
 
     Returns:
         dict: various statistics about the file system fullness
@@ -94,26 +107,13 @@ def get_summary_at_datetime(file_system, datetime_target, metric, cache_file):
             datetime_target.strftime(tokio.config.LFSSTATUS_BASE_DIR),
             str(datetime_target)))
 
-    # We can get away with the following because NerscLfsOstFullness,
-    # NerscLfsOstMap, and NerscLfsOstMap.get_failovers all have the same
-    # structure
-    if metric == "fullness":
-        ost_health = None
-        for df_file in ost_health_files:
-            if ost_health is None:
-                ost_health = nersc_lfsstate.NerscLfsOstFullness(cache_file=df_file)
-            else:
-                ost_health.update(nersc_lfsstate.NerscLfsOstFullness(cache_file=df_file))
-    elif metric == "failures":
-        ost_map = None
-        for map_file in ost_health_files:
-            if ost_map is None:
-                ost_map = nersc_lfsstate.NerscLfsOstMap(cache_file=map_file)
-            else:
-                ost_map.update(nersc_lfsstate.NerscLfsOstMap(cache_file=map_file))
-        ost_health = ost_map.get_failovers()
-
-    timestamps = sorted([int(x) for x in ost_health.keys()])
+    cache_key = (metric, tuple(ost_health_files))
+    if ost_health_cache is not None and cache_key in ost_health_cache:
+        ost_health, timestamps = ost_health_cache[cache_key]
+    else:
+        ost_health, timestamps = load_ost_health(ost_health_files, metric)
+        if ost_health_cache is not None:
+            ost_health_cache[cache_key] = (ost_health, timestamps)
 
     # Unoptimized walk through to find our timestamp of interest
     target_timestamp = long(time.mktime(datetime_target.timetuple()))
@@ -146,6 +146,41 @@ def get_summary_at_datetime(file_system, datetime_target, metric, cache_file):
     })
     return results
 
+def load_ost_health(ost_health_files, metric):
+    """Load and merge OST fullness or failure data
+
+    Args:
+        ost_health_files (list of str): paths to files to load
+        metric (str): either "fullness" or "failures"
+
+    Returns:
+        tuple: the merged OST health data keyed by timestamp, and a sorted list
+        of those timestamps as ints
+    """
+    # We can get away with the following because NerscLfsOstFullness,
+    # NerscLfsOstMap, and NerscLfsOstMap.get_failovers all have the same
+    # structure
+    if metric == "fullness":
+        ost_health = None
+        for df_file in ost_health_files:
+            if ost_health is None:
+                ost_health = nersc_lfsstate.NerscLfsOstFullness(cache_file=df_file)
+            else:
+                ost_health.update(nersc_lfsstate.NerscLfsOstFullness(cache_file=df_file))
+    elif metric == "failures":
+        ost_map = None
+        for map_file in ost_health_files:
+            if ost_map is None:
+                ost_map = nersc_lfsstate.NerscLfsOstMap(cache_file=map_file)
+            else:
+                ost_map.update(nersc_lfsstate.NerscLfsOstMap(cache_file=map_file))
+        ost_health = ost_map.get_failovers()
+    else:
+        raise Exception("unknown metric " + metric)
+
+    timestamps = sorted([int(x) for x in ost_health.keys()])
+    return ost_health, timestamps
+
 def summarize_maps_data(fs_data):
     """Summarize failover data for a single time record
 
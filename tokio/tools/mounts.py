@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Tools to map file paths onto the mount points and file systems that contain
+them.  Matching is done against a trie of path components so that the cost of
+a lookup depends on the depth of the path rather than the number of mount
+points, and the results of repeated lookups are memoized.
+"""
+
+import re
+import tokio.config
+
+### Number of lookups to remember before the memoization cache is flushed
+MAX_CACHED_PATHS = 100000
+
+_MOUNT_KEY = None # trie node key that marks the end of a mount point
+_FSNAME_MATCHERS = {}
+
+class MountMatcher(object):
+    """Find the deepest mount point containing a path
+
+    Unlike a string prefix test, a mount point only matches whole path
+    components; ``/scratch1`` contains ``/scratch1/foo`` but not
+    ``/scratch10/foo``.
+    """
+    def __init__(self, mounts):
+        """Build a trie of path components from a list of mount points
+
+        Args:
+            mounts (iterable of str): mount points to match against, e.g., the
+                keys of the mount table from a Darshan log
+        """
+        self.trie = {}
+        self.cache = {}
+        for mount in mounts:
+            node = self.trie
+            for component in _split_path(mount):
+                node = node.setdefault(component, {})
+            node[_MOUNT_KEY] = mount
+
+    def match(self, path):
+        """Find the mount point containing a path
+
+        Args:
+            path (str): absolute path to a file or directory
+
+        Returns:
+            str: the deepest mount point containing path, or None if path is
+            not contained in any mount point
+        """
+        try:
+            return self.cache[path]
+        except KeyError:
+            pass
+
+        matching_mount = None
+        node = self.trie
+        for component in _split_path(path):
+            node = node.get(component)
+            if node is None:
+                break
+            matching_mount = node.get(_MOUNT_KEY, matching_mount)
+
+        if len(self.cache) >= MAX_CACHED_PATHS:
+            self.cache.clear()
+        self.cache[path] = matching_mount
+        return matching_mount
+
+class FsNameMatcher(object):
+    """Map paths to logical file system names using regular expressions
+
+    All patterns are compiled into a single regular expression so that each
+    lookup is a single search regardless of how many file systems are
+    configured.
+    """
+    def __init__(self, mount_to_fsname=None):
+        """Compile a mapping of path regexes to file system names
+
+        Args:
+            mount_to_fsname (dict): keyed by regular expressions matching paths
+                and whose values are file system names.  If None, use
+                tokio.config.MOUNT_TO_FSNAME.  When more than one regex
+                matches a path, the match that starts leftmost in the path
+                wins; of regexes matching at the same position, the longest
+                regex wins.
+        """
+        if mount_to_fsname is None:
+            mount_to_fsname = tokio.config.MOUNT_TO_FSNAME
+        self.cache = {}
+        self.fs_names = {}
+
+        patterns = []
+        for index, pattern in enumerate(sorted(mount_to_fsname, key=len, reverse=True)):
+            group_name = '_fs%d' % index
+            self.fs_names[group_name] = mount_to_fsname[pattern]
+            patterns.append('(?P<%s>%s)' % (group_name, pattern))
+        self.regex = re.compile('|'.join(patterns)) if patterns else None
+
+    def match(self, path):
+        """Find the file system containing a path
+
+        Args:
+            path (str): absolute path to a file or directory
+
+        Returns:
+            str: name of the file system containing path, or None if no
+            configured file system matches
+        """
+        try:
+            return self.cache[path]
+        except KeyError:
+            pass
+
+        fs_name = None
+        if self.regex is not None:
+            match = self.regex.search(path)
+            if match is not None:
+                fs_name = self.fs_names[match.lastgroup]
+
+        if len(self.cache) >= MAX_CACHED_PATHS:
+            self.cache.clear()
+        self.cache[path] = fs_name
+        return fs_name
+
+def get_fsname_matcher(mount_to_fsname=None):
+    """Return a shared FsNameMatcher for a mapping of regexes to file systems
+
+    Args:
+        mount_to_fsname (dict): regexes and file system names as accepted by
+            FsNameMatcher.  If None, use tokio.config.MOUNT_TO_FSNAME.
+
+    Returns:
+        FsNameMatcher: matcher that is reused by subsequent calls with the
+        same mapping
+    """
+    if mount_to_fsname is None:
+        mount_to_fsname = tokio.config.MOUNT_TO_FSNAME
+    key = tuple(sorted(mount_to_fsname.items()))
+    matcher = _FSNAME_MATCHERS.get(key)
+    if matcher is None:
+        matcher = FsNameMatcher(mount_to_fsname)
+        _FSNAME_MATCHERS[key] = matcher
+    return matcher
+
+def identify_fsname(path, mount_to_fsname=None):
+    """Find the name of the file system containing a path
+
+    Args:
+        path (str): absolute path to a file or directory
+        mount_to_fsname (dict): regexes and file system names as accepted by
+            FsNameMatcher.  If None, use tokio.config.MOUNT_TO_FSNAME.
+
+    Returns:
+        str: name of the file system containing path, or None if unknown
+    """
+    return get_fsname_matcher(mount_to_fsname).match(path)
+
+def _split_path(path):
+    """Split a path into the components used as trie keys
+
+    Absolute paths begin with an empty component so that they never match
+    relative paths or pseudo-files such as ``<STDOUT>``.  Repeated and
+    trailing slashes are ignored.
+    """
+    components = path.split('/')
+    return components[0:1] + [x for x in components[1:] if x]
@@ -4,15 +4,19 @@ import math
 import warnings
 from ..connectors import slurm, craysdb
 
-def get_job_diameter(jobid=None, craysdb_cache_file=None, slurm_cache_file=None):
+def get_job_diameter(jobid=None, craysdb_cache_file=None, slurm_cache_file=None,
+                     proc_table=None):
     """
     An extremely crude way to reduce a job's node allocation into a scalar
-    metric
+    metric.  If proc_table (a craysdb.CraySdbProc) is given, it is used
+    instead of loading one from craysdb_cache_file so that it can be shared
+    by many calls.
 
     """
     job_info = slurm.Slurm(jobid=jobid, cache_file=slurm_cache_file)
     node_list = job_info.get_job_nodes()
-    proc_table = craysdb.CraySdbProc(cache_file=craysdb_cache_file)
+    if proc_table is None:
+        proc_table = craysdb.CraySdbProc(cache_file=craysdb_cache_file)
     node_positions = []
     if len(node_list) == 0:
         warnings.warn("no valid job_info received from slurm.Slurm")